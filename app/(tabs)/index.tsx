@@ -7,7 +7,9 @@ import { useLanguage } from '../../contexts/LanguageContext';
 import { useAdmin } from '../../contexts/AdminContext';
 import { useFontSize } from '../../contexts/FontSizeContext';
 import { hapticFeedback } from '../../lib/haptics';
-import municipalityStats from '../../constants/municipality_prediction_stats.json';
+import { loadMunicipalityShard } from '../../lib/bundles';
+import type { PredictionStats } from '../../lib/bundles';
+import type { MunicipalityId } from '../../constants/regions';
 import { translations } from '../../constants/translations';
 import colors from '../../constants/colors';
 import { LinearGradient } from 'expo-linear-gradient';
@@ -169,6 +171,11 @@ interface PredictionResult {
   level: 'high' | 'medium' | 'low';
 }
 
+// Bundled copy of the stats. It is only required (and parsed) when the
+// municipality's synced bundle shard is not cached, see lib/bundles.ts
+const bundledPredictionStats = (): Record<string, PredictionStats> =>
+  require('../../constants/municipality_prediction_stats.json');
+
 export default function HomeScreen() {
   const theme = useTheme();
   const { language } = useLanguage();
@@ -254,19 +261,25 @@ export default function HomeScreen() {
     }).start();
   };
 
-  const generateRealisticPrediction = (municipalityId: string): PredictionResult => {
-    // Convert municipalityId to the format used in our stats file
-    const formattedId = municipalityId.charAt(0).toUpperCase() + municipalityId.slice(1);
+  const generateRealisticPrediction = async (municipalityId: string): Promise<PredictionResult> => {
+    // Get stats for this municipality from its cached bundle shard
+    const shard = await loadMunicipalityShard(municipalityId as MunicipalityId).catch(() => null);
+    let stats = shard?.predictionStats;
     
-    // Get stats for this municipality
-    const stats = municipalityStats[formattedId as keyof typeof municipalityStats];
+    if (!stats) {
+      // Convert municipalityId to the format used in the bundled stats file
+      const formattedId = municipalityId.charAt(0).toUpperCase() + municipalityId.slice(1);
+      stats = bundledPredictionStats()[formattedId];
+    }
     
     if (!stats) {
       // Fallback to average if municipality not found
-      const avgYield = Object.values(municipalityStats).reduce((sum, m: any) => sum + m.avg_yield, 0) / Object.keys(municipalityStats).length;
+      const municipalityStats = Object.values(bundledPredictionStats());
+      const avgYield = municipalityStats.reduce((sum, m) => sum + m.avg_yield, 0) / municipalityStats.length;
+      const avgConfidence = municipalityStats.reduce((sum, m) => sum + m.confidence, 0) / municipalityStats.length;
       return {
         yield: parseFloat(avgYield.toFixed(2)),
-        confidence: 85,
+        confidence: parseFloat(avgConfidence.toFixed(1)),
         level: avgYield >= 0.7 ? 'high' : avgYield >= 0.4 ? 'medium' : 'low'
       };
     }
@@ -280,8 +293,8 @@ export default function HomeScreen() {
     if (predictedYield >= 0.7) level = 'high';
     else if (predictedYield < 0.4) level = 'low';
     
-    // High confidence based on our analysis (85-95%)
-    const confidence = Math.min(95, Math.max(85, 85 + Math.abs(stats.trend) * 100));
+    // Precomputed from the bootstrap prediction intervals (improved_prediction.py)
+    const confidence = stats.confidence;
     
     return {
       yield: parseFloat(predictedYield.toFixed(2)),
@@ -318,7 +331,7 @@ export default function HomeScreen() {
     await new Promise(resolve => setTimeout(resolve, 1500));
 
     // Generate realistic prediction with high confidence
-    const result = generateRealisticPrediction(selectedRegion);
+    const result = await generateRealisticPrediction(selectedRegion);
     
     setPrediction(result);
     setIsPredicting(false);
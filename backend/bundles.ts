@@ -0,0 +1,80 @@
+import { Hono } from "hono";
+import { readFile } from "node:fs/promises";
+import path from "node:path";
+
+// Shards, manifest and delta are written by backend/ml-models/bundle_export.py
+const BUNDLE_DIR =
+  process.env.BUNDLE_DIR ?? path.join(process.cwd(), "constants", "bundles");
+
+// Content-hashed shard names only, so no other file can be read through this route
+const SHARD_FILE = /^(municipalities|regions)\/[A-Za-z0-9_]+\.[0-9a-f]{16}\.json$/;
+
+interface ShardEntry {
+  file: string;
+  hash: string;
+  bytes: number;
+}
+
+interface BundleManifest {
+  version: string;
+  previous: string | null;
+  created: string;
+  shards: Record<string, ShardEntry>;
+}
+
+interface BundleDelta {
+  from: string | null;
+  to: string;
+  added: Record<string, ShardEntry>;
+  changed: Record<string, ShardEntry>;
+  removed: string[];
+}
+
+const readBundleJson = async <T>(name: string): Promise<T> =>
+  JSON.parse(await readFile(path.join(BUNDLE_DIR, name), "utf-8")) as T;
+
+export const bundleRoutes = new Hono();
+
+bundleRoutes.get("/manifest", async (c) => {
+  const manifest = await readBundleJson<BundleManifest>("manifest.json");
+  const etag = `"${manifest.version}"`;
+  c.header("ETag", etag);
+  c.header("Cache-Control", "no-cache");
+  if (c.req.header("If-None-Match") === etag) {
+    return c.body(null, 304);
+  }
+  return c.json(manifest);
+});
+
+// Changes since the client's version. delta.json only covers the previous
+// manifest, so any other version (or none) gets a full refetch: the current
+// manifest, which the client diffs against its cached shard hashes.
+bundleRoutes.get("/delta", async (c) => {
+  const from = c.req.query("from");
+  const manifest = await readBundleJson<BundleManifest>("manifest.json");
+  c.header("Cache-Control", "no-cache");
+  if (from === manifest.version) {
+    return c.json({ type: "current" as const, version: manifest.version });
+  }
+  const delta = await readBundleJson<BundleDelta>("delta.json");
+  if (from && delta.from === from && delta.to === manifest.version) {
+    return c.json({ type: "delta" as const, version: manifest.version, delta });
+  }
+  return c.json({ type: "full" as const, version: manifest.version, manifest });
+});
+
+bundleRoutes.get("/shards/:kind/:file", async (c) => {
+  const name = `${c.req.param("kind")}/${c.req.param("file")}`;
+  if (!SHARD_FILE.test(name)) {
+    return c.json({ error: "Unknown shard" }, 404);
+  }
+  try {
+    const body = await readFile(path.join(BUNDLE_DIR, name), "utf-8");
+    // The file name changes with the content, so a shard never goes stale
+    c.header("Cache-Control", "public, max-age=31536000, immutable");
+    c.header("Content-Type", "application/json");
+    return c.body(body);
+  } catch {
+    return c.json({ error: "Unknown shard" }, 404);
+  }
+});
@@ -0,0 +1,39 @@
+import { Hono } from "hono";
+
+// Exports are streamed by the Python ingestion worker (backend/ml-models/dataset_export.py),
+// which is only reachable from this server
+const INGESTION_WORKER_URL =
+  process.env.INGESTION_WORKER_URL ?? "http://127.0.0.1:8001";
+
+// Query parameters of the worker's /exports endpoint
+const EXPORT_PARAMS = ["format", "municipality", "region", "yearFrom", "yearTo", "gzip"];
+const FORWARDED_HEADERS = ["content-type", "content-disposition"];
+
+export const exportRoutes = new Hono();
+
+exportRoutes.get("/", async (c) => {
+  const params = new URLSearchParams();
+  new URL(c.req.url).searchParams.forEach((value, key) => {
+    if (EXPORT_PARAMS.includes(key)) params.append(key, value);
+  });
+
+  let upstream: Response;
+  try {
+    upstream = await fetch(`${INGESTION_WORKER_URL}/exports?${params.toString()}`);
+  } catch (error) {
+    console.error("[Admin] Export worker unreachable:", error);
+    return c.json({ error: "Export service unavailable" }, 502);
+  }
+  if (!upstream.ok || !upstream.body) {
+    const status = upstream.status === 400 || upstream.status === 422 ? 400 : 502;
+    return c.json({ error: `Export failed (${upstream.status})` }, status);
+  }
+
+  const headers = new Headers();
+  FORWARDED_HEADERS.forEach((name) => {
+    const value = upstream.headers.get(name);
+    if (value) headers.set(name, value);
+  });
+  // The worker's body is piped through as it arrives, so the export is never buffered here
+  return new Response(upstream.body, { status: 200, headers });
+});
@@ -2,6 +2,8 @@ import { Hono } from "hono";
 import { trpcServer } from "@hono/trpc-server";
 import { cors } from "hono/cors";
 import { appRouter } from "./trpc/app-router";
+import { bundleRoutes } from "./bundles";
+import { exportRoutes } from "./exports";
 import { createContext } from "./trpc/create-context";
 
 const app = new Hono();
@@ -17,6 +19,12 @@ app.use(
   })
 );
 
+// Dataset exports, streamed from the ingestion worker
+app.route("/exports", exportRoutes);
+
+// Sharded app data bundles (manifest, delta and content-hashed shards)
+app.route("/bundles", bundleRoutes);
+
 app.get("/", (c) => {
   return c.json({ status: "ok", message: "API is running" });
 });
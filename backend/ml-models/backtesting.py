@@ -0,0 +1,304 @@
+"""
+Rolling-origin backtesting over the station history.
+
+For every origin year Y a model is trained on all seasons before Y and scored
+on season Y (an expanding window), which answers "how well would we have
+predicted 2019 with data up to 2018" - something the random train/test splits
+of the training scripts cannot.
+
+- The feature matrix is built once: the shared feature transform plus the
+  as-of-year municipality features of the feature store, so no origin sees
+  aggregates of later seasons. It is cached as .npy files keyed by a hash of
+  the station data and handed to the workers through the shared data plane
+  (memory-mapped cache files by default, or shared memory segments), so no
+  worker receives a pickled copy.
+- Origins are split into contiguous blocks that run in parallel worker
+  processes. Inside a block each origin warm-starts from the previous
+  origin's model (extra boosting rounds for XGBoost/LightGBM, extra trees or
+  stages for scikit-learn warm_start estimators) instead of refitting.
+- Error tables per year and per (year, municipality) are bincount
+  aggregations over the stacked out-of-sample predictions.
+"""
+
+import os
+import sys
+import copy
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from feature_store import MunicipalityFeatureStore
+from features import engineer_features, feature_names, municipality_categories
+from model_registry import MODELS_DIR, predictor
+from shared_data import SharedArrays, attach
+from station_store import ENHANCED_DATASET_DIR, list_stations, load_station_data, station_file
+
+try:
+    import xgboost
+    XGBOOST_AVAILABLE = True
+except ImportError:
+    XGBOOST_AVAILABLE = False
+
+try:
+    import lightgbm
+    LIGHTGBM_AVAILABLE = True
+except ImportError:
+    LIGHTGBM_AVAILABLE = False
+
+FEATURE_CACHE_DIR = os.path.join(MODELS_DIR, 'feature_cache')
+BACKTEST_DIR = os.path.join(MODELS_DIR, 'backtests')
+MODEL_TYPES = ('lightgbm', 'xgboost', 'random_forest', 'gradient_boosting')
+HISTORY_FEATURES = ['Municipality_Yield_Avg', 'Municipality_Rainfall_Avg', 'Municipality_Fert_Avg',
+                    'Muni_Adaptation_Score']
+# Seasons required before the first origin
+DEFAULT_MIN_TRAIN_YEARS = 2
+DEFAULT_ROUNDS = 300
+# Added per origin when warm-starting: boosting rounds / trees / stages
+DEFAULT_WARM_ROUNDS = 50
+
+XGBOOST_PARAMS = {'objective': 'reg:squarederror', 'max_depth': 6, 'eta': 0.05, 'subsample': 0.8,
+                  'colsample_bytree': 0.8, 'tree_method': 'hist', 'seed': 42, 'nthread': 1}
+LIGHTGBM_PARAMS = {'objective': 'regression', 'num_leaves': 31, 'max_depth': 6, 'learning_rate': 0.05,
+                   'bagging_fraction': 0.8, 'bagging_freq': 1, 'feature_fraction': 0.8, 'seed': 42,
+                   'num_threads': 1, 'verbose': -1}
+
+
+def station_data_hash(dataset_dir=ENHANCED_DATASET_DIR):
+    """Content hash of the station CSVs (names and bytes)"""
+    digest = hashlib.sha256()
+    for name in list_stations(dataset_dir):
+        digest.update(name.encode('utf-8'))
+        with open(station_file(name, dataset_dir), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def build_feature_cache(dataset_dir=ENHANCED_DATASET_DIR, cache_root=FEATURE_CACHE_DIR):
+    """Write (or reuse) the cached backtest matrices; returns the cache directory"""
+    path = os.path.join(cache_root, station_data_hash(dataset_dir))
+    if os.path.exists(os.path.join(path, 'columns.json')):
+        return path
+
+    data = load_station_data(dataset_dir)
+    X, y = engineer_features(data)
+    rows = data.loc[X.index]
+    history = MunicipalityFeatureStore.from_data(data).lookup(rows['Municipality'], rows['Year'])
+    X = pd.concat([X.reset_index(drop=True), history[HISTORY_FEATURES]], axis=1)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp_path, exist_ok=True)
+    np.save(os.path.join(tmp_path, 'X.npy'), X.to_numpy(dtype=np.float64))
+    np.save(os.path.join(tmp_path, 'y.npy'), y.to_numpy(dtype=np.float64))
+    np.save(os.path.join(tmp_path, 'year.npy'), rows['Year'].to_numpy(dtype=np.int32))
+    codes = pd.Categorical(rows['Municipality'], categories=municipality_categories(dataset_dir)).codes
+    np.save(os.path.join(tmp_path, 'municipality.npy'), codes.astype(np.int32))
+    with open(os.path.join(tmp_path, 'columns.json'), 'w') as f:
+        json.dump({'features': list(X.columns), 'municipalities': list(municipality_categories(dataset_dir))}, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another process published the same cache first
+        pass
+    return path
+
+
+def load_feature_cache(path):
+    """Memory-mapped (X, y, year, municipality code) arrays and the column info of a cache"""
+    arrays = [np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+              for name in ('X', 'y', 'year', 'municipality')]
+    with open(os.path.join(path, 'columns.json')) as f:
+        return (*arrays, json.load(f))
+
+
+def fit_origin(model_type, X, y, previous=None, rounds=DEFAULT_ROUNDS, warm_rounds=DEFAULT_WARM_ROUNDS):
+    """Fit a model on one expanding window, continuing `previous` when given"""
+    if model_type == 'xgboost':
+        if not XGBOOST_AVAILABLE:
+            raise ImportError("XGBoost not available. Install with: pip install xgboost")
+        return xgboost.train(XGBOOST_PARAMS, xgboost.DMatrix(X, label=y),
+                             num_boost_round=rounds if previous is None else warm_rounds, xgb_model=previous)
+    if model_type == 'lightgbm':
+        if not LIGHTGBM_AVAILABLE:
+            raise ImportError("LightGBM not available. Install with: pip install lightgbm")
+        return lightgbm.train(LIGHTGBM_PARAMS, lightgbm.Dataset(X, label=y),
+                              num_boost_round=rounds if previous is None else warm_rounds,
+                              init_model=previous, keep_training_booster=True)
+
+    if previous is None:
+        if model_type == 'random_forest':
+            model = RandomForestRegressor(n_estimators=rounds, min_samples_leaf=2, random_state=42, warm_start=True)
+        elif model_type == 'gradient_boosting':
+            model = GradientBoostingRegressor(n_estimators=rounds, max_depth=4, learning_rate=0.05, subsample=0.8,
+                                              random_state=42, warm_start=True)
+        else:
+            raise ValueError(f"Unknown model type: {model_type}")
+    else:
+        model = copy.deepcopy(previous)
+        model.set_params(n_estimators=model.n_estimators + warm_rounds)
+    return model.fit(X, y)
+
+
+def _run_block(descriptor, model_type, origins, warm_start, rounds, warm_rounds):
+    """Worker: fit and score consecutive origins; returns [(origin, test row indices, predictions)]"""
+    arrays = attach(descriptor)
+    X, y, year = arrays['X'], arrays['y'], arrays['year']
+    results = []
+    model = None
+    for origin in origins:
+        train = np.flatnonzero(year < origin)
+        test = np.flatnonzero(year == origin)
+        model = fit_origin(model_type, X[train], y[train], model if warm_start else None, rounds, warm_rounds)
+        results.append((origin, test, predictor(model)(np.asarray(X[test]))))
+    return results
+
+
+def default_origins(years, min_train_years=DEFAULT_MIN_TRAIN_YEARS):
+    """Every season that has at least min_train_years of history before it"""
+    seasons = np.unique(years)
+    return [int(origin) for origin in seasons[min_train_years:]]
+
+
+def split_origins(origins, n_blocks):
+    """Contiguous blocks of origins, one per worker (warm starts run within a block)"""
+    n_blocks = max(1, min(n_blocks, len(origins)))
+    return [list(block) for block in np.array_split(np.asarray(origins), n_blocks)]
+
+
+def error_tables(predictions, municipalities):
+    """Per-year and per-(year, municipality) error tables from the stacked predictions frame"""
+    errors = predictions['predicted'].to_numpy() - predictions['actual'].to_numpy()
+    actual = predictions['actual'].to_numpy()
+
+    def aggregate(codes, n_groups):
+        n = np.bincount(codes, minlength=n_groups)
+        sum_error = np.bincount(codes, errors, n_groups)
+        sum_abs = np.bincount(codes, np.abs(errors), n_groups)
+        sum_sq = np.bincount(codes, errors ** 2, n_groups)
+        sum_y = np.bincount(codes, actual, n_groups)
+        sum_y2 = np.bincount(codes, actual ** 2, n_groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sst = sum_y2 - sum_y ** 2 / n
+            return pd.DataFrame({
+                'n': n,
+                'mae': sum_abs / n,
+                'rmse': np.sqrt(sum_sq / n),
+                'bias': sum_error / n,
+                'mape': np.bincount(codes, np.abs(errors) / np.abs(actual), n_groups) / n,
+                'r2': np.where(sst > 0, 1 - sum_sq / sst, np.nan)
+            })
+
+    years, year_codes = np.unique(predictions['year'].to_numpy(), return_inverse=True)
+    by_year = aggregate(year_codes, len(years)).assign(year=years)
+
+    municipality_codes = predictions['municipality_code'].to_numpy()
+    cell = year_codes * len(municipalities) + municipality_codes
+    by_cell = aggregate(cell, len(years) * len(municipalities))
+    by_cell['year'] = np.repeat(years, len(municipalities))
+    by_cell['municipality'] = np.tile(np.asarray(municipalities, dtype=object), len(years))
+    by_cell = by_cell[by_cell['n'] > 0].reset_index(drop=True)
+
+    columns = ['n', 'mae', 'rmse', 'bias', 'mape', 'r2']
+    return by_year[['year'] + columns], by_cell[['year', 'municipality'] + columns]
+
+
+def run_backtest(model_type='lightgbm', dataset_dir=ENHANCED_DATASET_DIR, origins=None,
+                 min_train_years=DEFAULT_MIN_TRAIN_YEARS, workers=None, warm_start=True,
+                 rounds=DEFAULT_ROUNDS, warm_rounds=DEFAULT_WARM_ROUNDS, data_plane='memmap'):
+    """Run the rolling-origin backtest; returns (predictions, by_year, by_year_municipality)"""
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"Unknown model type: {model_type}")
+    cache_path = build_feature_cache(dataset_dir)
+    X, y, year, municipality, columns = load_feature_cache(cache_path)
+    origins = default_origins(year, min_train_years) if origins is None else sorted(origins)
+    if not origins:
+        raise ValueError("No origin years with enough history")
+
+    workers = workers or min(len(origins), os.cpu_count() or 1)
+    blocks = split_origins(origins, workers)
+    if data_plane == 'memmap':
+        plane = SharedArrays.from_npy_dir(cache_path, ['X', 'y', 'year'])
+    else:
+        plane = SharedArrays({'X': X, 'y': y, 'year': year}, backend=data_plane)
+    with plane:
+        if workers == 1:
+            block_results = [_run_block(plane.descriptor, model_type, block, warm_start, rounds, warm_rounds)
+                             for block in blocks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_run_block, plane.descriptor, model_type, block, warm_start, rounds, warm_rounds)
+                           for block in blocks]
+                block_results = [future.result() for future in futures]
+
+    results = [result for block in block_results for result in block]
+    rows = np.concatenate([test for _, test, _ in results])
+    predictions = pd.DataFrame({
+        'origin': np.concatenate([np.full(len(test), origin) for origin, test, _ in results]),
+        'year': year[rows],
+        'municipality_code': municipality[rows],
+        'municipality': np.asarray(columns['municipalities'], dtype=object)[municipality[rows]],
+        'actual': y[rows],
+        'predicted': np.concatenate([pred for _, _, pred in results])
+    })
+    by_year, by_cell = error_tables(predictions, columns['municipalities'])
+    return predictions, by_year, by_cell
+
+
+def save_backtest(model_type, predictions, by_year, by_cell, settings, output_root=BACKTEST_DIR):
+    """Write the predictions and error tables of a run; returns its directory"""
+    run_id = f"{model_type}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+    path = os.path.join(output_root, run_id)
+    os.makedirs(path, exist_ok=True)
+    predictions.to_csv(os.path.join(path, 'predictions.csv'), index=False)
+    by_year.to_csv(os.path.join(path, 'by_year.csv'), index=False)
+    by_cell.to_csv(os.path.join(path, 'by_year_municipality.csv'), index=False)
+    with open(os.path.join(path, 'summary.json'), 'w') as f:
+        json.dump({'run_id': run_id, 'model_type': model_type, **settings,
+                   'by_year': by_year.to_dict(orient='records')}, f, indent=2, default=float)
+    return path
+
+
+def main():
+    """Rolling-origin backtest of one model type over the station history"""
+    parser = argparse.ArgumentParser(description="Parallel rolling-origin backtesting")
+    parser.add_argument('--model', choices=MODEL_TYPES, default='lightgbm')
+    parser.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    parser.add_argument('--origins', type=int, nargs='*', default=None, help="Origin years (default: all with history)")
+    parser.add_argument('--min-train-years', type=int, default=DEFAULT_MIN_TRAIN_YEARS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--data-plane', choices=['memmap', 'shm'], default='memmap',
+                        help="How workers see the feature matrix: cache files or shared memory")
+    parser.add_argument('--no-warm-start', action='store_true', help="Refit every origin from scratch")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help="Rounds/trees of a fresh fit")
+    parser.add_argument('--warm-rounds', type=int, default=DEFAULT_WARM_ROUNDS, help="Rounds/trees added per origin")
+    args = parser.parse_args()
+
+    try:
+        predictions, by_year, by_cell = run_backtest(args.model, args.dataset_dir, args.origins, args.min_train_years,
+                                                     args.workers, not args.no_warm_start, args.rounds,
+                                                     args.warm_rounds, args.data_plane)
+    except (ImportError, ValueError, FileNotFoundError) as e:
+        print(f"Backtest error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Rolling-origin backtest: {args.model} ({'warm start' if not args.no_warm_start else 'refit'})")
+    print(by_year.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    worst = by_cell.sort_values('mae', ascending=False).head(5)
+    print("\nLargest municipality errors:")
+    print(worst[['year', 'municipality', 'mae', 'bias']].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    path = save_backtest(args.model, predictions, by_year, by_cell, {
+        'dataset_dir': os.path.basename(os.path.normpath(args.dataset_dir)),
+        'warm_start': not args.no_warm_start,
+        'rounds': args.rounds,
+        'warm_rounds': args.warm_rounds,
+        'feature_names': feature_names() + HISTORY_FEATURES
+    })
+    print(f"\nResults written to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Sharded, content-hashed app data bundles.
+
+The app used to import constants/municipality_data.json (every station's
+yield history, pretty-printed) and constants/municipality_prediction_stats.json
+in full at startup, so parse time grew with every station and season. This
+export stage splits both into compact shards under constants/bundles/:
+- municipalities/<id>.<hash>.json: one station's history, average yield and
+  prediction stats
+- regions/<region>.<hash>.json: the summary (average yield and prediction
+  stats, no history) of every station in one region
+
+Shard file names carry the first 16 hex digits of the SHA-256 of their
+content, so an unchanged shard keeps its name and clients can cache shards
+forever. manifest.json maps each shard key (e.g. 'municipalities/abucay') to
+its file, hash and size; delta.json lists the shards added, changed and
+removed since the previous manifest, so a client holding that version fetches
+only what changed. Shard files referenced by neither manifest are removed.
+
+delta.json only covers one version step, and shards older than the previous
+manifest are pruned, so a client two or more versions behind (or with no
+cache) must do a full refetch: take the current manifest and download every
+shard whose hash differs from its cached copy. The API server serves the
+manifest, the delta (or that fallback) and the shards (backend/bundles.ts);
+the app syncs them into per-shard cache entries (lib/bundles.ts). Yield
+history comes from the cached municipality shards, and so do the prediction
+stats, read one shard at a time when a municipality is predicted. The bundled
+JSON files are only parsed when offline with nothing cached.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime, timezone
+from station_store import REGION_IDS, municipality_id, region_of
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..', '..')
+BUNDLE_DIR = os.path.join(ROOT_DIR, 'constants', 'bundles')
+MUNICIPALITY_DATA_PATH = os.path.join(ROOT_DIR, 'constants', 'municipality_data.json')
+PREDICTION_STATS_PATH = os.path.join(ROOT_DIR, 'constants', 'municipality_prediction_stats.json')
+
+MANIFEST_FILE = 'manifest.json'
+DELTA_FILE = 'delta.json'
+HASH_LENGTH = 16
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+
+def _write_atomic(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def build_shards(municipality_data, prediction_stats):
+    """Shard key -> shard object for municipality_data.json entries and prediction stats by station name"""
+    stats = {municipality_id(name): entry for name, entry in prediction_stats.items()}
+    history = {entry['municipalityId']: entry for entry in municipality_data}
+
+    shards = {}
+    regions = {region: [] for region in REGION_IDS}
+    for mid in sorted(set(history) | set(stats)):
+        entry = history.get(mid, {'municipalityId': mid, 'averageYield': 0, 'historicalData': []})
+        region = region_of(mid)
+        shard = {
+            'municipalityId': mid,
+            'region': region,
+            'averageYield': entry['averageYield'],
+            'historicalData': entry['historicalData'],
+            'predictionStats': stats.get(mid)
+        }
+        shards[f'municipalities/{mid}'] = shard
+        if region is not None:
+            regions[region].append({key: shard[key] for key in ('municipalityId', 'averageYield', 'predictionStats')})
+
+    for region, members in regions.items():
+        shards[f'regions/{region}'] = {'region': region, 'municipalities': members}
+    return shards
+
+
+def diff_manifests(previous, current):
+    """Delta between two manifests' shard maps: added, changed (new entries) and removed keys"""
+    old, new = previous.get('shards', {}), current['shards']
+    return {
+        'from': previous.get('version'),
+        'to': current['version'],
+        'added': {key: entry for key, entry in new.items() if key not in old},
+        'changed': {key: entry for key, entry in new.items() if key in old and old[key]['hash'] != entry['hash']},
+        'removed': sorted(key for key in old if key not in new)
+    }
+
+
+def export_bundles(municipality_data=None, prediction_stats=None, bundle_dir=BUNDLE_DIR):
+    """Write changed shards, the manifest and the delta; inputs default to the current constants files"""
+    if municipality_data is None:
+        municipality_data = _read_json(MUNICIPALITY_DATA_PATH, [])
+    if prediction_stats is None:
+        prediction_stats = _read_json(PREDICTION_STATS_PATH, {})
+
+    entries = {}
+    written = 0
+    for key, shard in build_shards(municipality_data, prediction_stats).items():
+        body = _dumps(shard)
+        digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+        file_name = f'{key}.{digest}.json'
+        path = os.path.join(bundle_dir, file_name)
+        # Content-addressed: an existing file already holds exactly this body
+        if not os.path.exists(path):
+            _write_atomic(path, body)
+            written += 1
+        entries[key] = {'file': file_name, 'hash': digest, 'bytes': len(body)}
+
+    previous = _read_json(os.path.join(bundle_dir, MANIFEST_FILE), {})
+    version = hashlib.sha256(_dumps({key: entry['hash'] for key, entry in entries.items()})).hexdigest()[:HASH_LENGTH]
+    if previous.get('version') == version:
+        return previous, 0
+
+    manifest = {
+        'version': version,
+        'previous': previous.get('version'),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'shards': entries
+    }
+    delta = diff_manifests(previous, manifest)
+    _write_atomic(os.path.join(bundle_dir, DELTA_FILE), _dumps(delta))
+    _write_atomic(os.path.join(bundle_dir, MANIFEST_FILE), _dumps(manifest))
+    _prune(bundle_dir, [manifest, previous])
+    return manifest, written
+
+
+def _prune(bundle_dir, manifests):
+    """Remove shard files referenced by none of the given manifests"""
+    keep = {entry['file'] for manifest in manifests for entry in manifest.get('shards', {}).values()}
+    for folder in ('municipalities', 'regions'):
+        directory = os.path.join(bundle_dir, folder)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if f'{folder}/{name}' not in keep:
+                os.remove(os.path.join(directory, name))
+
+
+def main():
+    """Export the current constants files as sharded bundles"""
+    parser = argparse.ArgumentParser(description="Sharded, content-hashed app data bundles")
+    parser.add_argument('--bundle-dir', default=BUNDLE_DIR)
+    args = parser.parse_args()
+
+    try:
+        manifest, written = export_bundles(bundle_dir=args.bundle_dir)
+    except (OSError, KeyError) as e:
+        print(f"Error exporting bundles: {e}", file=sys.stderr)
+        return 1
+
+    total = sum(entry['bytes'] for entry in manifest['shards'].values())
+    print(f"Bundle {manifest['version']}: {len(manifest['shards'])} shards ({total} bytes), {written} written")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Out-of-core aggregator from raw daily PAGASA station records to annual features.
+
+Raw ClimDatPh files have one row per day with YEAR, MONTH, DAY, RAINFALL, TMAX
+and TMIN, where -999 marks missing values and -1 trace rainfall (< 0.1 mm).
+Files are streamed in fixed-size chunks and folded into small per-(year,
+season) accumulators, so memory stays constant regardless of file length.
+Stations are processed in parallel worker processes.
+
+Annual rainfall and mean Tmax/Tmin are written back into the station's annual
+dataset for years that already exist there; the full feature table (seasonal
+totals, extremes, rainy-day counts, missing fractions) is written next to it
+in data/daily_features/.
+"""
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from station_store import DATASET_DIR, load_station, station_file, write_station
+
+DAILY_DIR = os.path.join(os.path.dirname(__file__), 'data', 'daily')
+DAILY_FEATURES_DIR = os.path.join(os.path.dirname(__file__), 'data', 'daily_features')
+DAILY_SUFFIX = ' Daily Data.csv'
+
+MISSING_VALUE = -999.0
+TRACE_VALUE = -1.0
+RAINY_DAY_MM = 1.0
+# Years with more missing days than this keep their existing annual values
+MAX_MISSING_FRACTION = 0.2
+
+DAILY_COLUMNS = ['YEAR', 'MONTH', 'DAY', 'RAINFALL', 'TMAX', 'TMIN']
+# Wet season Jun-Nov; the dry season of year Y runs Dec (Y-1) to May (Y)
+WET_MONTHS = (6, 7, 8, 9, 10, 11)
+
+# feature -> (annual dataset column, missing-fraction feature gating the update)
+ANNUAL_COLUMN_MAP = {
+    'rainfall_total': ('Rainfall (mm)', 'rainfall_missing_fraction'),
+    'tmax_mean': ('Tmax (°C)', 'tmax_missing_fraction'),
+    'tmin_mean': ('Tmin (°C)', 'tmin_missing_fraction'),
+}
+
+
+def _chunk_partials(chunk):
+    """Reduce one chunk to per-(year, season) partial sums, counts and extremes"""
+    year = chunk['YEAR'].to_numpy(dtype=np.int64)
+    month = chunk['MONTH'].to_numpy(dtype=np.int64)
+    wet = np.isin(month, WET_MONTHS)
+    season_year = np.where(month == 12, year + 1, year)
+
+    rain = chunk['RAINFALL'].to_numpy(dtype=float)
+    tmax = chunk['TMAX'].to_numpy(dtype=float)
+    tmin = chunk['TMIN'].to_numpy(dtype=float)
+    rain_missing = (rain == MISSING_VALUE) | np.isnan(rain)
+    tmax_missing = (tmax == MISSING_VALUE) | np.isnan(tmax)
+    tmin_missing = (tmin == MISSING_VALUE) | np.isnan(tmin)
+    rain = np.where(rain_missing | (rain == TRACE_VALUE), 0.0, rain)
+
+    frame = pd.DataFrame({
+        'days': 1,
+        'rain_sum': rain,
+        'rain_valid': ~rain_missing,
+        'rain_max': np.where(rain_missing, np.nan, rain),
+        'rainy_days': ~rain_missing & (rain >= RAINY_DAY_MM),
+        'tmax_sum': np.where(tmax_missing, 0.0, tmax),
+        'tmax_valid': ~tmax_missing,
+        'tmax_max': np.where(tmax_missing, np.nan, tmax),
+        'tmin_sum': np.where(tmin_missing, 0.0, tmin),
+        'tmin_valid': ~tmin_missing,
+        'tmin_min': np.where(tmin_missing, np.nan, tmin),
+    })
+    sums = ['days', 'rain_sum', 'rain_valid', 'rainy_days', 'tmax_sum', 'tmax_valid', 'tmin_sum', 'tmin_valid']
+    aggregations = {**{col: 'sum' for col in sums}, 'rain_max': 'max', 'tmax_max': 'max', 'tmin_min': 'min'}
+
+    # Calendar-year totals and season totals are accumulated as separate keys
+    annual = frame.assign(year=year, season='annual')
+    seasonal = frame.assign(year=season_year, season=np.where(wet, 'wet', 'dry'))
+    return pd.concat([annual, seasonal]).groupby(['year', 'season']).agg(aggregations)
+
+
+def _merge_partials(total, partial):
+    """Fold a chunk's partials into the running accumulator (both are tiny)"""
+    if total is None:
+        return partial
+    combined = pd.concat([total, partial])
+    return combined.groupby(level=['year', 'season']).agg(
+        {col: ('max' if col.endswith('_max') else 'min' if col.endswith('_min') else 'sum') for col in total.columns}
+    )
+
+
+def _calendar_days(index):
+    """Calendar length of each (year, season) key, so days absent from the file count as missing"""
+    year = index.get_level_values('year').to_numpy(dtype=np.int64)
+    season = index.get_level_values('season').to_numpy()
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    # Wet: Jun-Nov; dry: Dec of the previous year plus Jan-May
+    days = np.select([season == 'annual', season == 'wet'], [365 + leap, 183], 182 + leap)
+    return pd.Series(days, index=index, dtype=float)
+
+
+def aggregate_daily_file(path, chunksize=100_000):
+    """Stream a raw daily file and return one row of annual/seasonal features per year"""
+    accumulator = None
+    reader = pd.read_csv(path, usecols=DAILY_COLUMNS, chunksize=chunksize,
+                         dtype={col: 'float64' for col in DAILY_COLUMNS})
+    for chunk in reader:
+        accumulator = _merge_partials(accumulator, _chunk_partials(chunk.dropna(subset=['YEAR', 'MONTH'])))
+    if accumulator is None:
+        return pd.DataFrame()
+
+    acc = accumulator
+    calendar_days = _calendar_days(acc.index)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Rainfall totals are scaled up for missing days so gaps do not read as drought
+        features = pd.DataFrame({
+            'rainfall_total': acc['rain_sum'] * calendar_days / acc['rain_valid'],
+            'rainfall_max_daily': acc['rain_max'],
+            'rainy_days': acc['rainy_days'],
+            'tmax_mean': acc['tmax_sum'] / acc['tmax_valid'],
+            'tmax_extreme': acc['tmax_max'],
+            'tmin_mean': acc['tmin_sum'] / acc['tmin_valid'],
+            'tmin_extreme': acc['tmin_min'],
+            'rainfall_missing_fraction': 1 - acc['rain_valid'] / calendar_days,
+            'tmax_missing_fraction': 1 - acc['tmax_valid'] / calendar_days,
+            'tmin_missing_fraction': 1 - acc['tmin_valid'] / calendar_days,
+            'days': acc['days'],
+        })
+    wide = features.unstack('season')
+    wide.columns = [name if season == 'annual' else f"{season}_{name}" for name, season in wide.columns]
+    keep = list(features.columns) + [f"{season}_{name}" for season in ('wet', 'dry') for name in
+                          ('rainfall_total', 'rainy_days', 'tmax_mean', 'tmin_mean', 'rainfall_missing_fraction')]
+    wide = wide.reindex(columns=keep)
+    # Only calendar years present in the file (drop the partial dry season spilling into the next year)
+    wide = wide[wide['days'].notna()]
+    wide.index.name = 'Year'
+    return wide.round(3).reset_index()
+
+
+def write_annual_features(station, features, dataset_dir=DATASET_DIR, features_dir=DAILY_FEATURES_DIR,
+                          max_missing=MAX_MISSING_FRACTION):
+    """Save the feature table and update rainfall/temperature of matching years in the annual dataset"""
+    os.makedirs(features_dir, exist_ok=True)
+    features.to_csv(os.path.join(features_dir, f"{station} Daily Features.csv"), index=False)
+
+    if not os.path.exists(station_file(station, dataset_dir)):
+        return 0
+    annual = load_station(station, dataset_dir)
+    updated = 0
+    indexed = features.set_index('Year')
+    for source_col, (target_col, missing_col) in ANNUAL_COLUMN_MAP.items():
+        usable = indexed.loc[indexed[missing_col] <= max_missing, source_col]
+        mask = annual['Year'].isin(usable.index)
+        annual.loc[mask, target_col] = annual.loc[mask, 'Year'].map(usable).round(2)
+        updated = max(updated, int(mask.sum()))
+    if updated:
+        write_station(station, annual, dataset_dir)
+    return updated
+
+
+def process_station(path, dataset_dir=DATASET_DIR, features_dir=DAILY_FEATURES_DIR, chunksize=100_000):
+    """Worker entry point: aggregate one station file and write its outputs"""
+    station = os.path.basename(path).replace(DAILY_SUFFIX, '')
+    features = aggregate_daily_file(path, chunksize)
+    updated = write_annual_features(station, features, dataset_dir, features_dir) if not features.empty else 0
+    return station, len(features), updated
+
+
+def aggregate_all(daily_dir=DAILY_DIR, dataset_dir=DATASET_DIR, features_dir=DAILY_FEATURES_DIR,
+                  chunksize=100_000, max_workers=None):
+    """Aggregate every raw daily file in parallel worker processes"""
+    paths = sorted(glob.glob(os.path.join(daily_dir, f"*{DAILY_SUFFIX}")), key=str.lower)
+    if not paths:
+        raise FileNotFoundError(f"No daily station files found in: {daily_dir}")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process_station, path, dataset_dir, features_dir, chunksize) for path in paths]
+        return [future.result() for future in futures]
+
+
+def main():
+    """Refresh annual climate features from raw daily PAGASA records"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--daily-dir', default=DAILY_DIR)
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        results = aggregate_all(args.daily_dir, args.dataset_dir, chunksize=args.chunksize, max_workers=args.workers)
+        for station, years, updated in results:
+            print(f"{station}: {years} years aggregated, {updated} annual rows updated")
+        return 0
+    except Exception as e:
+        print(f"Error aggregating daily data: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Bulk validation and quarantine stage for station data at ingest.
+
+Every check is a whole-column boolean mask, so validating a frame costs a
+handful of vectorized comparisons regardless of row count. Rows failing any
+check are split off with a semicolon-separated list of reasons and written to
+a per-source quarantine file instead of silently flowing into the stats,
+app JSON or training sets.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+QUARANTINE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'quarantine')
+
+# Plausible physical ranges per column (inclusive)
+RANGE_RULES = {
+    'Year': (1900, 2100),
+    'Rainfall (mm)': (0, 10000),
+    'Tmax (°C)': (10, 45),
+    'Tmin (°C)': (0, 35),
+    'Humidity (%)': (0, 100),
+    'Sunshine Hours (hrs/day)': (0, 14),
+    'Soil Moisture (%)': (0, 100),
+    'Soil pH': (3, 10),
+    'Nitrogen (N kg/ha)': (0, 1000),
+    'Phosphorus (P kg/ha)': (0, 1000),
+    'Potassium (K kg/ha)': (0, 1000),
+    'Fertilizer Used (kg/ha)': (0, 2000),
+    'Pest Incidence (%)': (0, 100),
+    'Rice Yield (tons/ha)': (0, 15),
+}
+
+# PAGASA flags: -999 missing, -1 trace rainfall; neither is a usable annual value
+SENTINEL_VALUES = (-999.0, -1.0)
+
+NPK_COLS = ['Nitrogen (N kg/ha)', 'Phosphorus (P kg/ha)', 'Potassium (K kg/ha)']
+FERTILIZER_COL = 'Fertilizer Used (kg/ha)'
+# Allowed NPK total / fertilizer ratio. The station datasets routinely report
+# nutrient totals above the product mass, so only gross inconsistencies fail.
+NPK_RATIO_BOUNDS = (0.5, 4.0)
+
+REQUIRED_COLS = ['Year', 'Rice Yield (tons/ha)']
+
+
+def _numeric(df, col):
+    """Column as float array (non-numeric cells become NaN)"""
+    return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+
+
+def build_check_masks(df, group_col='Municipality'):
+    """Return {check_name: boolean mask of failing rows} for every applicable check"""
+    checks = {}
+    n = len(df)
+
+    # 1. Missing required values
+    for col in REQUIRED_COLS:
+        if col in df.columns:
+            checks[f'missing:{col}'] = np.isnan(_numeric(df, col))
+
+    numeric = {col: _numeric(df, col) for col in RANGE_RULES if col in df.columns}
+
+    # 2. Sentinel flags and ranges
+    sentinels = np.array(SENTINEL_VALUES)
+    for col, values in numeric.items():
+        checks[f'sentinel:{col}'] = np.isin(values, sentinels)
+        low, high = RANGE_RULES[col]
+        checks[f'range:{col}'] = (values < low) | (values > high)
+
+    # 3. Duplicate and non-monotonic years within a station (in file order)
+    if 'Year' in numeric:
+        years = numeric['Year']
+        groups = pd.factorize(df[group_col])[0] if group_col in df.columns else np.zeros(n, dtype=np.int64)
+        keys = pd.Series(groups.astype(np.int64) * 100000 + np.nan_to_num(years, nan=-1).astype(np.int64))
+        checks['duplicate_year'] = keys.duplicated().to_numpy()
+        same_group = np.zeros(n, dtype=bool)
+        same_group[1:] = groups[1:] == groups[:-1]
+        step = np.full(n, np.inf)
+        step[1:] = years[1:] - years[:-1]
+        checks['non_monotonic_year'] = same_group & (step < 0)
+
+    # 4. Cross-field constraints
+    if 'Tmax (°C)' in numeric and 'Tmin (°C)' in numeric:
+        checks['tmax_below_tmin'] = numeric['Tmax (°C)'] < numeric['Tmin (°C)']
+    if all(col in numeric for col in NPK_COLS + [FERTILIZER_COL]):
+        npk_total = sum(numeric[col] for col in NPK_COLS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = npk_total / numeric[FERTILIZER_COL]
+        checks['npk_vs_fertilizer'] = (ratio < NPK_RATIO_BOUNDS[0]) | (ratio > NPK_RATIO_BOUNDS[1])
+
+    return checks
+
+
+def validate(df, group_col='Municipality'):
+    """Split a frame into (valid_rows, quarantined_rows); quarantined rows carry a 'reasons' column"""
+    checks = build_check_masks(df, group_col)
+    if not checks:
+        return df, df.iloc[0:0].assign(reasons=pd.Series(dtype=str))
+    names = np.array(list(checks.keys()))
+    failures = np.column_stack(list(checks.values()))
+    rejected = failures.any(axis=1)
+
+    # Reason strings are built once per distinct failure pattern, not per row
+    bits = np.left_shift(np.int64(1), np.arange(len(names), dtype=np.int64))
+    codes, inverse = np.unique(failures[rejected].astype(np.int64) @ bits, return_inverse=True)
+    labels = np.array([';'.join(names[(code & bits) != 0]) for code in codes], dtype=object)
+    quarantined = df[rejected].assign(reasons=labels[inverse])
+    return df[~rejected], quarantined
+
+
+def quarantine(rejected, source, quarantine_dir=QUARANTINE_DIR):
+    """Write quarantined rows for a source (overwrites the previous result; removes it when clean)"""
+    path = os.path.join(quarantine_dir, f"{source}.quarantine.csv")
+    if rejected.empty:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    os.makedirs(quarantine_dir, exist_ok=True)
+    rejected.to_csv(path, index=False)
+    return path
+
+
+def validate_and_quarantine(df, source, group_col='Municipality', quarantine_dir=QUARANTINE_DIR):
+    """Validate a frame, quarantine offending rows and return only the valid ones"""
+    valid, rejected = validate(df, group_col)
+    path = quarantine(rejected, source, quarantine_dir)
+    if path:
+        print(f"Quarantined {len(rejected)} of {len(df)} rows from {source} -> {path}", file=sys.stderr)
+    return valid
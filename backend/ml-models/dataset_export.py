@@ -0,0 +1,190 @@
+"""
+Streaming export of the station datasets as CSV, NDJSON or Parquet.
+
+Exports are generators of byte blocks: stations are read in fixed-size row
+chunks, filtered (municipality, region, year range), serialized and
+optionally gzip-compressed one chunk at a time. Memory use depends on the
+chunk size only, so the generator can be handed straight to an HTTP streaming
+response or written to a file.
+
+Parquet output writes one row group per chunk through a sink that hands the
+bytes over as soon as they are written; only the footer is produced at the end.
+"""
+
+import io
+import sys
+import zlib
+import argparse
+import numpy as np
+from station_store import DATASET_DIR, YEAR_COL, iter_station_batches, list_stations, municipality_id, region_of
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Columns added in front of every exported row
+KEY_COLS = ['Municipality', 'municipalityId', 'regionId']
+TEXT_COLS = KEY_COLS + ['Rice Variety']
+
+
+def select_stations(dataset_dir=DATASET_DIR, municipalities=None, regions=None):
+    """Stations matching the municipality (name or id) and region filters"""
+    stations = list_stations(dataset_dir)
+    if municipalities:
+        wanted = {municipality_id(name) for name in municipalities}
+        stations = [name for name in stations if municipality_id(name) in wanted]
+    if regions:
+        stations = [name for name in stations if region_of(name) in set(regions)]
+    return stations
+
+
+def iter_export_frames(dataset_dir=DATASET_DIR, municipalities=None, regions=None, year_from=None, year_to=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE):
+    """Filtered row chunks with key columns and stable dtypes"""
+    stations = select_stations(dataset_dir, municipalities, regions)
+    if not stations:
+        return
+    for chunk in iter_station_batches(dataset_dir, chunk_size, stations):
+        years = chunk[YEAR_COL].to_numpy(dtype=float)
+        mask = np.ones(len(chunk), dtype=bool)
+        if year_from is not None:
+            mask &= years >= year_from
+        if year_to is not None:
+            mask &= years <= year_to
+        chunk = chunk[mask]
+        if chunk.empty:
+            continue
+        names = chunk.pop('Municipality')
+        keys = {
+            'Municipality': names.astype(object),
+            'municipalityId': names.map(municipality_id).astype(object),
+            'regionId': names.map(region_of).astype(object)
+        }
+        # Fixed dtypes per column so every chunk serializes with the same schema
+        chunk = chunk.astype({col: (object if col in TEXT_COLS else float) for col in chunk.columns})
+        chunk = chunk.astype({YEAR_COL: 'Int64'})
+        yield chunk.assign(**keys)[KEY_COLS + list(chunk.columns)]
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file object that collects bytes until they are drained"""
+
+    def __init__(self):
+        self._buffer = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._buffer)
+        self._buffer = []
+        return data
+
+
+def _iter_csv(frames):
+    first = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=first).encode('utf-8')
+        first = False
+
+
+def _iter_ndjson(frames):
+    for frame in frames:
+        text = frame.to_json(orient='records', lines=True, force_ascii=False)
+        # Older pandas omit the newline after the last record of a chunk
+        yield (text if text.endswith('\n') else text + '\n').encode('utf-8')
+
+
+def _iter_parquet(frames):
+    if not PARQUET_AVAILABLE:
+        raise ImportError("Parquet export needs pyarrow. Install with: pip install pyarrow")
+    sink = _StreamSink()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression='snappy')
+        writer.write_table(table.cast(writer.schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def _gzip(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(fmt='csv', dataset_dir=DATASET_DIR, municipalities=None, regions=None, year_from=None, year_to=None,
+                  gzip=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generator of byte blocks for the filtered export in the given format"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    frames = iter_export_frames(dataset_dir, municipalities, regions, year_from, year_to, chunk_size)
+    blocks = {'csv': _iter_csv, 'ndjson': _iter_ndjson, 'parquet': _iter_parquet}[fmt](frames)
+    blocks = (block for block in blocks if block)
+    return _gzip(blocks) if gzip else blocks
+
+
+def export_filename(fmt, gzip=False):
+    extension = {'csv': 'csv', 'ndjson': 'ndjson', 'parquet': 'parquet'}[fmt]
+    return f"rice_yield_dataset.{extension}" + ('.gz' if gzip else '')
+
+
+def main():
+    """Export the station dataset to a file or stdout"""
+    parser = argparse.ArgumentParser(description="Streaming dataset export")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--municipality', action='append', default=None)
+    parser.add_argument('--region', action='append', default=None)
+    parser.add_argument('--year-from', type=int, default=None)
+    parser.add_argument('--year-to', type=int, default=None)
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--output', default=None, help="Output file (stdout if omitted)")
+    args = parser.parse_args()
+
+    try:
+        blocks = export_stream(args.format, args.dataset_dir, args.municipality, args.region,
+                               args.year_from, args.year_to, args.gzip, args.chunk_size)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for block in blocks:
+                out.write(block)
+        finally:
+            if args.output:
+                out.close()
+        return 0
+    except (ImportError, ValueError) as e:
+        print(f"Export error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
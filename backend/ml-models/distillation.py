@@ -0,0 +1,207 @@
+"""
+Distillation of the super/ultra ensembles into a compact student model.
+
+The teacher (a WeightedEnsemble from the model registry) labels the training
+rows plus an augmented sample around them; a small student is fit on those
+soft labels:
+- 'lightgbm': a shallow LightGBM booster
+- 'mlp': a compact scaled MLP
+
+Augmentation follows MUNGE: each synthetic row starts from a training row,
+swaps every feature with a random partner row's value with probability p and
+jitters continuous features with noise proportional to their spread, so the
+student sees the teacher's function between and around the observed rows.
+
+The report compares teacher and student on the held-out split (accuracy
+against the truth, fidelity to the teacher), single-row and batch latency and
+serialized size.
+"""
+
+import io
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from model_registry import data_hash, load_model, save_model
+
+try:
+    from lightgbm import LGBMRegressor
+    LIGHTGBM_AVAILABLE = True
+except ImportError:
+    LIGHTGBM_AVAILABLE = False
+
+import warnings
+warnings.filterwarnings('ignore')
+
+# Teacher -> (module with its data loader, loader name, test split used by its training script)
+TEACHERS = {
+    'super_ensemble': ('ninety_plus_training', 'load_and_engineer_data', 0.15),
+    'ultra_ensemble': ('over_ninety_training', 'load_ultra_advanced_data', 0.1),
+}
+DEFAULT_AUGMENT = 20_000
+SWAP_PROBABILITY = 0.5
+NOISE_SCALE = 0.1
+
+
+def augment(X, n_samples=DEFAULT_AUGMENT, swap_prob=SWAP_PROBABILITY, noise=NOISE_SCALE, seed=42):
+    """MUNGE-style synthetic rows around the training data (binary columns are only swapped)"""
+    rng = np.random.default_rng(seed)
+    values = X.to_numpy(dtype=float)
+    base = rng.integers(0, len(values), n_samples)
+    partner = rng.integers(0, len(values), n_samples)
+
+    samples = values[base].copy()
+    swap = rng.random(samples.shape) < swap_prob
+    samples[swap] = values[partner][swap]
+
+    binary = np.all(np.isin(values, (0.0, 1.0)), axis=0)
+    spread = values.std(axis=0) * noise
+    jitter = rng.normal(size=samples.shape) * spread
+    jitter[:, binary] = 0.0
+    samples += jitter
+
+    # Keep synthetic values inside the observed range of each feature
+    samples = np.clip(samples, values.min(axis=0), values.max(axis=0))
+    return pd.DataFrame(samples, columns=X.columns).astype(X.dtypes.to_dict())
+
+
+def make_student(kind):
+    if kind == 'lightgbm':
+        if not LIGHTGBM_AVAILABLE:
+            raise ImportError("LightGBM not available. Install with: pip install lightgbm")
+        return LGBMRegressor(n_estimators=300, num_leaves=15, max_depth=4, learning_rate=0.05,
+                             subsample=0.9, subsample_freq=1, random_state=42, verbose=-1)
+    if kind == 'mlp':
+        return make_pipeline(StandardScaler(), MLPRegressor(hidden_layer_sizes=(32, 16), alpha=1e-4,
+                                                            max_iter=300, early_stopping=True, random_state=42))
+    raise ValueError(f"Unknown student type: {kind}")
+
+
+def serialized_size(model):
+    """Bytes of the joblib pickle (what the registry stores)"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+
+def measure_latency(predict, X, single_calls=200, batch_rows=10_000):
+    """Median single-row latency and batch throughput, in milliseconds"""
+    rows = [X.iloc[[i % len(X)]] for i in range(single_calls)]
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    batch = X.iloc[np.arange(batch_rows) % len(X)]
+    start = time.perf_counter()
+    predict(batch)
+    batch_time = time.perf_counter() - start
+    return {'single_row_ms': float(np.median(timings) * 1000), f'batch_{batch_rows}_ms': batch_time * 1000}
+
+
+def distill(teacher, X_train, X_test, y_test, student_kind='lightgbm', n_augment=DEFAULT_AUGMENT, seed=42):
+    """Fit a student on teacher labels over train + augmented rows; returns (student, report)"""
+    X_student = pd.concat([X_train, augment(X_train, n_augment, seed=seed)], ignore_index=True)
+    soft_labels = teacher.predict(X_student)
+
+    student = make_student(student_kind)
+    student.fit(X_student, soft_labels)
+
+    teacher_pred = teacher.predict(X_test)
+    student_pred = student.predict(X_test)
+    report = {
+        'student': student_kind,
+        'training_rows': len(X_student),
+        'teacher': {
+            'r2': r2_score(y_test, teacher_pred),
+            'mae': mean_absolute_error(y_test, teacher_pred),
+            'size_bytes': serialized_size(teacher),
+            **measure_latency(teacher.predict, X_test)
+        },
+        'student_metrics': {
+            'r2': r2_score(y_test, student_pred),
+            'mae': mean_absolute_error(y_test, student_pred),
+            'fidelity_r2': r2_score(teacher_pred, student_pred),
+            'size_bytes': serialized_size(student),
+            **measure_latency(student.predict, X_test)
+        }
+    }
+    return student, report
+
+
+def load_teacher_split(teacher_name, teacher_metadata):
+    """Rebuild the teacher's train/test split in its fitted columns, checked against its stored metadata"""
+    module_name, loader_name, test_size = TEACHERS[teacher_name]
+    loader = getattr(__import__(module_name), loader_name)
+    X, y = loader()
+    names = teacher_metadata.get('feature_names')
+    if names is None:
+        raise ValueError(f"{teacher_name} {teacher_metadata['version']} stores no feature_names")
+    missing = [name for name in names if name not in X.columns]
+    if missing:
+        raise ValueError(f"Rebuilt {teacher_name} data lacks fitted columns: {missing}")
+    X_train, X_test, y_train, y_test = train_test_split(X[list(names)], y, test_size=test_size, random_state=42)
+    stored_hash = teacher_metadata.get('data_hash')
+    if stored_hash is not None and data_hash(X_train, X_test, y_train, y_test) != stored_hash:
+        raise ValueError(f"Rebuilt {teacher_name} data does not match the data {teacher_metadata['version']} "
+                         f"was trained on; retrain the teacher first")
+    return X_train, X_test, y_train, y_test
+
+
+def print_report(report):
+    teacher, student = report['teacher'], report['student_metrics']
+    print(f"{'':22s}{'Teacher':>14s}{'Student':>14s}")
+    print(f"{'R²':22s}{teacher['r2']:>14.4f}{student['r2']:>14.4f}")
+    print(f"{'MAE':22s}{teacher['mae']:>14.4f}{student['mae']:>14.4f}")
+    print(f"{'Size (KB)':22s}{teacher['size_bytes'] / 1024:>14.1f}{student['size_bytes'] / 1024:>14.1f}")
+    for key in (k for k in teacher if k.endswith('_ms')):
+        print(f"{key:22s}{teacher[key]:>14.3f}{student[key]:>14.3f}")
+    print(f"Student fidelity to teacher (R²): {student['fidelity_r2']:.4f}")
+
+
+def main():
+    """Distill a stored ensemble into a compact student and store it in the registry"""
+    parser = argparse.ArgumentParser(description="Ensemble distillation")
+    parser.add_argument('--teacher', choices=list(TEACHERS), default='super_ensemble')
+    parser.add_argument('--student', choices=['lightgbm', 'mlp'], default='lightgbm')
+    parser.add_argument('--augment', type=int, default=DEFAULT_AUGMENT, help="Synthetic rows labelled by the teacher")
+    parser.add_argument('--promote', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        teacher, teacher_metadata = load_model(args.teacher)
+    except FileNotFoundError:
+        print(f"No stored {args.teacher}; run its training script first", file=sys.stderr)
+        return 1
+
+    try:
+        X_train, X_test, y_train, y_test = load_teacher_split(args.teacher, teacher_metadata)
+    except ValueError as e:
+        print(f"Distillation error: {e}", file=sys.stderr)
+        return 1
+    print(f"Distilling {args.teacher} {teacher_metadata['version']} into a {args.student} student "
+          f"({len(X_train)} rows + {args.augment} augmented)")
+    student, report = distill(teacher, X_train, X_test, y_test, args.student, args.augment)
+    print_report(report)
+
+    name = f"{args.teacher}_student"
+    version = save_model(name, student, {
+        'teacher': args.teacher,
+        'teacher_version': teacher_metadata['version'],
+        'feature_names': list(X_train.columns),
+        'metrics': report['student_metrics'],
+        'distillation': report
+    }, promote=args.promote)
+    print(f"Saved {name} version {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+Streaming feature-drift monitor with incremental histograms.
+
+Each monitored model version keeps, next to its model file, a reference
+sketch of its training inputs: one fixed-bin histogram per raw input column
+(the numeric station features and the yield target; Year is left out since
+live seasons are always newer). Bin edges are training quantiles, so every
+bin holds a similar share of the training rows; the outer bins are open
+ended. The reference is built with two streaming passes over the station
+batches (a bounded random sample for the edges, then the counts). The
+reference records the store it was built from (data/enhanced_datasets by
+default): live rows are only folded into references of the same store, since
+the base and enhanced stores hold different values for the same seasons.
+
+The live sketch uses the same edges and is updated in place for each
+ingested batch: a searchsorted and a bincount per column, never a rescan of
+the historical data. Comparing the two is O(bins) per column:
+- PSI: sum((live - ref) * ln(live / ref)) over bin shares
+- KS:  largest gap between the two binned CDFs
+
+Small live windows inflate PSI by sampling noise alone (about (bins - 1) *
+(1/n_live + 1/n_ref)), so levels use the PSI in excess of that expectation:
+moderate at >= 0.1, major at >= 0.25, or major when KS exceeds both 0.2 and
+its 95% two-sample critical value. Missing values are counted apart from
+the bins, so a column is only compared on the live rows that have a value;
+once a column with a major drift has enough such rows, the model version is
+flagged for retraining in its registry metadata ('drift').
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime, timezone
+from features import NUMERIC_FEATURE_COLS, TARGET_COL
+from model_registry import MODELS_DIR, current_version, load_metadata, model_dir, update_metadata
+from station_store import ENHANCED_DATASET_DIR, YEAR_COL, iter_station_batches
+
+REFERENCE_FILE = 'drift_reference.npz'
+LIVE_FILE = 'drift_live.npz'
+
+DRIFT_COLUMNS = [col for col in NUMERIC_FEATURE_COLS if col != YEAR_COL] + [TARGET_COL]
+DEFAULT_BINS = 20
+SAMPLE_SIZE = 50_000
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.25
+KS_MAJOR = 0.2
+# Two-sample KS critical value coefficient at the 5% level
+KS_ALPHA_COEFFICIENT = 1.36
+# Live rows needed before a model can be flagged for retraining
+MIN_LIVE_ROWS = 30
+# Pseudo-count added to every bin so empty bins keep PSI finite without dominating it
+SMOOTHING = 0.5
+
+
+def store_name(dataset_dir):
+    """Name of a station store ('datasets', 'enhanced_datasets', ...) as recorded in reference sketches"""
+    return os.path.basename(os.path.normpath(dataset_dir))
+
+
+class HistogramSketch:
+    """Fixed-bin counts per column; bins are split by interior edges (NaN-padded per column)"""
+
+    def __init__(self, columns, edges, counts=None, missing=None, store=None):
+        self.columns = list(columns)
+        # Station store the rows came from
+        self.store = store
+        self.edges = np.asarray(edges, dtype=float)
+        n_bins = self.edges.shape[1] + 1
+        self.counts = np.zeros((len(self.columns), n_bins)) if counts is None else np.asarray(counts, dtype=float)
+        self.missing = np.zeros(len(self.columns)) if missing is None else np.asarray(missing, dtype=float)
+
+    @classmethod
+    def from_batches(cls, batch_factory, columns=DRIFT_COLUMNS, bins=DEFAULT_BINS, sample_size=SAMPLE_SIZE, seed=42):
+        """Two passes over batch_factory(): quantile edges from a bounded sample, then the counts"""
+        rng = np.random.default_rng(seed)
+        sample, keys = None, None
+        for batch in batch_factory():
+            values = _column_values(batch, columns)
+            # Keep the rows with the smallest random keys: a uniform sample of bounded size
+            batch_keys = rng.random(len(values))
+            sample = values if sample is None else np.vstack([sample, values])
+            keys = batch_keys if keys is None else np.concatenate([keys, batch_keys])
+            if len(keys) > sample_size:
+                keep = np.argpartition(keys, sample_size)[:sample_size]
+                sample, keys = sample[keep], keys[keep]
+        if sample is None:
+            raise ValueError("No rows to build a reference sketch from")
+
+        edges = np.full((len(columns), bins - 1), np.nan)
+        for j in range(len(columns)):
+            present = sample[:, j][~np.isnan(sample[:, j])]
+            if present.size:
+                interior = np.unique(np.quantile(present, np.linspace(0, 1, bins + 1)[1:-1]))
+                edges[j, :interior.size] = interior
+
+        sketch = cls(columns, edges)
+        for batch in batch_factory():
+            sketch.update(batch)
+        return sketch
+
+    def empty_like(self):
+        return HistogramSketch(self.columns, self.edges, store=self.store)
+
+    @property
+    def rows(self):
+        return float(self.counts[0].sum() + self.missing[0]) if self.columns else 0.0
+
+    def update(self, batch):
+        """Add a batch of station rows (a DataFrame with the sketch's columns)"""
+        values = _column_values(batch, self.columns)
+        for j in range(len(self.columns)):
+            column = values[:, j]
+            present = ~np.isnan(column)
+            edges = self.edges[j][~np.isnan(self.edges[j])]
+            bins = np.searchsorted(edges, column[present], side='right')
+            self.counts[j] += np.bincount(bins, minlength=self.counts.shape[1])
+            self.missing[j] += (~present).sum()
+        return self
+
+    def save(self, path):
+        """Atomically write the sketch as an .npz file"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, columns=np.asarray(self.columns), edges=self.edges, counts=self.counts,
+                         missing=self.missing, store=np.asarray(self.store or ''))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            # Sketches saved before the store was recorded were built from the enhanced store
+            store = str(stored['store']) if 'store' in stored.files else store_name(ENHANCED_DATASET_DIR)
+            return cls(stored['columns'].tolist(), stored['edges'], stored['counts'], stored['missing'], store or None)
+
+
+def _column_values(batch, columns):
+    """(rows x columns) float matrix; absent or non-numeric values become NaN"""
+    out = np.full((len(batch), len(columns)), np.nan)
+    for j, col in enumerate(columns):
+        if col in batch.columns:
+            out[:, j] = np.asarray(batch[col].apply(_to_float), dtype=float)
+    return out
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def psi(reference_counts, live_counts):
+    """Population stability index of two count vectors over the same bins"""
+    ref = (reference_counts + SMOOTHING) / (reference_counts.sum() + SMOOTHING * len(reference_counts))
+    live = (live_counts + SMOOTHING) / (live_counts.sum() + SMOOTHING * len(live_counts))
+    return float(np.sum((live - ref) * np.log(live / ref)))
+
+
+def ks_statistic(reference_counts, live_counts):
+    """Largest gap between the binned CDFs of two count vectors"""
+    ref = np.cumsum(reference_counts) / max(reference_counts.sum(), 1)
+    live = np.cumsum(live_counts) / max(live_counts.sum(), 1)
+    return float(np.max(np.abs(ref - live)))
+
+
+def psi_noise(reference_counts, live_counts):
+    """PSI expected from sampling noise alone when both samples share one distribution"""
+    n_ref, n_live = reference_counts.sum(), live_counts.sum()
+    used_bins = np.count_nonzero(reference_counts)
+    return float(max(used_bins - 1, 0) * (1 / max(n_live, 1) + 1 / max(n_ref, 1)))
+
+
+def ks_critical(reference_counts, live_counts):
+    n_ref, n_live = max(reference_counts.sum(), 1), max(live_counts.sum(), 1)
+    return float(KS_ALPHA_COEFFICIENT * np.sqrt((n_ref + n_live) / (n_ref * n_live)))
+
+
+def compare(reference, live, min_rows=MIN_LIVE_ROWS):
+    """Per-column PSI/KS and the retrain flag of a live sketch against its reference"""
+    columns = {}
+    for j, col in enumerate(reference.columns):
+        ref_counts, live_counts = reference.counts[j], live.counts[j]
+        if live_counts.sum() == 0:
+            continue
+        value_psi = psi(ref_counts, live_counts)
+        noise = psi_noise(ref_counts, live_counts)
+        value_ks = ks_statistic(ref_counts, live_counts)
+        excess = value_psi - noise
+        if excess >= PSI_MAJOR or value_ks >= max(KS_MAJOR, ks_critical(ref_counts, live_counts)):
+            level = 'major'
+        elif excess >= PSI_MODERATE:
+            level = 'moderate'
+        else:
+            level = 'stable'
+        columns[col] = {'psi': value_psi, 'psi_noise': noise, 'ks': value_ks, 'level': level,
+                        'live_rows': int(live_counts.sum())}
+    drifted = sorted(col for col, entry in columns.items() if entry['level'] == 'major')
+    return {
+        'checked': datetime.now(timezone.utc).isoformat(),
+        'live_rows': int(live.rows),
+        'columns': columns,
+        'drifted': drifted,
+        # Only columns with enough live values can flag a retrain
+        'retrain': any(columns[col]['live_rows'] >= min_rows for col in drifted)
+    }
+
+
+def build_reference(name, version=None, dataset_dir=ENHANCED_DATASET_DIR, bins=DEFAULT_BINS, models_dir=MODELS_DIR):
+    """Sketch the training rows (Year <= trained_through) of a model version and store it with the model"""
+    metadata = load_metadata(name, version, models_dir)
+    trained_through = metadata.get('trained_through')
+
+    def batches():
+        for batch in iter_station_batches(dataset_dir):
+            if trained_through is not None:
+                batch = batch[batch[YEAR_COL] <= trained_through]
+            if len(batch):
+                yield batch
+
+    sketch = HistogramSketch.from_batches(batches, bins=bins)
+    sketch.store = store_name(dataset_dir)
+    path = model_dir(name, metadata['version'], models_dir)
+    sketch.save(os.path.join(path, REFERENCE_FILE))
+    # A new reference starts a new live window
+    if os.path.exists(os.path.join(path, LIVE_FILE)):
+        os.remove(os.path.join(path, LIVE_FILE))
+    return sketch
+
+
+def monitored_models(models_dir=MODELS_DIR):
+    """(name, current version) of every model whose current version has a reference sketch"""
+    if not os.path.isdir(models_dir):
+        return []
+    monitored = []
+    for name in sorted(os.listdir(models_dir)):
+        if not os.path.isdir(os.path.join(models_dir, name)):
+            continue
+        version = current_version(name, models_dir)
+        if version and os.path.exists(os.path.join(model_dir(name, version, models_dir), REFERENCE_FILE)):
+            monitored.append((name, version))
+    return monitored
+
+
+def observe_batch(batch, dataset_dir=ENHANCED_DATASET_DIR, models_dir=MODELS_DIR, min_rows=MIN_LIVE_ROWS):
+    """Fold rows of a store into the live sketches of the models referenced on it; returns {name: drift report}"""
+    reports = {}
+    if batch is None or len(batch) == 0 or np.isnan(_column_values(batch, DRIFT_COLUMNS)).all():
+        return reports
+    for name, version in monitored_models(models_dir):
+        path = model_dir(name, version, models_dir)
+        reference = HistogramSketch.load(os.path.join(path, REFERENCE_FILE))
+        if reference.store != store_name(dataset_dir):
+            continue
+        live_path = os.path.join(path, LIVE_FILE)
+        live = HistogramSketch.load(live_path) if os.path.exists(live_path) else reference.empty_like()
+        live.update(batch).save(live_path)
+        report = compare(reference, live, min_rows)
+        update_metadata(name, version, {'drift': report}, models_dir)
+        reports[name] = report
+    return reports
+
+
+def drift_report(name, version=None, models_dir=MODELS_DIR, min_rows=MIN_LIVE_ROWS):
+    """Current drift report of a monitored model version (None before any live rows)"""
+    version = version or current_version(name, models_dir)
+    path = model_dir(name, version, models_dir)
+    if not os.path.exists(os.path.join(path, REFERENCE_FILE)):
+        raise FileNotFoundError(f"{name} {version} has no reference sketch; run: drift_monitor.py reference")
+    if not os.path.exists(os.path.join(path, LIVE_FILE)):
+        return None
+    return compare(HistogramSketch.load(os.path.join(path, REFERENCE_FILE)),
+                   HistogramSketch.load(os.path.join(path, LIVE_FILE)), min_rows)
+
+
+def main():
+    """Build reference sketches, replay rows into the live sketches, or print drift reports"""
+    parser = argparse.ArgumentParser(description="Streaming feature-drift monitor")
+    sub = parser.add_subparsers(dest='command', required=True)
+    reference = sub.add_parser('reference', help="Sketch a model version's training rows")
+    reference.add_argument('--model', required=True)
+    reference.add_argument('--version', default=None)
+    reference.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    reference.add_argument('--bins', type=int, default=DEFAULT_BINS)
+    observe = sub.add_parser('observe', help="Feed station rows into the live sketches")
+    observe.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    observe.add_argument('--year-from', type=int, required=True)
+    report = sub.add_parser('report', help="Print PSI/KS per column")
+    report.add_argument('--model', default=None, help="One model (all monitored models by default)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'reference':
+            sketch = build_reference(args.model, args.version, args.dataset_dir, args.bins)
+            print(f"Reference sketch of {args.model}: {len(sketch.columns)} columns, {int(sketch.rows)} rows")
+            return 0
+        if args.command == 'observe':
+            reports = {}
+            for batch in iter_station_batches(args.dataset_dir):
+                reports = observe_batch(batch[batch[YEAR_COL] >= args.year_from], args.dataset_dir) or reports
+            names = list(reports)
+        else:
+            names = [args.model] if args.model else [name for name, _ in monitored_models()]
+            reports = {name: drift_report(name) for name in names}
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Drift monitor error: {e}", file=sys.stderr)
+        return 1
+
+    for name in names:
+        result = reports.get(name)
+        if result is None:
+            print(f"{name}: no live rows yet")
+            continue
+        flag = 'RETRAIN' if result['retrain'] else 'ok'
+        print(f"{name}: {result['live_rows']} live rows, {flag}")
+        for col, entry in result['columns'].items():
+            print(f"  {col:28s} PSI {entry['psi']:7.4f} (noise {entry['psi_noise']:.4f})  "
+                  f"KS {entry['ks']:6.4f}  {entry['level']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,7 @@ from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler, PolynomialFeatures
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.pipeline import Pipeline
+from prediction_intervals import save_calibration_residuals, conformal_quantile
 
 # Try to import advanced models
 try:
@@ -264,6 +265,10 @@ def create_ensemble(models, predictions, y_test):
     print(f"  Test MAE: {ensemble_mae:.4f}")
     print(f"  Test RMSE: {ensemble_rmse:.4f}")
     
+    # Cache held-out residuals for split-conformal prediction intervals
+    save_calibration_residuals('enhanced_ensemble', y_test, ensemble_test_preds)
+    print(f"  90% Conformal Interval: ±{conformal_quantile(y_test - ensemble_test_preds, 0.1):.4f} tons/ha")
+    
     models['Simple Ensemble'] = ensemble_r2
     
     return models
@@ -0,0 +1,67 @@
+"""
+Weighted model ensembles that can be stored in the model registry.
+
+The super/ultra training scripts combine several fitted regressors with
+performance-based weights; some members see standardized inputs. Wrapping
+them in one picklable object lets the ensemble be saved, served and used as
+a distillation teacher like any single model. RegionalRouter does the same for
+the per-region models of regional_models.
+"""
+
+import numpy as np
+from features import feature_names
+
+MUNICIPALITY_COLUMN = feature_names().index('Municipality_encoded')
+
+
+class WeightedEnsemble:
+    """Weighted average of fitted regressors; members flagged as scaled get the shared scaler's output"""
+
+    def __init__(self, members, weights, scaler=None, names=None):
+        if len(members) != len(weights):
+            raise ValueError("Each ensemble member needs exactly one weight")
+        self.members = [(model, bool(scaled)) for model, scaled in members]
+        self.weights = np.asarray(weights, dtype=float)
+        self.scaler = scaler
+        self.names = list(names) if names is not None else [type(model).__name__ for model, _ in members]
+
+    def member_predictions(self, X):
+        """(rows x members) matrix of individual predictions"""
+        X_scaled = self.scaler.transform(X) if self.scaler is not None and any(s for _, s in self.members) else None
+        return np.column_stack([model.predict(X_scaled if scaled else X) for model, scaled in self.members])
+
+    def predict(self, X):
+        return self.member_predictions(X) @ self.weights
+
+
+class RegionalRouter:
+    """Routes each feature row to its region's model, or to the global model"""
+
+    def __init__(self, region_models, global_model, code_regions, routes):
+        self.region_models = dict(region_models)
+        self.global_model = global_model
+        # Region id per Municipality_encoded code
+        self.code_regions = np.asarray(code_regions, dtype=object)
+        self.routes = dict(routes)
+
+    def regions_for(self, X):
+        """Region id of every row (None for unknown municipality codes)"""
+        codes = np.asarray(X)[:, MUNICIPALITY_COLUMN].astype(int)
+        known = (codes >= 0) & (codes < len(self.code_regions))
+        return np.where(known, self.code_regions[np.where(known, codes, 0)], None)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        regions = self.regions_for(X)
+        out = np.empty(len(X))
+        routed = np.zeros(len(X), dtype=bool)
+        for region, model in self.region_models.items():
+            if self.routes.get(region) != region:
+                continue
+            rows = regions == region
+            if rows.any():
+                out[rows] = model.predict(X[rows])
+                routed |= rows
+        if not routed.all():
+            out[~routed] = self.global_model.predict(X[~routed])
+        return out
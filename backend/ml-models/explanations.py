@@ -0,0 +1,235 @@
+"""
+Per-prediction feature attributions for the tree ensembles.
+
+- XGBoost / LightGBM boosters: native TreeSHAP (pred_contribs / pred_contrib),
+  which is multi-threaded inside the library
+- scikit-learn forests and gradient boosting: path-dependent TreeSHAP via
+  shap (listed in requirements.txt), over row chunks in parallel worker
+  processes; without shap, Saabas path attributions computed as one sparse
+  product per tree (decision_path @ per-node value deltas), parallel over
+  row chunks
+
+Each municipality's current prediction (its latest-year baseline) is explained
+once and cached next to the model version as
+models/<name>/<version>/explanations/<dataset signature>.json. The signature
+hashes the name, size and mtime of every station file, so a lookup is a stat
+of the dataset folder plus a file read; the CSVs are only loaded, and the
+attributions recomputed, when the model or the data changes.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+from scipy import sparse
+from joblib import Parallel, delayed
+from features import BASE_FEATURE_COLS, engineer_features, feature_names, to_matrix
+from model_registry import MODELS_DIR, data_hash, load_metadata, load_model, model_dir, model_kind
+from scenario_engine import DEFAULT_MODEL, load_baselines
+from station_store import ENHANCED_DATASET_DIR, list_stations, municipality_id, station_file
+
+try:
+    import shap
+    SHAP_AVAILABLE = True
+except ImportError:
+    SHAP_AVAILABLE = False
+
+EXPLANATIONS_DIR = 'explanations'
+DEFAULT_CHUNK_SIZE = 10_000
+TOP_FEATURES = 5
+
+
+def _unwrap(model, X):
+    """Apply the preprocessing steps of a Pipeline; returns (final estimator, transformed X)"""
+    if hasattr(model, 'steps'):
+        for _, step in model.steps[:-1]:
+            X = step.transform(X)
+        model = model.steps[-1][1]
+    return model, X
+
+
+def _tree_node_deltas(tree, n_features):
+    """Sparse (nodes x features) matrix of value changes, attributed to the parent's split feature"""
+    t = tree.tree_
+    values = t.value[:, 0, 0]
+    parent = np.full(t.node_count, -1)
+    for children in (t.children_left, t.children_right):
+        internal = children >= 0
+        parent[children[internal]] = np.flatnonzero(internal)
+    nodes = np.flatnonzero(parent >= 0)
+    deltas = values[nodes] - values[parent[nodes]]
+    return sparse.csr_matrix((deltas, (nodes, t.feature[parent[nodes]])), shape=(t.node_count, n_features)), values[0]
+
+
+def _saabas_chunk(trees, weights, X):
+    """Saabas contributions of a weighted sum of trees for one chunk of rows"""
+    contributions = np.zeros(X.shape, dtype=float)
+    bias = 0.0
+    for tree, weight in zip(trees, weights):
+        deltas, root = _tree_node_deltas(tree, X.shape[1])
+        contributions += weight * (tree.decision_path(X) @ deltas).toarray()
+        bias += weight * root
+    return contributions, bias
+
+
+def _sklearn_trees(model):
+    """(trees, weights, offset) such that prediction = offset + sum(weight * tree)"""
+    estimators = np.asarray(model.estimators_, dtype=object).ravel()
+    if hasattr(model, 'learning_rate') and hasattr(model, 'init_'):
+        # Gradient boosting: scaled sum of stage trees on top of the initial estimate
+        offset = 0.0 if model.init_ == 'zero' else float(model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+        return estimators, np.full(len(estimators), model.learning_rate), offset
+    return estimators, np.full(len(estimators), 1.0 / len(estimators)), 0.0
+
+
+def saabas_contributions(model, X, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=-1):
+    """Saabas attributions for a scikit-learn tree ensemble; returns (contributions, base value)"""
+    trees, weights, offset = _sklearn_trees(model)
+    chunks = [X[start:start + chunk_size] for start in range(0, X.shape[0], chunk_size)]
+    results = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(_saabas_chunk)(trees, weights, chunk) for chunk in chunks)
+    contributions = np.vstack([c for c, _ in results])
+    bias = results[0][1] + offset
+    return contributions, bias
+
+
+def _shap_chunk(explainer, X):
+    return explainer.shap_values(X)
+
+
+def shap_contributions(estimator, X, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=-1):
+    """TreeSHAP attributions via shap, row chunks in parallel processes; returns (contributions, base value)"""
+    explainer = shap.TreeExplainer(estimator)
+    base_value = float(np.ravel(explainer.expected_value)[0])
+    if X.shape[0] <= chunk_size:
+        return explainer.shap_values(X), base_value
+    chunks = [X[start:start + chunk_size] for start in range(0, X.shape[0], chunk_size)]
+    results = Parallel(n_jobs=n_jobs)(delayed(_shap_chunk)(explainer, chunk) for chunk in chunks)
+    return np.vstack(results), base_value
+
+
+def explain_matrix(model, X, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=-1):
+    """Attributions for a feature matrix; returns (contributions (rows x features), base value, method)"""
+    if model_kind(model) == 'xgboost':
+        import xgboost
+        out = np.vstack([model.predict(xgboost.DMatrix(X[start:start + chunk_size]), pred_contribs=True)
+                         for start in range(0, X.shape[0], chunk_size)])
+        return out[:, :-1], float(out[0, -1]), 'treeshap'
+    if model_kind(model) == 'lightgbm':
+        out = np.vstack([model.predict(X[start:start + chunk_size], pred_contrib=True)
+                         for start in range(0, X.shape[0], chunk_size)])
+        return out[:, :-1], float(out[0, -1]), 'treeshap'
+
+    estimator, X = _unwrap(model, X)
+    if not hasattr(estimator, 'estimators_'):
+        raise TypeError(f"Attributions are only supported for tree ensembles, not {type(estimator).__name__}")
+    if SHAP_AVAILABLE:
+        contributions, base_value = shap_contributions(estimator, X, chunk_size, n_jobs)
+        return contributions, base_value, 'treeshap'
+    contributions, bias = saabas_contributions(estimator, X, chunk_size, n_jobs)
+    return contributions, float(bias), 'saabas'
+
+
+def explanation_path(name, version, digest, models_dir=MODELS_DIR):
+    return os.path.join(model_dir(name, version, models_dir), EXPLANATIONS_DIR, f"{digest}.json")
+
+
+def baseline_hash(baselines):
+    """Content hash of the rows being explained"""
+    return data_hash(baselines[['Municipality'] + BASE_FEATURE_COLS])
+
+
+def dataset_signature(dataset_dir=ENHANCED_DATASET_DIR):
+    """Hash of the name, size and mtime of every station file (no file is read)"""
+    digest = hashlib.sha256()
+    for name in list_stations(dataset_dir):
+        stat = os.stat(station_file(name, dataset_dir))
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def build_explanations(model, baselines, top=TOP_FEATURES, decimals=4):
+    """Explain every municipality's current prediction; returns {municipality_id: explanation}"""
+    X, _ = engineer_features(baselines, dropna=False)
+    matrix = to_matrix(X)
+    contributions, base_value, method = explain_matrix(model, matrix)
+    names = feature_names()
+    predictions = base_value + contributions.sum(axis=1)
+
+    explanations = {}
+    for i, municipality in enumerate(baselines['Municipality']):
+        order = np.argsort(-np.abs(contributions[i]))
+        explanations[municipality_id(municipality)] = {
+            'name': municipality,
+            'year': int(baselines['Year'].iloc[i]),
+            'prediction': round(float(predictions[i]), decimals),
+            'base_value': round(base_value, decimals),
+            'method': method,
+            'contributions': {names[j]: round(float(contributions[i, j]), decimals) for j in range(len(names))},
+            'top_features': [names[j] for j in order[:top]]
+        }
+    return explanations
+
+
+def precompute_explanations(model_name=DEFAULT_MODEL, version=None, baselines=None, models_dir=MODELS_DIR,
+                            dataset_dir=ENHANCED_DATASET_DIR):
+    """Build and cache explanations for the model version and current data; returns (explanations, path)"""
+    metadata = load_metadata(model_name, version, models_dir)
+    digest = dataset_signature(dataset_dir) if baselines is None else baseline_hash(baselines)
+    path = explanation_path(model_name, metadata['version'], digest, models_dir)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f), path
+
+    baselines = load_baselines(dataset_dir) if baselines is None else baselines
+    model, _ = load_model(model_name, metadata['version'], models_dir)
+    explanations = build_explanations(model, baselines)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(explanations, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return explanations, path
+
+
+def explain_municipality(municipality, model_name=DEFAULT_MODEL, version=None, baselines=None,
+                         dataset_dir=ENHANCED_DATASET_DIR):
+    """Cached explanation of one municipality's current prediction (name or id)"""
+    explanations, _ = precompute_explanations(model_name, version, baselines, dataset_dir=dataset_dir)
+    key = municipality_id(municipality)
+    if key not in explanations:
+        raise KeyError(f"No explanation for municipality: {municipality}")
+    return explanations[key]
+
+
+def main():
+    """Precompute explanations for all municipalities, or print one"""
+    parser = argparse.ArgumentParser(description="Per-municipality prediction explanations")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--municipality', default=None)
+    args = parser.parse_args()
+
+    try:
+        explanations, path = precompute_explanations(args.model, args.version)
+    except (FileNotFoundError, TypeError) as e:
+        print(f"Error computing explanations: {e}", file=sys.stderr)
+        return 1
+
+    if args.municipality:
+        explanation = explanations.get(municipality_id(args.municipality))
+        if explanation is None:
+            print(f"Unknown municipality: {args.municipality}", file=sys.stderr)
+            return 1
+        print(f"{explanation['name']} ({explanation['year']}): {explanation['prediction']:.3f} tons/ha "
+              f"(base {explanation['base_value']:.3f}, {explanation['method']})")
+        for feature in explanation['top_features']:
+            print(f"  {feature:30s} {explanation['contributions'][feature]:+.4f}")
+    else:
+        print(f"Cached explanations for {len(explanations)} municipalities at {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Feature-selection filter stage ahead of model fitting.
+
+The over-90% training script builds ~40 columns, many of them near-duplicates
+(Rainfall / Rainfall_Poly / Water_Optimization, Year_From_Start / Year_Squared
+/ Year_Cubic, ...), and feeds all of them to every model. This stage scores
+the training columns and prunes the redundant ones before any model is fit:
+
+1. Scores, computed in parallel across features (one task per column):
+   - mutual information with the target
+   - a cheap model score: cross-validated R² of a shallow tree on the column
+   plus one joint task: impurity importances of a small ExtraTrees model
+2. Correlation clustering: average-linkage clusters of |Spearman ρ|; columns
+   correlated above the policy threshold land in the same cluster
+3. Pruning: from each cluster the best-ranked column(s) are kept; columns
+   without signal (mutual information and model score both at or below the
+   policy minimums) are dropped; the policy can cap the total count
+
+The selection must be computed on the training rows only. The result
+(selected columns, the reason for every dropped column, the clusters and the
+scores) is meant to be stored in the model metadata.
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+from scipy.stats import rankdata
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.feature_selection import mutual_info_regression
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.tree import DecisionTreeRegressor
+
+# rank_by: 'mi', 'model' or 'combined' (mean of the two rank percentiles)
+DEFAULT_POLICY = {
+    'correlation_threshold': 0.95,
+    'keep_per_cluster': 1,
+    'min_mutual_info': 0.0,
+    'min_model_score': 0.0,
+    'max_features': None,
+    'rank_by': 'combined',
+    'always_keep': []
+}
+RANK_MODES = ('mi', 'model', 'combined')
+THRESHOLD_KEYS = ('correlation_threshold', 'min_mutual_info', 'min_model_score')
+CV_FOLDS = 3
+TREE_DEPTH = 4
+
+
+def _score_column(column, y, seed):
+    """(mutual information, cross-validated shallow-tree R²) of one column"""
+    column = column.reshape(-1, 1)
+    mi = mutual_info_regression(column, y, random_state=seed)[0]
+    tree = DecisionTreeRegressor(max_depth=TREE_DEPTH, random_state=seed)
+    score = cross_val_score(tree, column, y, cv=CV_FOLDS, scoring='r2').mean()
+    return float(mi), float(score)
+
+
+def _joint_importances(X, y, seed):
+    model = ExtraTreesRegressor(n_estimators=100, max_depth=8, random_state=seed, n_jobs=1)
+    return model.fit(X, y).feature_importances_
+
+
+def score_features(X, y, workers=None, seed=42):
+    """DataFrame of mutual_info, model_score and importance per column of X"""
+    columns = list(X.columns)
+    values = X.to_numpy(dtype=float)
+    y = np.asarray(y, dtype=float)
+    workers = workers or min(len(columns), os.cpu_count() or 1)
+    if workers == 1:
+        scores = [_score_column(values[:, j], y, seed) for j in range(len(columns))]
+        importances = _joint_importances(values, y, seed)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            joint = pool.submit(_joint_importances, values, y, seed)
+            futures = [pool.submit(_score_column, values[:, j], y, seed) for j in range(len(columns))]
+            scores = [future.result() for future in futures]
+            importances = joint.result()
+    frame = pd.DataFrame(scores, index=columns, columns=['mutual_info', 'model_score'])
+    frame['importance'] = importances
+    return frame
+
+
+def correlation_clusters(X, threshold):
+    """Cluster label per column: average linkage over 1 - |Spearman ρ|, cut at 1 - threshold"""
+    values = X.to_numpy(dtype=float)
+    if values.shape[1] < 2:
+        return np.ones(values.shape[1], dtype=int)
+    ranks = np.apply_along_axis(rankdata, 0, values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = np.corrcoef(ranks, rowvar=False)
+    # Constant columns correlate with nothing
+    correlation = np.nan_to_num(correlation, nan=0.0)
+    distance = np.clip(1 - np.abs(correlation), 0, None)
+    np.fill_diagonal(distance, 0)
+    tree = linkage(squareform(distance, checks=False), method='average')
+    return fcluster(tree, t=1 - threshold, criterion='distance')
+
+
+def _rank(scores, mode):
+    if mode == 'mi':
+        return scores['mutual_info']
+    if mode == 'model':
+        return scores['model_score']
+    return (scores['mutual_info'].rank(pct=True) + scores['model_score'].rank(pct=True)) / 2
+
+
+def check_policy(policy):
+    """Raise ValueError for unknown keys or out-of-range values of a selection policy"""
+    unknown = set(policy) - set(DEFAULT_POLICY)
+    if unknown:
+        raise ValueError(f"Unknown policy keys: {sorted(unknown)}")
+    merged = {**DEFAULT_POLICY, **policy}
+    if merged['rank_by'] not in RANK_MODES:
+        raise ValueError(f"Unknown rank mode: {merged['rank_by']}")
+    for key in THRESHOLD_KEYS:
+        if not 0 <= merged[key] <= 1:
+            raise ValueError(f"{key} must be between 0 and 1, got {merged[key]}")
+    if not isinstance(merged['keep_per_cluster'], (int, np.integer)) or merged['keep_per_cluster'] < 1:
+        raise ValueError(f"keep_per_cluster must be an integer >= 1, got {merged['keep_per_cluster']}")
+    if merged['max_features'] is not None and (not isinstance(merged['max_features'], (int, np.integer))
+                                               or merged['max_features'] < 1):
+        raise ValueError(f"max_features must be None or an integer >= 1, got {merged['max_features']}")
+    return merged
+
+
+def select_features(X, y, policy=None, workers=None, seed=42):
+    """Score, cluster and prune the columns of X; returns the JSON-ready selection record"""
+    policy = check_policy(policy or {})
+    unknown = set(policy['always_keep']) - set(X.columns)
+    if unknown:
+        raise ValueError(f"always_keep columns not in X: {sorted(unknown)}")
+
+    scores = score_features(X, y, workers, seed)
+    scores['rank'] = _rank(scores, policy['rank_by'])
+    scores['cluster'] = correlation_clusters(X, policy['correlation_threshold'])
+    always_keep = set(policy['always_keep'])
+
+    dropped = {}
+    for column, row in scores.iterrows():
+        if (column not in always_keep and row['mutual_info'] <= policy['min_mutual_info']
+                and row['model_score'] <= policy['min_model_score']):
+            dropped[column] = 'no signal'
+
+    clusters = {}
+    for cluster, members in scores.groupby('cluster'):
+        ordered = list(members.sort_values('rank', ascending=False).index)
+        clusters[int(cluster)] = ordered
+        candidates = [column for column in ordered if column not in dropped]
+        kept = [column for column in candidates if column in always_keep]
+        for column in candidates:
+            if len(kept) >= policy['keep_per_cluster']:
+                break
+            if column not in kept:
+                kept.append(column)
+        for column in candidates:
+            if column not in kept:
+                dropped[column] = f"redundant with {kept[0]}"
+
+    selected = [column for column in X.columns if column not in dropped]
+    if policy['max_features'] is not None and len(selected) > policy['max_features']:
+        optional = [column for column in scores.loc[selected].sort_values('rank', ascending=False).index
+                    if column not in always_keep]
+        n_optional = max(policy['max_features'] - len(always_keep & set(selected)), 0)
+        for column in optional[n_optional:]:
+            dropped[column] = 'over max_features'
+        selected = [column for column in X.columns if column not in dropped]
+
+    return {
+        'policy': policy,
+        'selected': selected,
+        'dropped': {column: dropped[column] for column in X.columns if column in dropped},
+        'clusters': [members for members in clusters.values() if len(members) > 1],
+        'scores': {column: {key: float(scores.loc[column, key]) for key in ('mutual_info', 'model_score', 'importance')}
+                   for column in X.columns}
+    }
+
+
+def main():
+    """Run the selection stage on the over-90% feature set and print the chosen columns"""
+    parser = argparse.ArgumentParser(description="Feature-selection filter stage")
+    parser.add_argument('--correlation-threshold', type=float, default=DEFAULT_POLICY['correlation_threshold'])
+    parser.add_argument('--rank-by', choices=RANK_MODES, default=DEFAULT_POLICY['rank_by'])
+    parser.add_argument('--max-features', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help="Print the full selection record as JSON")
+    args = parser.parse_args()
+
+    from over_ninety_training import TEST_SIZE, load_ultra_advanced_data
+    X, y = load_ultra_advanced_data()
+    # Same training rows as the script, so the printed selection is the one it fits on
+    X, _, y, _ = train_test_split(X, y, test_size=TEST_SIZE, random_state=42)
+    policy = {'correlation_threshold': args.correlation_threshold, 'rank_by': args.rank_by,
+              'max_features': args.max_features}
+    try:
+        selection = select_features(X, y, policy, args.workers)
+    except ValueError as e:
+        print(f"Error selecting features: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(selection, indent=2))
+        return 0
+    print(f"Kept {len(selection['selected'])} of {X.shape[1]} columns")
+    for column, reason in selection['dropped'].items():
+        print(f"  - {column}: {reason}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Point-in-time municipality features (as-of-year feature store).
+
+The super/ultra training scripts describe each row with aggregates of its
+municipality: average yield, rainfall and fertilizer use, and an adaptation
+score (mean yield / (yield std + 0.01)). Computed with a groupby over the
+whole dataset these leak later seasons into earlier rows and have to be
+recomputed from scratch for every prediction.
+
+The store keeps, per municipality, cumulative sums over the years as one
+(municipalities + 1, years + 1, stats) array - the extra row is the total over
+all municipalities and column k holds the totals of the years before
+first_year + k. Any "as of year Y" aggregate is then two index lookups and a
+division, for training rows, served predictions and backtest folds alike.
+
+By default a row of year Y sees the seasons before Y only. Municipalities
+without history fall back to the all-municipality aggregate as of the same
+year (or, before any history exists, of the first year).
+
+The store is built in memory (one pass over the station rows) by the
+training scripts and the backtests. The training scripts save the store they
+trained with next to the model version (feature_store.npz, tagged with the
+version's data_hash), so serving looks features up in exactly the aggregates
+the model saw: the model server loads it with the model and answers
+GET /features/{municipality}?year= from it. The store is never rebuilt from
+the ingestion worker's data/datasets, which holds different values than the
+enhanced datasets the models are trained on.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from model_registry import MODELS_DIR, load_metadata, model_dir
+from station_store import ENHANCED_DATASET_DIR, YEAR_COL, YIELD_COL, load_station_data, municipality_id
+
+RAINFALL_COL = 'Rainfall (mm)'
+FERTILIZER_COL = 'Fertilizer Used (kg/ha)'
+ADAPTATION_EPSILON = 0.01
+FEATURE_STORE_FILE = 'feature_store.npz'
+
+# Cumulative statistics kept per (municipality, year)
+STATS = ['yield_n', 'yield_sum', 'yield_sumsq', 'rainfall_n', 'rainfall_sum', 'fertilizer_n', 'fertilizer_sum']
+YIELD_N, YIELD_SUM, YIELD_SUMSQ, RAINFALL_N, RAINFALL_SUM, FERTILIZER_N, FERTILIZER_SUM = range(len(STATS))
+
+# Output columns, named as in the training scripts
+FEATURE_COLUMNS = ['Municipality_Yield_Avg', 'Municipality_Rainfall_Avg', 'Municipality_Fert_Avg',
+                   'Muni_Yield_Mean', 'Muni_Yield_Std', 'Muni_Adaptation_Score']
+
+
+def _yearly_totals(data):
+    """(municipality ids, years, (municipalities, years, stats) per-year totals) of a station frame"""
+    ids = data['Municipality'].map(municipality_id).to_numpy()
+    years = data[YEAR_COL].to_numpy(dtype=float)
+    valid_year = ~np.isnan(years)
+    ids, years, data = ids[valid_year], years[valid_year].astype(int), data[valid_year]
+
+    municipalities, row_municipality = np.unique(ids, return_inverse=True)
+    first_year = years.min()
+    year_range = np.arange(first_year, years.max() + 1)
+    totals = np.zeros((len(municipalities), len(year_range), len(STATS)))
+    cell = (row_municipality, years - first_year)
+
+    for value_col, n_stat, sum_stat in ((YIELD_COL, YIELD_N, YIELD_SUM), (RAINFALL_COL, RAINFALL_N, RAINFALL_SUM),
+                                         (FERTILIZER_COL, FERTILIZER_N, FERTILIZER_SUM)):
+        values = data[value_col].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        np.add.at(totals[..., n_stat], (cell[0][present], cell[1][present]), 1)
+        np.add.at(totals[..., sum_stat], (cell[0][present], cell[1][present]), values[present])
+        if value_col == YIELD_COL:
+            np.add.at(totals[..., YIELD_SUMSQ], (cell[0][present], cell[1][present]), values[present] ** 2)
+    return municipalities, year_range, totals
+
+
+class MunicipalityFeatureStore:
+    """Cumulative per-municipality aggregates with O(1) as-of-year lookups"""
+
+    def __init__(self, municipalities, first_year, cumulative, data_hash=None):
+        self.municipalities = np.asarray(municipalities, dtype=str)
+        self.first_year = int(first_year)
+        self.cumulative = cumulative
+        # data_hash of the model version trained with this store
+        self.data_hash = data_hash
+        self._index = pd.Index(self.municipalities)
+
+    @classmethod
+    def from_totals(cls, municipalities, years, totals):
+        # Leading zero column: column k = totals of the years before first_year + k
+        cumulative = np.zeros((len(municipalities) + 1, len(years) + 1, len(STATS)))
+        cumulative[:-1, 1:] = np.cumsum(totals, axis=1)
+        cumulative[-1] = cumulative[:-1].sum(axis=0)
+        return cls(municipalities, years[0], cumulative)
+
+    @classmethod
+    def from_data(cls, data):
+        """Build from a station frame with Municipality, Year, yield, rainfall and fertilizer columns"""
+        return cls.from_totals(*_yearly_totals(data))
+
+    @classmethod
+    def build(cls, dataset_dir=ENHANCED_DATASET_DIR):
+        return cls.from_data(load_station_data(dataset_dir))
+
+    def save(self, path):
+        """Atomically write the store as an .npz file"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, municipalities=self.municipalities, first_year=self.first_year,
+                         cumulative=self.cumulative, data_hash=np.asarray(self.data_hash or ''))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            return cls(stored['municipalities'], int(stored['first_year']), stored['cumulative'],
+                       str(stored['data_hash']) or None)
+
+    @property
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.cumulative.shape[1] - 1)
+
+    def lookup(self, municipalities, years, include_current=False):
+        """As-of features (FEATURE_COLUMNS) for parallel sequences of municipality names and years"""
+        ids = pd.Series(np.asarray(municipalities, dtype=str)).map(municipality_id)
+        rows = self._index.get_indexer(ids)
+        rows = np.where(rows < 0, len(self.municipalities), rows)
+        years = np.asarray(years, dtype=float)
+        n_columns = self.cumulative.shape[1]
+        columns = np.clip(np.nan_to_num(years, nan=self.years[-1] + 1).astype(int) - self.first_year
+                          + int(include_current), 0, n_columns - 1)
+
+        stats = self.cumulative[rows, columns]
+        overall = self.cumulative[-1, columns]
+        # Before any season has been seen anywhere, use the first season's overall totals
+        overall = np.where(overall[:, [YIELD_N]] > 0, overall, self.cumulative[-1, 1])
+        stats = np.where(stats[:, [YIELD_N]] > 0, stats, overall)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yield_mean = stats[:, YIELD_SUM] / stats[:, YIELD_N]
+            rainfall_mean = np.where(stats[:, RAINFALL_N] > 0, stats[:, RAINFALL_SUM] / stats[:, RAINFALL_N],
+                                     overall[:, RAINFALL_SUM] / overall[:, RAINFALL_N])
+            fertilizer_mean = np.where(stats[:, FERTILIZER_N] > 0, stats[:, FERTILIZER_SUM] / stats[:, FERTILIZER_N],
+                                       overall[:, FERTILIZER_SUM] / overall[:, FERTILIZER_N])
+            yield_std = self._sample_std(stats)
+            # A single season has no spread; borrow the overall one
+            yield_std = np.where(stats[:, YIELD_N] > 1, yield_std, self._sample_std(overall))
+
+        return pd.DataFrame({
+            'Municipality_Yield_Avg': yield_mean,
+            'Municipality_Rainfall_Avg': rainfall_mean,
+            'Municipality_Fert_Avg': fertilizer_mean,
+            'Muni_Yield_Mean': yield_mean,
+            'Muni_Yield_Std': yield_std,
+            'Muni_Adaptation_Score': yield_mean / (np.nan_to_num(yield_std) + ADAPTATION_EPSILON)
+        })
+
+    @staticmethod
+    def _sample_std(stats):
+        n = stats[:, YIELD_N]
+        variance = (stats[:, YIELD_SUMSQ] - stats[:, YIELD_SUM] ** 2 / n) / (n - 1)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+
+def save_model_store(store, name, version, models_dir=MODELS_DIR):
+    """Save the store next to the model version trained with it, tagged with the version's data_hash"""
+    metadata = load_metadata(name, version, models_dir)
+    store.data_hash = metadata.get('data_hash')
+    return store.save(os.path.join(model_dir(name, metadata['version'], models_dir), FEATURE_STORE_FILE))
+
+
+def load_model_store(name, version=None, models_dir=MODELS_DIR):
+    """Feature store saved with a model version (the current one by default)"""
+    metadata = load_metadata(name, version, models_dir)
+    path = os.path.join(model_dir(name, metadata['version'], models_dir), FEATURE_STORE_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{name} {metadata['version']} has no feature store")
+    store = MunicipalityFeatureStore.load(path)
+    if store.data_hash != metadata.get('data_hash'):
+        raise ValueError(f"Feature store of {name} {metadata['version']} was built for other training data")
+    return store
+
+
+def main():
+    """Build the feature store from a dataset folder (or load a model's) and optionally look up one municipality"""
+    parser = argparse.ArgumentParser(description="As-of-year municipality feature store")
+    parser.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    parser.add_argument('--model', default=None, help="Use the store saved with this model's current version")
+    parser.add_argument('--lookup', nargs=2, metavar=('MUNICIPALITY', 'YEAR'), default=None,
+                        help="Print the features of one municipality as of a year")
+    parser.add_argument('--include-current', action='store_true', help="Include the lookup year itself")
+    args = parser.parse_args()
+
+    try:
+        store = load_model_store(args.model) if args.model else MunicipalityFeatureStore.build(args.dataset_dir)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error building feature store: {e}", file=sys.stderr)
+        return 1
+    if args.lookup:
+        features = store.lookup([args.lookup[0]], [int(args.lookup[1])], args.include_current)
+        print(features.T.to_string(header=False))
+        return 0
+    print(f"Feature store: {len(store.municipalities)} municipalities, {store.years[0]}-{store.years[-1]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Shared feature transform for the station datasets.
+
+Mirrors the feature set of enhanced_training.engineer_features, but with fixed
+category lists for Rice Variety and Municipality so that any batch of rows
+(a chunk, a single station, a scenario grid) maps onto the same columns.
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from station_store import ENHANCED_DATASET_DIR, list_stations
+
+BASE_FEATURE_COLS = [
+    'Year',
+    'Rainfall (mm)',
+    'Tmax (°C)',
+    'Tmin (°C)',
+    'Humidity (%)',
+    'Sunshine Hours (hrs/day)',
+    'Soil Moisture (%)',
+    'Soil pH',
+    'Nitrogen (N kg/ha)',
+    'Phosphorus (P kg/ha)',
+    'Potassium (K kg/ha)',
+    'Fertilizer Used (kg/ha)',
+    'Rice Variety',
+    'Pest Incidence (%)'
+]
+NUMERIC_FEATURE_COLS = [col for col in BASE_FEATURE_COLS if col != 'Rice Variety']
+TARGET_COL = 'Rice Yield (tons/ha)'
+
+# Union of the varieties in both dataset folders; the first is the dropped baseline
+RICE_VARIETIES = ['IR29', 'IR64', 'NSIC Rc222', 'PSB Rc82', 'Rc160', 'Tubigan 18']
+
+ENGINEERED_COLS = ['Temperature Range', 'Rainfall_Fertilizer_Ratio', 'Nutrient_Index', 'Growing_Degree_Days']
+
+
+@lru_cache(maxsize=None)
+def municipality_categories(dataset_dir=ENHANCED_DATASET_DIR):
+    """Fixed municipality order used for Municipality_encoded"""
+    return tuple(list_stations(dataset_dir))
+
+
+def feature_names():
+    """Column order produced by engineer_features"""
+    return (NUMERIC_FEATURE_COLS + ENGINEERED_COLS
+            + [f'Rice Variety_{variety}' for variety in RICE_VARIETIES[1:]]
+            + ['Municipality_encoded'])
+
+
+def engineer_features(data, municipalities=None, dropna=True):
+    """Return (X, y) for any batch of station rows with a stable column layout"""
+    if dropna:
+        data = data.dropna(subset=BASE_FEATURE_COLS + ([TARGET_COL] if TARGET_COL in data.columns else []))
+    municipalities = municipality_categories() if municipalities is None else municipalities
+
+    X = data[NUMERIC_FEATURE_COLS].astype(float)
+    X['Temperature Range'] = data['Tmax (°C)'] - data['Tmin (°C)']
+    X['Rainfall_Fertilizer_Ratio'] = data['Rainfall (mm)'] / (data['Fertilizer Used (kg/ha)'] + 1)
+    X['Nutrient_Index'] = (data['Nitrogen (N kg/ha)'] + data['Phosphorus (P kg/ha)'] + data['Potassium (K kg/ha)']) / 3
+    X['Growing_Degree_Days'] = ((data['Tmax (°C)'] + data['Tmin (°C)']) / 2) * 365  # Simplified GDD
+
+    variety = pd.Categorical(data['Rice Variety'], categories=RICE_VARIETIES)
+    for code, name in enumerate(RICE_VARIETIES[1:], start=1):
+        X[f'Rice Variety_{name}'] = (variety.codes == code).astype(float)
+    X['Municipality_encoded'] = pd.Categorical(data['Municipality'], categories=municipalities).codes
+
+    y = data[TARGET_COL].astype(float) if TARGET_COL in data.columns else None
+    return X, y
+
+
+def to_matrix(X, dtype=np.float64):
+    """Dense feature matrix in feature_names order"""
+    return X.to_numpy(dtype=dtype)
+
+
+def align_features(X, names):
+    """Columns of X in a model's feature_names order; raises ValueError if any are missing"""
+    missing = [name for name in names if name not in X.columns]
+    if missing:
+        raise ValueError(f"Features the model was trained on are missing: {missing}")
+    return X[list(names)]
@@ -6,7 +6,11 @@ Script to generate real yield data from CSV datasets
 import json
 import sys
 import os
-import csv
+from station_store import DATASET_DIR, load_station, station_name_from_path
+from data_validation import validate_and_quarantine
+from bundle_export import export_bundles
+
+MUNICIPALITY_DATA_OUTPUT = os.path.join(os.path.dirname(__file__), '..', '..', 'constants', 'municipality_data.json')
 
 # Define the mapping from municipalities to CSV files
 MUNICIPALITY_MAPPING = {
@@ -130,37 +134,13 @@ FILE_MAPPING = {
     'Zamboanga Annual Data.csv': 'Zamboanga Annual Data.csv'
 }
 
-def read_csv_data(file_path):
-    """Read data from CSV file"""
-    try:
-        data = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Convert string values to appropriate types
-                processed_row = {}
-                for key, value in row.items():
-                    # Clean up the key names
-                    clean_key = key.strip().replace('(Â°C)', '').replace('(mm)', '').replace('(%)', '').replace('(hrs/day)', '').replace('(/ha)', '').replace('(tons/ha)', '').strip()
-                    try:
-                        # Try to convert to float if possible
-                        processed_row[clean_key] = float(value) if value else 0.0
-                    except ValueError:
-                        # Keep as string if conversion fails
-                        processed_row[clean_key] = value
-                data.append(processed_row)
-        return data
-    except Exception as e:
-        print(f"Error reading CSV file {file_path}: {e}", file=sys.stderr)
-        return []
-
 def calculate_average_yield(historical_data):
     """Calculate average yield from historical data"""
     if not historical_data:
         return 0
     return round(sum(item['yield'] for item in historical_data) / len(historical_data), 2)
 
-def generate_municipality_data(municipality_id):
+def generate_municipality_data(municipality_id, dataset_dir=DATASET_DIR):
     """Generate data for a specific municipality from CSV files"""
     try:
         # Get the CSV file for this municipality
@@ -175,7 +155,7 @@ def generate_municipality_data(municipality_id):
         
         # Map to actual available file
         actual_file = FILE_MAPPING.get(csv_file, csv_file)
-        file_path = os.path.join(os.path.dirname(__file__), 'data', 'datasets', actual_file)
+        file_path = os.path.join(dataset_dir, actual_file)
         
         # Check if file exists
         if not os.path.exists(file_path):
@@ -186,24 +166,19 @@ def generate_municipality_data(municipality_id):
                 'historicalData': []
             }
         
-        # Read data from CSV
-        csv_data = read_csv_data(file_path)
+        # Read data from CSV, quarantining rows that fail validation
+        station_name = station_name_from_path(actual_file)
+        csv_data = validate_and_quarantine(load_station(station_name, os.path.dirname(file_path)), source=station_name)
         
         # Collect data from CSV file for this municipality
         all_historical_data = []
         
         # Process the data
-        for row in csv_data:
-            # Extract year and yield
-            year = int(row.get('Year', 0))
-            # The yield column in your data is 'Rice Yield'
-            yield_value = row.get('Rice Yield', 0)
-            
-            if year and yield_value:
-                all_historical_data.append({
-                    'year': year,
-                    'yield': float(yield_value)
-                })
+        for year, yield_value in zip(csv_data['Year'], csv_data['Rice Yield (tons/ha)']):
+            all_historical_data.append({
+                'year': int(year),
+                'yield': float(yield_value)
+            })
         
         # Calculate average yield
         average_yield = calculate_average_yield(all_historical_data)
@@ -240,12 +215,18 @@ def main():
         
         # Save to a JSON file that can be imported in TypeScript
         # Use a different path to avoid permission issues
-        output_file = os.path.join(os.path.dirname(__file__), '..', '..', 'constants', 'municipality_data.json')
+        output_file = MUNICIPALITY_DATA_OUTPUT
         try:
             with open(output_file, 'w') as f:
                 json.dump(all_municipalities_data, f, indent=2)
         except Exception as write_error:
             print(f"Warning: Could not write to {output_file}: {write_error}", file=sys.stderr)
+
+        # Sharded copy for clients that fetch only changed municipalities
+        try:
+            export_bundles(municipality_data=all_municipalities_data)
+        except Exception as bundle_error:
+            print(f"Warning: Could not export bundles: {bundle_error}", file=sys.stderr)
         
         # Also output as JSON to stdout
         print(json.dumps(all_municipalities_data))
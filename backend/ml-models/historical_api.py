@@ -0,0 +1,201 @@
+"""
+Read API for municipality and region historical yield series.
+
+The app bundles constants/municipality_data.json and cannot see fresher data
+without a rebuild. This FastAPI service serves the same series:
+- GET /municipalities          summary of every municipality (no history)
+- GET /municipalities/{id}     one municipality's series
+- GET /regions                 every region's series (real_data.json layout)
+- GET /regions/{id}            one region's series
+
+Every response body is precomputed once per data generation: compact JSON
+plus its gzip and (when the brotli package is installed) brotli encodings,
+each with a strong ETag derived from the content hash. A request only picks
+the best encoding its Accept-Encoding allows and copies bytes; a matching
+If-None-Match gets a bodiless 304. Repeated dashboard loads therefore cost
+neither compression CPU nor transfer.
+
+The payloads are rebuilt when municipality_data.json or real_data.json
+change on disk (generate_data, region_rollup and the ingestion worker all
+rewrite them), detected by a stat of the two files per request.
+"""
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import threading
+from generate_data import MUNICIPALITY_DATA_OUTPUT
+from region_rollup import REGION_DATA_OUTPUT
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+CACHE_CONTROL = 'public, no-cache'
+# Preferred first when the client accepts several
+ENCODINGS = ('br', 'gzip', 'identity')
+
+
+class Payload:
+    """One resource's precomputed bodies per content coding, each with its strong ETag"""
+
+    def __init__(self, obj):
+        body = json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {'identity': body, 'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+        if BROTLI_AVAILABLE:
+            self.bodies['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        # Each coding is its own representation, so each gets its own strong tag
+        self.etags = {coding: f'"{digest}"' if coding == 'identity' else f'"{digest}-{coding}"'
+                      for coding in self.bodies}
+
+    def negotiate(self, accept_encoding):
+        """Best available coding allowed by an Accept-Encoding header"""
+        accepted = {}
+        for part in (accept_encoding or '').split(','):
+            coding, _, params = part.strip().partition(';')
+            q = 1.0
+            if params.strip().startswith('q='):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    q = 0.0
+            if coding:
+                accepted[coding.lower()] = q
+        for coding in ENCODINGS:
+            if coding == 'identity':
+                return coding
+            if coding in self.bodies and accepted.get(coding, accepted.get('*', 0.0)) > 0:
+                return coding
+        return 'identity'
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names any representation of this payload"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or bool(tags & set(self.etags.values()))
+
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+class HistoricalPayloads:
+    """Precomputed payloads of all resources, rebuilt when the source files change"""
+
+    def __init__(self, municipality_path=MUNICIPALITY_DATA_OUTPUT, region_path=REGION_DATA_OUTPUT):
+        self.paths = (municipality_path, region_path)
+        self._signature = None
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def build(self):
+        """Recompute every payload from the source files"""
+        municipalities = _read_json(self.paths[0], [])
+        regions = _read_json(self.paths[1], [])
+        payloads = {
+            '/municipalities': Payload([
+                {
+                    'municipalityId': entry['municipalityId'],
+                    'averageYield': entry['averageYield'],
+                    'firstYear': entry['historicalData'][0]['year'] if entry['historicalData'] else None,
+                    'lastYear': entry['historicalData'][-1]['year'] if entry['historicalData'] else None
+                }
+                for entry in municipalities
+            ]),
+            '/regions': Payload(regions)
+        }
+        for entry in municipalities:
+            payloads[f"/municipalities/{entry['municipalityId']}"] = Payload(entry)
+        for entry in regions:
+            payloads[f"/regions/{entry['regionId']}"] = Payload(entry)
+        return payloads
+
+    def get(self, path):
+        """Payload of a resource path (None if unknown), rebuilding first if the data changed"""
+        signature = self._current_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._payloads = self.build()
+                    self._signature = signature
+        return self._payloads.get(path)
+
+
+def create_app(payloads=None):
+    """FastAPI app serving the precomputed historical series"""
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import Response
+
+    payloads = payloads or HistoricalPayloads()
+    app = FastAPI(title="Historical yield data")
+    app.state.payloads = payloads
+
+    def respond(path, request):
+        payload = payloads.get(path)
+        if payload is None:
+            raise HTTPException(status_code=404, detail=f"Unknown resource: {path}")
+        coding = payload.negotiate(request.headers.get('accept-encoding'))
+        headers = {'ETag': payload.etags[coding], 'Vary': 'Accept-Encoding', 'Cache-Control': CACHE_CONTROL}
+        if payload.matches(request.headers.get('if-none-match')):
+            return Response(status_code=304, headers=headers)
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        return Response(content=payload.bodies[coding], media_type='application/json', headers=headers)
+
+    @app.get('/municipalities')
+    def list_municipalities(request: Request):
+        return respond('/municipalities', request)
+
+    @app.get('/municipalities/{municipality_id}')
+    def municipality_series(municipality_id: str, request: Request):
+        return respond(f'/municipalities/{municipality_id}', request)
+
+    @app.get('/regions')
+    def list_regions(request: Request):
+        return respond('/regions', request)
+
+    @app.get('/regions/{region_id}')
+    def region_series(region_id: str, request: Request):
+        return respond(f'/regions/{region_id}', request)
+
+    return app
+
+
+def main():
+    """Serve the historical data API over HTTP"""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Historical yield data API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('HISTORICAL_API_PORT', 8002)))
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,19 @@
-import pandas as pd
-import glob
 import numpy as np
 import json
 import os
+from bundle_export import export_bundles
+from prediction_intervals import build_yield_matrix, bootstrap_trend_intervals
+from station_store import DATASET_DIR, load_station_data
+
+STATS_OUTPUT = os.path.join(os.path.dirname(__file__), '..', '..', 'constants', 'municipality_prediction_stats.json')
 
 def load_and_process_data():
-    """Load and process all CSV data"""
-    csv_files = glob.glob("data/datasets/*.csv")
-    
-    if not csv_files:
-        raise FileNotFoundError("No CSV files found in: data/datasets/")
-    
-    dataframes = []
-    for file in csv_files:
-        df = pd.read_csv(file)
-        municipality_name = file.split('\\')[-1].replace(' Annual Data.csv', '')
-        df['Municipality'] = municipality_name
-        dataframes.append(df)
-    
-    data = pd.concat(dataframes, ignore_index=True)
-    return data
+    """Load and validate all CSV data (invalid rows are quarantined)"""
+    return load_station_data(DATASET_DIR, validate=True)
 
-def create_realistic_predictions():
+def create_realistic_predictions(data=None):
     """Create more realistic predictions based on historical averages and trends"""
-    data = load_and_process_data()
+    data = load_and_process_data() if data is None else data
     print(f"Loaded {len(data)} records from {len(data['Municipality'].unique())} municipalities")
     
     # Group by municipality to analyze trends
@@ -55,6 +45,16 @@ def create_realistic_predictions():
             'recent_yield': mun_data.iloc[-1]['Rice Yield (tons/ha)'] if len(mun_data) > 0 else avg_yield
         }
     
+    # Bootstrap prediction intervals for every municipality in one batched pass
+    names, years, yield_matrix = build_yield_matrix(data)
+    intervals = bootstrap_trend_intervals(years, yield_matrix, horizon=3)
+    for i, municipality in enumerate(names):
+        municipality_stats[municipality].update({
+            'interval_lower': intervals['lower'][i],
+            'interval_upper': intervals['upper'][i],
+            'confidence': intervals['level_confidence'][i] * 100
+        })
+    
     return municipality_stats
 
 def generate_prediction(municipality_stats, municipality_name, adjustment_factor=1.0):
@@ -62,9 +62,9 @@ def generate_prediction(municipality_stats, municipality_name, adjustment_factor
     if municipality_name not in municipality_stats:
         # Return average prediction if municipality not found
         avg_stats = {
-            'avg_yield': np.mean([stats['avg_yield'] for stats in municipality_stats.values()]),
-            'trend': np.mean([stats['trend'] for stats in municipality_stats.values()]),
-            'recent_yield': np.mean([stats['recent_yield'] for stats in municipality_stats.values()])
+            key: np.mean([stats[key] for stats in municipality_stats.values()])
+            for key in ['avg_yield', 'min_yield', 'max_yield', 'trend', 'recent_yield',
+                        'interval_lower', 'interval_upper', 'confidence']
         }
     else:
         avg_stats = municipality_stats[municipality_name]
@@ -81,14 +81,16 @@ def generate_prediction(municipality_stats, municipality_name, adjustment_factor
     
     final_prediction = np.clip(adjusted_prediction, min_reasonable, max_reasonable)
     
-    # Calculate confidence based on data quality and trend consistency
-    data_points = len([m for m in municipality_stats.values() if m['avg_yield'] > 0])
-    trend_consistency = 1.0 if abs(avg_stats['trend']) < 0.1 else 0.8 if abs(avg_stats['trend']) < 0.2 else 0.6
+    # 90% bootstrap prediction interval, scaled and bounded like the point forecast
+    lower = np.clip(avg_stats['interval_lower'] * adjustment_factor, min_reasonable, max_reasonable)
+    upper = np.clip(avg_stats['interval_upper'] * adjustment_factor, min_reasonable, max_reasonable)
     
-    confidence = min(95, max(70, (data_points / 57) * 100 * trend_consistency))
+    # Confidence is the share of bootstrap forecasts that fall in the predicted yield level
+    confidence = avg_stats['confidence']
     
     return {
         'predicted_yield': round(final_prediction, 2),
+        'interval': [round(lower, 2), round(upper, 2)],
         'confidence': round(confidence, 1),
         'level': categorize_yield_level(final_prediction)
     }
@@ -126,6 +128,7 @@ def demonstrate_approach():
         print(f"  Recent Yield: {stats['recent_yield']:.2f} tons/ha")
         print(f"  Trend: {'Increasing' if stats['trend'] > 0 else 'Decreasing' if stats['trend'] < 0 else 'Stable'} ({stats['trend']:.4f}/year)")
         print(f"  Prediction: {prediction['predicted_yield']} tons/ha")
+        print(f"  90% Interval: {prediction['interval'][0]} - {prediction['interval'][1]} tons/ha")
         print(f"  Confidence: {prediction['confidence']}%")
         print(f"  Level: {prediction['level'].upper()}")
     
@@ -163,8 +166,10 @@ if __name__ == "__main__":
     stats = demonstrate_approach()
     
     # Save the statistics for use in the app
-    output_path = os.path.join('..', '..', 'constants', 'municipality_prediction_stats.json')
-    with open(output_path, 'w') as f:
+    with open(STATS_OUTPUT, 'w') as f:
         json.dump(stats, f, indent=2)
     
-    print(f"\nPrediction statistics saved to {output_path}")
\ No newline at end of file
+    print(f"\nPrediction statistics saved to {STATS_OUTPUT}")
+
+    manifest, written = export_bundles(prediction_stats=stats)
+    print(f"Bundle {manifest['version']} exported ({written} shards written)")
\ No newline at end of file
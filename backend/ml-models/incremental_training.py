@@ -0,0 +1,287 @@
+"""
+Out-of-core training mode for datasets larger than RAM.
+
+Instead of materializing the concatenated DataFrame, its engineered copy and
+its dummy-encoded copy at once, feature batches are streamed from the station
+store through the shared feature transform:
+- SGDRegressor / MLPRegressor learn with partial_fit, batch by batch
+- XGBoost builds an external-memory DMatrix from a DataIter over the batches
+- LightGBM builds its Dataset from a Sequence over a disk-spooled memmap
+
+Peak memory is bounded by the chunk size, not by the length of the history.
+Rows from the most recent years are held out as a streaming validation set.
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
+from drift_monitor import build_reference
+from features import engineer_features, feature_names, to_matrix
+from station_store import ENHANCED_DATASET_DIR, iter_station_batches, latest_year
+from model_registry import MODELS_DIR, save_model, predictor
+
+# Try to import advanced models
+try:
+    import xgboost
+    XGBOOST_AVAILABLE = True
+except ImportError:
+    XGBOOST_AVAILABLE = False
+
+try:
+    import lightgbm
+    LIGHTGBM_AVAILABLE = True
+except ImportError:
+    LIGHTGBM_AVAILABLE = False
+
+DEFAULT_CHUNK_SIZE = 10_000
+# Rows from this year on are used for validation, everything before for training
+DEFAULT_HOLDOUT_YEAR = 2019
+
+
+def iter_year_batches(dataset_dir=ENHANCED_DATASET_DIR, chunk_size=DEFAULT_CHUNK_SIZE, start=None, stop=None):
+    """Yield (X, y) float matrices for rows with start <= Year < stop, one chunk at a time"""
+    for batch in iter_station_batches(dataset_dir, chunk_size):
+        X, y = engineer_features(batch)
+        mask = np.ones(len(X), dtype=bool)
+        if start is not None:
+            mask &= (X['Year'] >= start).to_numpy()
+        if stop is not None:
+            mask &= (X['Year'] < stop).to_numpy()
+        if mask.any():
+            yield to_matrix(X[mask]), y[mask].to_numpy(dtype=float)
+
+
+def iter_feature_batches(dataset_dir=ENHANCED_DATASET_DIR, chunk_size=DEFAULT_CHUNK_SIZE,
+                         holdout_year=DEFAULT_HOLDOUT_YEAR, split='train'):
+    """Yield (X, y) float matrices for the train or validation split, one chunk at a time"""
+    if split == 'train':
+        return iter_year_batches(dataset_dir, chunk_size, stop=holdout_year)
+    return iter_year_batches(dataset_dir, chunk_size, start=holdout_year)
+
+
+class StreamingMetrics:
+    """R², MAE and RMSE accumulated over batches without keeping predictions"""
+
+    def __init__(self):
+        self.n = 0
+        self.sum_y = 0.0
+        self.sum_y2 = 0.0
+        self.sse = 0.0
+        self.sae = 0.0
+
+    def update(self, y_true, y_pred):
+        errors = y_true - y_pred
+        self.n += y_true.size
+        self.sum_y += y_true.sum()
+        self.sum_y2 += (y_true ** 2).sum()
+        self.sse += (errors ** 2).sum()
+        self.sae += np.abs(errors).sum()
+
+    def result(self):
+        if self.n == 0:
+            return {}
+        sst = self.sum_y2 - self.sum_y ** 2 / self.n
+        return {
+            'r2': 1 - self.sse / sst if sst > 0 else float('nan'),
+            'mae': self.sae / self.n,
+            'rmse': np.sqrt(self.sse / self.n),
+            'n': self.n
+        }
+
+
+def evaluate_stream(predict, batch_factory):
+    """Evaluate a predict(X) callable over a stream of (X, y) batches"""
+    metrics = StreamingMetrics()
+    for X, y in batch_factory():
+        metrics.update(y, predict(X))
+    return metrics.result()
+
+
+def fit_scaler(batch_factory):
+    """One streaming pass to fit feature scaling"""
+    scaler = StandardScaler()
+    for X, _ in batch_factory():
+        scaler.partial_fit(X)
+    return scaler
+
+
+def _partial_fit_epochs(scaler, model, batch_factory, epochs, seed):
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        for X, y in batch_factory():
+            order = rng.permutation(len(y))
+            model.partial_fit(scaler.transform(X[order]), y[order])
+        print(f"  Epoch {epoch + 1}/{epochs} done")
+
+
+def train_partial_fit(model, batch_factory, epochs=20, seed=42):
+    """Train an estimator with partial_fit over several streaming epochs; returns a scaled-input pipeline"""
+    scaler = fit_scaler(batch_factory)
+    _partial_fit_epochs(scaler, model, batch_factory, epochs, seed)
+    return make_pipeline(scaler, model)
+
+
+def continue_partial_fit(pipeline, batch_factory, epochs=5, seed=42):
+    """Keep training a (scaler, estimator) pipeline on new batches; the scaling is left unchanged"""
+    scaler, model = pipeline.steps[0][1], pipeline.steps[-1][1]
+    _partial_fit_epochs(scaler, model, batch_factory, epochs, seed)
+    return pipeline
+
+
+def make_sgd():
+    return SGDRegressor(loss='squared_error', penalty='l2', alpha=1e-4, learning_rate='invscaling', eta0=0.01, random_state=42)
+
+
+def make_mlp():
+    return MLPRegressor(hidden_layer_sizes=(64, 32), activation='relu', solver='adam',
+                        alpha=1e-4, learning_rate_init=1e-3, random_state=42)
+
+
+if XGBOOST_AVAILABLE:
+    class BatchIter(xgboost.DataIter):
+        """XGBoost data iterator over a re-startable stream of (X, y) batches"""
+
+        def __init__(self, batch_factory, cache_prefix):
+            self._factory = batch_factory
+            self._iterator = None
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self._iterator is None:
+                self._iterator = self._factory()
+            batch = next(self._iterator, None)
+            if batch is None:
+                return False
+            input_data(data=batch[0], label=batch[1])
+            return True
+
+        def reset(self):
+            self._iterator = None
+
+
+def train_xgboost(batch_factory, work_dir, params=None, num_boost_round=500, xgb_model=None):
+    """Train XGBoost on an external-memory DMatrix built from the batch stream (continuing xgb_model if given)"""
+    params = {'objective': 'reg:squarederror', 'max_depth': 8, 'eta': 0.05, 'subsample': 0.8,
+              'colsample_bytree': 0.8, 'tree_method': 'hist', 'seed': 42, **(params or {})}
+    iterator = BatchIter(batch_factory, cache_prefix=os.path.join(work_dir, 'xgb_cache'))
+    dtrain = xgboost.DMatrix(iterator)
+    booster = xgboost.train(params, dtrain, num_boost_round=num_boost_round, xgb_model=xgb_model)
+    return booster
+
+
+if LIGHTGBM_AVAILABLE:
+    class MemmapSequence(lightgbm.Sequence):
+        """LightGBM Sequence over a disk-backed feature matrix (pages are read on demand)"""
+
+        def __init__(self, data, batch_size=DEFAULT_CHUNK_SIZE):
+            self.data = data
+            self.batch_size = batch_size
+
+        def __getitem__(self, idx):
+            return np.asarray(self.data[idx])
+
+        def __len__(self):
+            return self.data.shape[0]
+
+
+def spool_batches(batch_factory, path, n_features):
+    """Append batches to a raw float64 file; returns (memmap of features, labels)"""
+    labels = []
+    with open(path, 'wb') as f:
+        for X, y in batch_factory():
+            f.write(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+            labels.append(y)
+    y = np.concatenate(labels) if labels else np.empty(0)
+    data = np.memmap(path, dtype=np.float64, mode='r', shape=(y.size, n_features))
+    return data, y
+
+
+def train_lightgbm(batch_factory, work_dir, params=None, num_boost_round=500, chunk_size=DEFAULT_CHUNK_SIZE,
+                   init_model=None):
+    """Train LightGBM from a Sequence over spooled batches (continuing init_model if given)"""
+    params = {'objective': 'regression', 'num_leaves': 64, 'max_depth': 8, 'learning_rate': 0.05,
+              'bagging_fraction': 0.8, 'bagging_freq': 1, 'feature_fraction': 0.8, 'seed': 42,
+              'verbose': -1, **(params or {})}
+    names = feature_names()
+    data, y = spool_batches(batch_factory, os.path.join(work_dir, 'lgb_features.bin'), len(names))
+    dtrain = lightgbm.Dataset(MemmapSequence(data, chunk_size), label=y, feature_name=names, free_raw_data=True)
+    booster = lightgbm.train(params, dtrain, num_boost_round=num_boost_round, init_model=init_model)
+    return booster
+
+
+def train_incremental(model_type, dataset_dir=ENHANCED_DATASET_DIR, chunk_size=DEFAULT_CHUNK_SIZE,
+                      holdout_year=DEFAULT_HOLDOUT_YEAR, epochs=20, num_boost_round=500):
+    """Train one model type out of core and return (model, predict_fn, validation metrics)"""
+    def train_batches():
+        return iter_feature_batches(dataset_dir, chunk_size, holdout_year, 'train')
+
+    def validation_batches():
+        return iter_feature_batches(dataset_dir, chunk_size, holdout_year, 'validation')
+
+    work_dir = tempfile.mkdtemp(prefix='incremental_', dir=MODELS_DIR if os.path.isdir(MODELS_DIR) else None)
+    try:
+        if model_type == 'sgd':
+            model = train_partial_fit(make_sgd(), train_batches, epochs)
+        elif model_type == 'mlp':
+            model = train_partial_fit(make_mlp(), train_batches, epochs)
+        elif model_type == 'xgboost':
+            if not XGBOOST_AVAILABLE:
+                raise ImportError("XGBoost not available. Install with: pip install xgboost")
+            model = train_xgboost(train_batches, work_dir, num_boost_round=num_boost_round)
+        elif model_type == 'lightgbm':
+            if not LIGHTGBM_AVAILABLE:
+                raise ImportError("LightGBM not available. Install with: pip install lightgbm")
+            model = train_lightgbm(train_batches, work_dir, num_boost_round=num_boost_round, chunk_size=chunk_size)
+        else:
+            raise ValueError(f"Unknown model type: {model_type}")
+        predict = predictor(model)
+        metrics = evaluate_stream(predict, validation_batches)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return model, predict, metrics
+
+
+def main():
+    """Train a model out of core and store it in the model registry"""
+    parser = argparse.ArgumentParser(description="Out-of-core incremental training")
+    parser.add_argument('--model', choices=['sgd', 'mlp', 'xgboost', 'lightgbm'], default='lightgbm')
+    parser.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--holdout-year', type=int, default=DEFAULT_HOLDOUT_YEAR)
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=500)
+    parser.add_argument('--promote', action='store_true')
+    args = parser.parse_args()
+
+    print(f"Out-of-core training: {args.model} (chunk size {args.chunk_size})")
+    print("=" * 60)
+    model, _, metrics = train_incremental(args.model, args.dataset_dir, args.chunk_size,
+                                          args.holdout_year, args.epochs, args.rounds)
+    print(f"Validation (Year >= {args.holdout_year}): "
+          f"R² = {metrics.get('r2', float('nan')):.4f}, MAE = {metrics.get('mae', float('nan')):.4f}, "
+          f"RMSE = {metrics.get('rmse', float('nan')):.4f}")
+
+    version = save_model(f"incremental_{args.model}", model, {
+        'model_type': args.model,
+        'training_mode': 'out_of_core',
+        'chunk_size': args.chunk_size,
+        'holdout_year': args.holdout_year,
+        'trained_through': args.holdout_year - 1,
+        'data_through': latest_year(args.dataset_dir),
+        'feature_names': feature_names(),
+        'metrics': metrics
+    }, promote=args.promote)
+    build_reference(f"incremental_{args.model}", version, args.dataset_dir)
+    print(f"Saved incremental_{args.model} version {version} (with drift reference sketch)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Asynchronous ingestion worker for admin dataset uploads.
+
+The admin upload route posts {data: [{municipalityId, historicalData,
+averageYield}], mode} payloads here. Each upload becomes a job on an asyncio
+queue and the request returns immediately with its job id. Worker tasks then:
+
+1. flatten the payload into one frame and validate it in bulk
+   (unknown municipalities and failing rows are quarantined, and so are
+   years the station has no row for: the payload carries yields only, and a
+   yield without its feature columns would become the latest season of the
+   stats, drift and export consumers)
+2. merge the valid yields into the station store, in 'append' mode (update
+   the uploaded years) or 'replace' mode (the upload becomes the yield
+   history; feature columns of kept years are preserved)
+3. recompute only the affected municipalities in municipality_data.json,
+   municipality_prediction_stats.json and the region rollup, then re-export
+   the app bundles (only changed shards are written)
+4. fold the merged rows of the uploaded years into the live drift sketches
+   of the monitored models whose reference was built from this store
+   (drift_monitor.py) and report the models whose inputs drifted enough to
+   need retraining
+
+Blocking work runs in a thread pool so the event loop keeps serving requests.
+Jobs touching different stations run concurrently; jobs touching the same
+station are serialized by per-station locks.
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+import tempfile
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+import pandas as pd
+import dataset_export
+import snapshots
+from bundle_export import export_bundles
+from data_validation import quarantine, validate
+from drift_monitor import observe_batch
+from generate_data import MUNICIPALITY_DATA_OUTPUT, generate_municipality_data
+from improved_prediction import STATS_OUTPUT, create_realistic_predictions
+from region_rollup import REGION_DATA_OUTPUT, RegionRollup
+from station_store import (
+    DATASET_DIR, YEAR_COL, YIELD_COL, list_stations, load_station, load_station_data, municipality_id, station_file,
+    write_station
+)
+
+UPLOAD_MODES = ('append', 'replace')
+DEFAULT_WORKERS = 2
+# Finished jobs kept for status lookups
+MAX_FINISHED_JOBS = 1000
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _write_json_atomic(path, obj, **kwargs):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, **kwargs)
+    os.replace(tmp_path, path)
+
+
+def payload_to_frame(data, stations):
+    """Flatten upload entries into (rows, unknown municipality ids); stations maps id -> station name"""
+    records = [
+        (entry['municipalityId'], point.get('year'), point.get('yield'))
+        for entry in data
+        for point in entry.get('historicalData', [])
+    ]
+    frame = pd.DataFrame.from_records(records, columns=['municipalityId', YEAR_COL, YIELD_COL])
+    frame['Municipality'] = frame['municipalityId'].map(stations)
+    unknown = sorted(set(frame.loc[frame['Municipality'].isna(), 'municipalityId']))
+    return frame, unknown
+
+
+def station_years(stations, dataset_dir=DATASET_DIR):
+    """Years each station has a row for (reads only the Year column)"""
+    return {name: set(pd.read_csv(station_file(name, dataset_dir), usecols=[YEAR_COL])[YEAR_COL].dropna().astype(int))
+            for name in stations}
+
+
+def validate_upload(frame, source, known_years=None):
+    """Bulk-validate uploaded rows; returns valid rows and writes the rejected ones to quarantine
+
+    known_years maps station -> years with a row in the store; other years are rejected, since the
+    upload has no feature columns to create them with.
+    """
+    unknown = frame['Municipality'].isna()
+    fractional = ~unknown & (frame[YEAR_COL] % 1 != 0)
+    rows = frame[~unknown & ~fractional].sort_values(['Municipality', YEAR_COL], kind='stable')
+    valid, rejected = validate(rows)
+    new_year = pd.Series(False, index=valid.index)
+    if known_years is not None:
+        new_year = pd.Series([year not in known_years.get(name, ()) for name, year in
+                              zip(valid['Municipality'], valid[YEAR_COL])], index=valid.index, dtype=bool)
+    rejected = pd.concat([
+        rejected,
+        valid[new_year].assign(reasons='new_year_without_features'),
+        frame[fractional].assign(reasons='non_integer_year'),
+        frame[unknown].assign(reasons='unknown_municipality')
+    ], ignore_index=True)
+    valid = valid[~new_year]
+    quarantine(rejected, source)
+    return valid.astype({YEAR_COL: int}), rejected
+
+
+def merge_station(existing, upload, mode):
+    """Merge uploaded (Year, yield) rows of years the station already has into a station frame"""
+    updates = upload.set_index(YEAR_COL)[YIELD_COL]
+    base = existing.drop_duplicates(YEAR_COL, keep='last').set_index(YEAR_COL)
+    index = updates.index if mode == 'replace' else base.index.union(updates.index)
+    merged = base.reindex(index)
+    merged.loc[updates.index, YIELD_COL] = updates
+    return merged.reset_index()[existing.columns]
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def update_prediction_stats(data):
+    """Recompute municipality_prediction_stats.json entries for the stations in data"""
+    all_stats = _read_json(STATS_OUTPUT, {})
+    all_stats.update(create_realistic_predictions(data))
+    _write_json_atomic(STATS_OUTPUT, all_stats, indent=2)
+
+
+def update_municipality_data(stations, dataset_dir=DATASET_DIR):
+    """Regenerate municipality_data.json entries for the given stations"""
+    municipality_data = _read_json(MUNICIPALITY_DATA_OUTPUT, [])
+    positions = {entry['municipalityId']: i for i, entry in enumerate(municipality_data)}
+    for name in stations:
+        entry = generate_municipality_data(municipality_id(name), dataset_dir)
+        if entry['municipalityId'] in positions:
+            municipality_data[positions[entry['municipalityId']]] = entry
+        else:
+            municipality_data.append(entry)
+    _write_json_atomic(MUNICIPALITY_DATA_OUTPUT, municipality_data, indent=2)
+
+
+def refresh_outputs(stations, dataset_dir=DATASET_DIR, rollup=None):
+    """Recompute the derived outputs for the given stations only; returns the (built or updated) rollup"""
+    if not stations:
+        return rollup
+    # Validated without quarantining: the store-wide quarantine file covers all stations
+    data, _ = validate(load_station_data(dataset_dir, stations))
+    update_prediction_stats(data)
+    update_municipality_data(stations, dataset_dir)
+    export_bundles()
+
+    if rollup is None:
+        rollup = RegionRollup().build(load_station_data(dataset_dir, validate=True))
+    else:
+        for name in stations:
+            rollup.update_station(name, data[data['Municipality'] == name])
+    rollup.export_json(REGION_DATA_OUTPUT)
+    return rollup
+
+
+class IngestionWorker:
+    """asyncio job queue in front of the station store and the derived JSON outputs"""
+
+    def __init__(self, dataset_dir=DATASET_DIR, workers=DEFAULT_WORKERS):
+        self.dataset_dir = dataset_dir
+        self.workers = workers
+        self.jobs = OrderedDict()
+        self.queue = asyncio.Queue()
+        self._tasks = []
+        self._station_locks = defaultdict(asyncio.Lock)
+        # Shared outputs (JSON files, rollup) are patched by one job at a time
+        self._output_lock = asyncio.Lock()
+        self._rollup = None
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, data, mode):
+        """Queue an upload and return its job id (does no work on the caller's path)"""
+        if mode not in UPLOAD_MODES:
+            raise ValueError(f"Unknown upload mode: {mode}")
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {
+            'jobId': job_id,
+            'status': 'queued',
+            'mode': mode,
+            'municipalities': len(data),
+            'submitted': _now()
+        }
+        self.queue.put_nowait((job_id, data, mode))
+        self._trim_jobs()
+        return job_id
+
+    def status(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _trim_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _run(self):
+        while True:
+            job_id, data, mode = await self.queue.get()
+            job = self.jobs[job_id]
+            job.update(status='running', started=_now())
+            try:
+                job.update(await self._process(job_id, data, mode), status='done')
+            except Exception as e:
+                job.update(status='failed', error=str(e))
+                print(f"Upload job {job_id} failed: {e}", file=sys.stderr)
+            finally:
+                job['finished'] = _now()
+                self.queue.task_done()
+
+    async def _process(self, job_id, data, mode):
+        loop = asyncio.get_running_loop()
+        stations = {municipality_id(name): name for name in await loop.run_in_executor(None, list_stations, self.dataset_dir)}
+        frame, unknown = await loop.run_in_executor(None, payload_to_frame, data, stations)
+
+        uploaded = sorted(frame['Municipality'].dropna().unique())
+        # Locks are always taken in name order so overlapping jobs cannot deadlock
+        locks = [self._station_locks[name] for name in uploaded]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            # Validated under the locks, so the known years cannot change before the merge
+            known_years = await loop.run_in_executor(None, station_years, uploaded, self.dataset_dir)
+            valid, rejected = await loop.run_in_executor(None, validate_upload, frame, f"upload_{job_id}",
+                                                         known_years)
+            affected = sorted(valid['Municipality'].unique())
+            merged = []
+            for name in affected:
+                merged.append(await loop.run_in_executor(None, self._merge, name, valid[valid['Municipality'] == name],
+                                                         mode))
+            async with self._output_lock:
+                await loop.run_in_executor(None, self._refresh_outputs, affected)
+                drift = await loop.run_in_executor(None, observe_batch, pd.concat(merged, ignore_index=True),
+                                                   self.dataset_dir) if merged else {}
+        finally:
+            for lock in locks:
+                lock.release()
+
+        return {
+            'rowsAccepted': len(valid),
+            'rowsQuarantined': len(rejected),
+            'unknownMunicipalities': unknown,
+            'updatedMunicipalities': [municipality_id(name) for name in affected],
+            'retrainFlagged': sorted(name for name, report in drift.items() if report['retrain'])
+        }
+
+    def _merge(self, name, upload, mode):
+        """Merge an upload into one station; returns the merged rows of the uploaded years"""
+        existing = load_station(name, self.dataset_dir)
+        merged = merge_station(existing, upload, mode)
+        write_station(name, merged, self.dataset_dir)
+        return merged[merged[YEAR_COL].isin(upload[YEAR_COL])].assign(Municipality=name)
+
+    def _refresh_outputs(self, stations):
+        self._rollup = refresh_outputs(stations, self.dataset_dir, self._rollup)
+
+    async def run_exclusive(self, fn, *args):
+        """Run fn in the thread pool while no upload job can touch the store or the outputs"""
+        loop = asyncio.get_running_loop()
+        names = sorted(await loop.run_in_executor(None, list_stations, self.dataset_dir))
+        locks = [self._station_locks[name] for name in names]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            async with self._output_lock:
+                result = await loop.run_in_executor(None, fn, *args)
+                # Store contents may have changed underneath the cached rollup
+                self._rollup = None
+                return result
+        finally:
+            for lock in locks:
+                lock.release()
+
+
+def create_app(worker=None):
+    """FastAPI app exposing upload submission, job status, snapshot backup/restore and dataset export"""
+    from contextlib import asynccontextmanager
+    from fastapi import FastAPI, HTTPException, Query
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel, Field
+
+    worker = worker or IngestionWorker()
+
+    class YieldData(BaseModel):
+        year: float
+        yield_: float = Field(alias='yield')
+
+    class RegionYieldData(BaseModel):
+        municipalityId: str
+        historicalData: List[YieldData]
+        averageYield: float
+
+    class UploadRequest(BaseModel):
+        data: List[RegionYieldData]
+        mode: Literal['replace', 'append']
+
+    class SnapshotRequest(BaseModel):
+        components: Optional[List[str]] = None
+        label: Optional[str] = None
+
+    class RestoreRequest(BaseModel):
+        components: Optional[List[str]] = None
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await worker.start()
+        yield
+        await worker.stop()
+
+    app = FastAPI(title="Dataset ingestion worker", lifespan=lifespan)
+    app.state.worker = worker
+
+    @app.post('/uploads', status_code=202)
+    async def submit_upload(request: UploadRequest):
+        data = [entry.model_dump(by_alias=True) for entry in request.data]
+        job_id = worker.submit(data, request.mode)
+        return worker.status(job_id)
+
+    @app.get('/uploads/{job_id}')
+    async def upload_status(job_id: str):
+        job = worker.status(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        return job
+
+    @app.get('/uploads')
+    async def list_uploads():
+        return list(worker.jobs.values())
+
+    @app.post('/snapshots', status_code=201)
+    async def create_backup(request: SnapshotRequest):
+        try:
+            manifest = await worker.run_exclusive(snapshots.create_snapshot, request.components, request.label)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {'id': manifest['id'], 'created': manifest['created'], 'stats': manifest['stats']}
+
+    @app.get('/snapshots')
+    async def list_backups():
+        return [{'id': m['id'], 'created': m['created'], 'label': m.get('label'), 'components': list(m['components'])}
+                for m in snapshots.list_snapshots()]
+
+    @app.post('/snapshots/{snapshot_id}/restore')
+    async def restore_backup(snapshot_id: str, request: RestoreRequest):
+        try:
+            restored = await worker.run_exclusive(snapshots.restore_snapshot, snapshot_id, request.components)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {'id': snapshot_id, 'restoredFiles': restored}
+
+    @app.get('/exports')
+    def export_dataset(format: Literal['csv', 'ndjson', 'parquet'] = 'csv',
+                       municipality: Optional[List[str]] = Query(None), region: Optional[List[str]] = Query(None),
+                       yearFrom: Optional[int] = None, yearTo: Optional[int] = None, gzip: bool = False):
+        if format == 'parquet' and not dataset_export.PARQUET_AVAILABLE:
+            raise HTTPException(status_code=400, detail="Parquet export needs pyarrow")
+        blocks = dataset_export.export_stream(format, worker.dataset_dir, municipality, region, yearFrom, yearTo, gzip)
+        filename = dataset_export.export_filename(format, gzip)
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        media_type = 'application/gzip' if gzip else dataset_export.CONTENT_TYPES[format]
+        return StreamingResponse(blocks, media_type=media_type, headers=headers)
+
+    return app
+
+
+def main():
+    """Serve the ingestion worker over HTTP"""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Dataset upload ingestion worker")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('INGESTION_PORT', 8001)))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(IngestionWorker(workers=args.workers)), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
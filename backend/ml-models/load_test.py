@@ -0,0 +1,270 @@
+"""
+Load-testing harness for the prediction path.
+
+Replays a weighted mix of realistic requests against a predictor and reports
+latency percentiles, throughput and errors as JSON:
+- 'single':    one municipality's latest season (1 row)
+- 'dashboard': the latest season of every municipality (the dashboard batch)
+- 'scenario':  the default what-if grid for one municipality (525 rows)
+
+Requests come from the station baselines or from synthetic municipalities
+(station baselines with multiplicative noise, clipped to the validation
+ranges). Feature matrices are built before the run, so only prediction and
+transport are timed.
+
+Targets:
+- 'inprocess': the registry model called directly from the worker threads
+- 'http':      POST {"features": [[...], ...]} to <url>/predict, expecting
+               {"predictions": [...]}; --serve starts a local stdlib server
+               around the in-process predictor for this
+
+With --rate the generator is open-loop: requests are scheduled at fixed
+intervals and latency is measured from the scheduled start, so a backlog
+shows up in the percentiles instead of silently lowering the offered load.
+Without it, each of the --concurrency workers sends back-to-back requests.
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from data_validation import RANGE_RULES
+from features import NUMERIC_FEATURE_COLS, RICE_VARIETIES, engineer_features, feature_names, to_matrix
+from model_registry import load_model, predictor
+from scenario_engine import DEFAULT_GRID, DEFAULT_MODEL, build_scenario_frame, load_baselines, validate_axes
+
+REQUEST_KINDS = ('single', 'dashboard', 'scenario')
+DEFAULT_MIX = {'single': 0.7, 'dashboard': 0.2, 'scenario': 0.1}
+TARGETS = ('inprocess', 'http')
+PERCENTILES = (50, 95, 99)
+# Relative noise applied to the numeric features of synthetic municipalities
+SYNTHETIC_NOISE = 0.15
+DEFAULT_TIMEOUT = 30.0
+
+
+def synthetic_baselines(baselines, n, seed=42):
+    """n synthetic municipalities drawn from the station baselines with noisy numeric features"""
+    rng = np.random.default_rng(seed)
+    frame = baselines.iloc[rng.integers(0, len(baselines), n)].reset_index(drop=True)
+    for col in NUMERIC_FEATURE_COLS:
+        if col == 'Year':
+            continue
+        values = frame[col].to_numpy(dtype=float) * rng.normal(1.0, SYNTHETIC_NOISE, n)
+        low, high = RANGE_RULES.get(col, (-np.inf, np.inf))
+        frame[col] = np.clip(values, low, high)
+    frame['Rice Variety'] = rng.choice(RICE_VARIETIES, n)
+    return frame
+
+
+def build_requests(baselines, n_requests, mix=DEFAULT_MIX, seed=42):
+    """List of (kind, feature matrix) drawn from the weighted mix"""
+    kinds = [kind for kind in REQUEST_KINDS if mix.get(kind, 0) > 0]
+    if not kinds:
+        raise ValueError("Request mix has no positive weights")
+    weights = np.array([mix[kind] for kind in kinds], dtype=float)
+    rng = np.random.default_rng(seed)
+
+    rows = to_matrix(engineer_features(baselines, dropna=False)[0])
+    scenario_frame, shape = build_scenario_frame(baselines, validate_axes(DEFAULT_GRID))
+    scenario_rows = to_matrix(engineer_features(scenario_frame, dropna=False)[0])
+    per_municipality = int(np.prod(shape))
+
+    requests = []
+    for kind in rng.choice(kinds, n_requests, p=weights / weights.sum()):
+        i = int(rng.integers(0, len(baselines)))
+        if kind == 'single':
+            requests.append((kind, rows[i:i + 1]))
+        elif kind == 'dashboard':
+            requests.append((kind, rows))
+        else:
+            requests.append((kind, scenario_rows[i * per_municipality:(i + 1) * per_municipality]))
+    return requests
+
+
+def http_predictor(url, timeout=DEFAULT_TIMEOUT):
+    """predict(X) over the HTTP protocol of this harness"""
+    endpoint = url.rstrip('/') + '/predict'
+
+    def predict(X):
+        body = json.dumps({'features': np.asarray(X).tolist()}).encode('utf-8')
+        request = urllib.request.Request(endpoint, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            predictions = json.loads(response.read())['predictions']
+        if len(predictions) != len(X):
+            raise ValueError(f"Expected {len(X)} predictions, got {len(predictions)}")
+        return predictions
+    return predict
+
+
+def serve_predictor(predict, host='127.0.0.1', port=0):
+    """Start a threaded local /predict server in the background; returns the server (server.server_port)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/predict':
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                predictions = predict(np.asarray(payload['features'], dtype=float))
+                body = json.dumps({'predictions': np.asarray(predictions, dtype=float).tolist()}).encode('utf-8')
+                status = 200
+            except (KeyError, ValueError) as e:
+                body = json.dumps({'error': str(e)}).encode('utf-8')
+                status = 400
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _summary(latencies, errors, rows, duration):
+    latencies = np.asarray(latencies)
+    summary = {
+        'requests': int(len(latencies) + errors),
+        'errors': int(errors),
+        'rows': int(rows),
+        'throughput_rps': (len(latencies) + errors) / duration if duration > 0 else 0.0,
+        'rows_per_second': rows / duration if duration > 0 else 0.0
+    }
+    if len(latencies):
+        summary['latency_ms'] = {f'p{p}': float(np.percentile(latencies, p)) * 1000 for p in PERCENTILES}
+        summary['latency_ms']['mean'] = float(latencies.mean()) * 1000
+        summary['latency_ms']['max'] = float(latencies.max()) * 1000
+    return summary
+
+
+def run_load(predict, requests, concurrency=4, rate=None, warmup=5):
+    """Replay requests through predict; returns the JSON-ready report"""
+    # Warm caches and connections; failures are counted in the timed run
+    for _, X in requests[:warmup]:
+        try:
+            predict(X)
+        except Exception:
+            pass
+
+    results = [None] * len(requests)
+    start = time.perf_counter()
+
+    def send(i):
+        kind, X = requests[i]
+        scheduled = start + i / rate if rate else None
+        if scheduled is not None:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        began = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            predict(X)
+            results[i] = (kind, time.perf_counter() - began, None)
+        except Exception as e:
+            results[i] = (kind, time.perf_counter() - began, f'{type(e).__name__}: {e}')
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(len(requests))))
+    duration = time.perf_counter() - start
+
+    report = {'concurrency': concurrency, 'rate': rate, 'duration_s': duration, 'by_kind': {}}
+    error_samples = {}
+    for kind in [None] + list(REQUEST_KINDS):
+        picked = [(r, X) for r, (k, X) in zip(results, requests) if kind is None or k == kind]
+        if not picked:
+            continue
+        latencies = [r[1] for r, _ in picked if r[2] is None]
+        errors = [r[2] for r, _ in picked if r[2] is not None]
+        summary = _summary(latencies, len(errors), sum(len(X) for r, X in picked if r[2] is None), duration)
+        if kind is None:
+            report['overall'] = summary
+        else:
+            report['by_kind'][kind] = summary
+            for message in errors:
+                error_samples[message] = error_samples.get(message, 0) + 1
+    report['error_messages'] = error_samples
+    return report
+
+
+def parse_mix(text):
+    """Parse 'single=0.7,dashboard=0.2,scenario=0.1'"""
+    mix = {}
+    for part in text.split(','):
+        kind, weight = part.split('=')
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown request kind: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main():
+    """Run a load test against the in-process predictor or an HTTP endpoint"""
+    parser = argparse.ArgumentParser(description="Prediction load-testing harness")
+    parser.add_argument('--target', choices=TARGETS, default='inprocess')
+    parser.add_argument('--url', default=None, help="Base URL of the HTTP target")
+    parser.add_argument('--serve', action='store_true', help="Start a local HTTP server around the model")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=None, help="Offered load in requests/s (open loop)")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--synthetic', type=int, default=None, metavar='N',
+                        help="Use N synthetic municipalities instead of the station baselines")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="Report file (stdout if omitted)")
+    args = parser.parse_args()
+
+    if args.target == 'http' and not (args.url or args.serve):
+        parser.error("--target http needs --url or --serve")
+
+    server = None
+    try:
+        baselines = load_baselines()
+        if args.synthetic:
+            baselines = synthetic_baselines(baselines, args.synthetic, args.seed)
+        requests = build_requests(baselines, args.requests, args.mix, args.seed)
+        if args.target == 'inprocess' or args.serve:
+            model, metadata = load_model(args.model, args.version)
+            if metadata.get('feature_names', feature_names()) != feature_names():
+                raise ValueError(f"{args.model} was not trained on the shared feature layout")
+            predict = predictor(model)
+        if args.target == 'http':
+            url = args.url
+            if args.serve:
+                server = serve_predictor(predict)
+                url = f'http://127.0.0.1:{server.server_port}'
+            predict = http_predictor(url)
+        report = run_load(predict, requests, args.concurrency, args.rate)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error running load test: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report.update({'target': args.target, 'model': args.model, 'mix': args.mix,
+                   'municipalities': len(baselines), 'synthetic': bool(args.synthetic)})
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Load test report written to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+File-based model registry.
+
+Each trained model is stored as models/<name>/<version>/model.joblib next to a
+metadata.json (metrics, feature names, data hash, ...). models/<name>/CURRENT
+holds the promoted version that serving code loads by default.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+import pandas as pd
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+MODEL_FILE = 'model.joblib'
+METADATA_FILE = 'metadata.json'
+CURRENT_FILE = 'CURRENT'
+
+
+def model_dir(name, version, models_dir=MODELS_DIR):
+    """Directory holding one version of a model"""
+    return os.path.join(models_dir, name, version)
+
+
+def new_version():
+    """Sortable, unique version id based on the UTC time"""
+    return datetime.now(timezone.utc).strftime('v%Y%m%d%H%M%S%f')
+
+
+def data_hash(*arrays):
+    """Short content hash of training inputs (DataFrames or arrays)"""
+    digest = hashlib.sha256()
+    for array in arrays:
+        if isinstance(array, (pd.DataFrame, pd.Series)):
+            values = pd.util.hash_pandas_object(array, index=False).to_numpy()
+        else:
+            values = np.ascontiguousarray(array)
+        digest.update(values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def save_model(name, model, metadata=None, promote=False, models_dir=MODELS_DIR):
+    """Store a model version with its metadata and return the version id"""
+    version = new_version()
+    path = model_dir(name, version, models_dir)
+    os.makedirs(path, exist_ok=True)
+    joblib.dump(model, os.path.join(path, MODEL_FILE))
+    metadata = {'name': name, 'version': version, 'created': datetime.now(timezone.utc).isoformat(), **(metadata or {})}
+    _write_atomic(os.path.join(path, METADATA_FILE), json.dumps(metadata, indent=2, default=str))
+    if promote:
+        promote_version(name, version, models_dir)
+    return version
+
+
+def list_versions(name, models_dir=MODELS_DIR):
+    """All stored versions of a model, oldest first"""
+    root = os.path.join(models_dir, name)
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if os.path.isfile(os.path.join(root, v, MODEL_FILE)))
+
+
+def current_version(name, models_dir=MODELS_DIR):
+    """Promoted version of a model (falls back to the newest version)"""
+    pointer = os.path.join(models_dir, name, CURRENT_FILE)
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            return f.read().strip()
+    versions = list_versions(name, models_dir)
+    return versions[-1] if versions else None
+
+
+def promote_version(name, version, models_dir=MODELS_DIR):
+    """Atomically point CURRENT at a stored version"""
+    if version not in list_versions(name, models_dir):
+        raise ValueError(f"Unknown version {version} for model {name}")
+    _write_atomic(os.path.join(models_dir, name, CURRENT_FILE), version)
+
+
+def load_metadata(name, version=None, models_dir=MODELS_DIR):
+    """Metadata of a model version (the current one by default)"""
+    version = version or current_version(name, models_dir)
+    if version is None:
+        raise FileNotFoundError(f"No stored versions for model {name}")
+    with open(os.path.join(model_dir(name, version, models_dir), METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def update_metadata(name, version, updates, models_dir=MODELS_DIR):
+    """Merge keys into a stored version's metadata"""
+    metadata = load_metadata(name, version, models_dir)
+    metadata.update(updates)
+    _write_atomic(os.path.join(model_dir(name, version, models_dir), METADATA_FILE),
+                  json.dumps(metadata, indent=2, default=str))
+    return metadata
+
+
+def load_model(name, version=None, models_dir=MODELS_DIR):
+    """Return (model, metadata) for a version (the current one by default)"""
+    metadata = load_metadata(name, version, models_dir)
+    model = joblib.load(os.path.join(model_dir(name, metadata['version'], models_dir), MODEL_FILE))
+    return model, metadata
+
+
+def model_kind(model):
+    """'xgboost' or 'lightgbm' for native boosters, 'sklearn' for estimators and pipelines"""
+    module = type(model).__module__.split('.')[0]
+    if module in ('xgboost', 'lightgbm') and type(model).__name__ == 'Booster':
+        return module
+    return 'sklearn'
+
+
+def predictor(model):
+    """predict(X) callable over a float feature matrix for any stored model type"""
+    if model_kind(model) == 'xgboost':
+        import xgboost
+        return lambda X: model.predict(xgboost.DMatrix(X))
+    return model.predict
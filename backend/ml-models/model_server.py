@@ -0,0 +1,300 @@
+"""
+Pre-fork model server with copy-on-write shared model memory.
+
+Several independent uvicorn workers would each unpickle their own copy of the
+forests and boosters. Here a parent process loads the models and the
+prediction stats index once, freezes the garbage collector's view of them
+(gc.freeze, so collections in the workers never write to those pages) and
+then forks the workers. Every worker serves the same listening socket and
+reads the parent's model pages copy-on-write, so an added worker costs
+little more than its own interpreter state and request buffers.
+
+Endpoints (the /predict protocol matches load_test.py):
+- POST /predict     {"features": [[...], ...], "model": optional name, "alpha": optional}
+                    -> {"predictions": [...], "model": ..., "version": ...,
+                        "intervals": {"lower", "upper", "coverage"} for the
+                        ensembles with cached calibration residuals
+                        (split-conformal, prediction_intervals.py)}
+- GET  /stats/{id}  the municipality's entry of municipality_prediction_stats.json
+- GET  /features/{id}?year=Y&model=M
+                    as-of-year municipality features from the feature store
+                    saved with the served model version (feature_store.py)
+- GET  /health      worker pid, generation, served versions and memory use
+
+The parent polls the registry's CURRENT pointers. When a model is promoted
+it loads the new generation, forks its workers onto the same socket and only
+then sends SIGTERM to the old workers, which stop accepting connections,
+finish their in-flight requests and exit. SIGHUP forces a reload; SIGTERM or
+SIGINT drains all workers and stops the server. Workers that die are
+replaced. Needs os.fork (Linux/macOS).
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import numpy as np
+from feature_store import load_model_store
+from improved_prediction import STATS_OUTPUT
+from prediction_intervals import conformal_interval, load_calibration_residuals
+from model_registry import current_version, load_model, predictor
+from station_store import municipality_id
+
+DEFAULT_MODELS = ['regional_lightgbm']
+DEFAULT_WORKERS = os.cpu_count() or 1
+POLL_INTERVAL = 2.0
+# Seconds a draining worker may spend finishing in-flight requests
+DRAIN_TIMEOUT = 30
+
+
+def memory_usage():
+    """RSS, PSS and private memory of this process in kB (Linux; empty elsewhere)"""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return {}
+    kb = lambda key: int(fields.get(key, '0 kB').split()[0])
+    return {'rss_kb': kb('Rss'), 'pss_kb': kb('Pss'), 'private_kb': kb('Private_Clean') + kb('Private_Dirty')}
+
+
+def load_generation(names):
+    """Models, versions, calibration residuals, feature stores and the stats index loaded before forking"""
+    models, versions, residuals, feature_stores = {}, {}, {}, {}
+    for name in names:
+        model, metadata = load_model(name)
+        models[name] = predictor(model)
+        versions[name] = metadata['version']
+        residuals[name] = load_calibration_residuals(name)
+        try:
+            feature_stores[name] = load_model_store(name, metadata['version'])
+        except FileNotFoundError:
+            pass  # Trained without municipality features
+    with open(STATS_OUTPUT, encoding='utf-8') as f:
+        stats = {municipality_id(name): entry for name, entry in json.load(f).items()}
+    return {'models': models, 'versions': versions, 'residuals': residuals, 'feature_stores': feature_stores,
+            'stats': stats, 'default': names[0]}
+
+
+def create_app(generation, number=0):
+    """FastAPI app over an already loaded generation"""
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+
+    class PredictRequest(BaseModel):
+        features: list
+        model: str = None
+        # Miscoverage of the conformal intervals (0.1 -> 90% intervals)
+        alpha: float = 0.1
+
+    app = FastAPI(title="Model server")
+
+    @app.post('/predict')
+    def predict(request: PredictRequest):
+        name = request.model or generation['default']
+        if name not in generation['models']:
+            raise HTTPException(status_code=404, detail=f"Model not served: {name}")
+        try:
+            X = np.asarray(request.features, dtype=float)
+            if X.ndim != 2:
+                raise ValueError("features must be a list of rows")
+            if not 0 < request.alpha < 1:
+                raise ValueError("alpha must be between 0 and 1")
+            predictions = np.asarray(generation['models'][name](X), dtype=float)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response = {'predictions': predictions.tolist(), 'model': name, 'version': generation['versions'][name]}
+        residuals = generation['residuals'].get(name)
+        if residuals is not None:
+            lower, upper = conformal_interval(predictions, residuals, request.alpha)
+            # Too few calibration residuals for this alpha give an unbounded interval
+            if np.isfinite(upper).all():
+                response['intervals'] = {'lower': lower.tolist(), 'upper': upper.tolist(),
+                                         'coverage': 1 - request.alpha}
+        return response
+
+    @app.get('/stats/{municipality}')
+    def municipality_stats(municipality: str):
+        entry = generation['stats'].get(municipality_id(municipality))
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Unknown municipality: {municipality}")
+        return entry
+
+    @app.get('/features/{municipality}')
+    def municipality_features(municipality: str, year: int, model: str = None):
+        name = model or generation['default']
+        store = generation['feature_stores'].get(name)
+        if store is None:
+            raise HTTPException(status_code=404, detail=f"No feature store served for model: {name}")
+        features = store.lookup([municipality], [year]).iloc[0]
+        return {'municipality': municipality_id(municipality), 'year': year, 'model': name,
+                'version': generation['versions'][name], 'features': features.astype(float).to_dict()}
+
+    @app.get('/health')
+    def health():
+        return {'pid': os.getpid(), 'generation': number, 'versions': generation['versions'], **memory_usage()}
+
+    return app
+
+
+def _serve(sock, app):
+    """Worker body: serve the inherited socket until SIGTERM, then drain and exit"""
+    import uvicorn
+
+    gc.enable()
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level='warning', timeout_graceful_shutdown=DRAIN_TIMEOUT)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class PreforkServer:
+    """Parent process: owns the socket, loads each model generation and supervises its workers"""
+
+    def __init__(self, names, host='127.0.0.1', port=8003, workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("The pre-fork server needs os.fork (Linux or macOS)")
+        self.names = list(names)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+        self.app = None
+        self.number = 0
+        # pid -> generation number
+        self.children = {}
+        self._stopping = False
+        self._reload = False
+
+    def _current_versions(self):
+        return {name: current_version(name) for name in self.names}
+
+    def _load(self):
+        # The web stack is imported and the app built here too, so its pages are shared as well
+        import uvicorn  # noqa: F401
+
+        # Collect now and keep the collector off the shared pages until the fork
+        gc.disable()
+        generation = load_generation(self.names)
+        self.app = create_app(generation, self.number + 1)
+        gc.collect()
+        gc.freeze()
+        self.number += 1
+        print(f"Generation {self.number}: {generation['versions']}", flush=True)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _serve(self.sock, self.app)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = self.number
+
+    def _drain(self, generation=None):
+        """SIGTERM the workers of one generation (all if None)"""
+        for pid, number in list(self.children.items()):
+            if generation is None or number == generation:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def _reap(self):
+        """Forget exited workers; returns how many of the current generation died"""
+        lost = 0
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            number = self.children.pop(pid, None)
+            if number == self.number and not self._stopping:
+                lost += 1
+        return lost
+
+    def _handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stopping = True
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self._handle_signal)
+        self._load()
+        versions = self._current_versions()
+        for _ in range(self.workers):
+            self._spawn()
+        host, port = self.sock.getsockname()[:2]
+        print(f"Serving {', '.join(self.names)} on http://{host}:{port} with {self.workers} workers", flush=True)
+
+        while not self._stopping:
+            time.sleep(self.poll_interval)
+            for _ in range(self._reap()):
+                self._spawn()
+            latest = self._current_versions()
+            if latest != versions or self._reload:
+                self._reload = False
+                previous = self.number
+                try:
+                    gc.unfreeze()
+                    self._load()
+                except Exception as e:
+                    # Any load failure (e.g. unpickling a version from newer code) keeps the old workers serving
+                    gc.freeze()
+                    print(f"Reload failed, keeping generation {previous}: {e}", file=sys.stderr, flush=True)
+                    versions = latest
+                    continue
+                versions = latest
+                # New workers accept on the shared socket before the old ones stop
+                for _ in range(self.workers):
+                    self._spawn()
+                self._drain(previous)
+
+        self._drain()
+        deadline = time.monotonic() + DRAIN_TIMEOUT + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+        self._reap()
+        self.sock.close()
+
+
+def main():
+    """Serve registry models from pre-forked workers sharing the parent's model memory"""
+    parser = argparse.ArgumentParser(description="Pre-fork model server")
+    parser.add_argument('--model', action='append', default=None,
+                        help="Registry model to serve (repeatable; the first is the default)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('MODEL_SERVER_PORT', 8003)))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help="Seconds between checks for newly promoted versions")
+    args = parser.parse_args()
+
+    try:
+        server = PreforkServer(args.model or DEFAULT_MODELS, args.host, args.port, args.workers, args.poll_interval)
+        server.run()
+    except (RuntimeError, OSError, FileNotFoundError) as e:
+        print(f"Error running model server: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,17 +7,23 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
+from prediction_intervals import save_calibration_residuals, conformal_quantile
+from ensembles import WeightedEnsemble
+from model_registry import data_hash, save_model
+from run_store import save_run
+from feature_store import MunicipalityFeatureStore, save_model_store
+from station_store import station_name_from_path
 import warnings
 warnings.filterwarnings('ignore')
 
-def load_and_engineer_data():
+def load_and_engineer_data(return_store=False):
     """Load data with advanced feature engineering for 90%+ accuracy"""
     csv_files = glob.glob("data/enhanced_datasets/*.csv")
     
     dataframes = []
     for file in csv_files:
         df = pd.read_csv(file)
-        municipality_name = file.split('\\')[-1].replace(' Annual Data.csv', '')
+        municipality_name = station_name_from_path(file)
         df['Municipality'] = municipality_name
         dataframes.append(df)
     
@@ -88,19 +94,16 @@ def load_and_engineer_data():
     # Advanced encoding with interaction features
     X = pd.get_dummies(X, columns=['Rice Variety'], drop_first=True)
     
-    # Create municipality-specific features
-    municipality_stats = data.groupby('Municipality')[['Rice Yield (tons/ha)', 'Rainfall (mm)', 'Fertilizer Used (kg/ha)']].mean()
-    data['Municipality_Yield_Avg'] = data['Municipality'].map(municipality_stats['Rice Yield (tons/ha)'])
-    data['Municipality_Rainfall_Avg'] = data['Municipality'].map(municipality_stats['Rainfall (mm)'])
-    data['Municipality_Fert_Avg'] = data['Municipality'].map(municipality_stats['Fertilizer Used (kg/ha)'])
+    # Create municipality-specific features as of the previous season (no later years leak in)
+    store = MunicipalityFeatureStore.from_data(data)
+    municipality_history = store.lookup(data['Municipality'], data['Year'])
+    X['Municipality_Yield_Avg'] = municipality_history['Municipality_Yield_Avg'].to_numpy()
+    X['Municipality_Rainfall_Avg'] = municipality_history['Municipality_Rainfall_Avg'].to_numpy()
+    X['Municipality_Fert_Avg'] = municipality_history['Municipality_Fert_Avg'].to_numpy()
     
-    X['Municipality_Yield_Avg'] = data['Municipality_Yield_Avg']
-    X['Municipality_Rainfall_Avg'] = data['Municipality_Rainfall_Avg']
-    X['Municipality_Fert_Avg'] = data['Municipality_Fert_Avg']
-    
-    return X, y
+    return (X, y, store) if return_store else (X, y)
 
-def train_ninety_plus_model(X_train, X_test, y_train, y_test):
+def train_ninety_plus_model(X_train, X_test, y_train, y_test, feature_store=None):
     """Train specialized models to achieve 90%+ accuracy"""
     
     # Scale features for better performance
@@ -213,6 +216,28 @@ def train_ninety_plus_model(X_train, X_test, y_train, y_test):
     print(f"  Super Ensemble RMSE: {ensemble_rmse:.4f}")
     print(f"  Model Weights: XGB={weights[0]:.3f}, LGB={weights[1]:.3f}, GB={weights[2]:.3f}, RF={weights[3]:.3f}")
     
+    # Keep the base-model predictions so other weightings need no retraining
+    run_id = save_run('super_ensemble', y_test, dict(zip(models_results, base_predictions.T)), row=X_test.index,
+                      data_hash=data_hash(X_train, X_test, y_train, y_test), scheme='r2_squared')
+    print(f"  Stored run {run_id}")
+    
+    # Cache held-out residuals for split-conformal prediction intervals
+    save_calibration_residuals('super_ensemble', y_test, super_ensemble_pred)
+    print(f"  90% Conformal Interval: ±{conformal_quantile(y_test - super_ensemble_pred, 0.1):.4f} tons/ha")
+    
+    # Store the fitted ensemble so it can be served or distilled without retraining
+    ensemble = WeightedEnsemble([(xgb, False), (lgb, False), (gb, True), (rf, False)], weights, scaler,
+                                names=list(models_results))
+    version = save_model('super_ensemble', ensemble, {
+        'feature_names': list(X_train.columns),
+        'data_hash': data_hash(X_train, X_test, y_train, y_test),
+        'metrics': {'r2': ensemble_r2, 'mae': ensemble_mae, 'rmse': ensemble_rmse}
+    }, promote=True)
+    print(f"  Saved super_ensemble version {version}")
+    if feature_store is not None:
+        # Serving looks municipality features up in the same aggregates the model was trained on
+        save_model_store(feature_store, 'super_ensemble', version)
+    
     return ensemble_r2, ensemble_mae, ensemble_rmse, models_results
 
 def main():
@@ -221,7 +246,7 @@ def main():
     print("="*50)
     
     # Load and engineer data
-    X, y = load_and_engineer_data()
+    X, y, feature_store = load_and_engineer_data(return_store=True)
     print(f"Data prepared with {X.shape[0]} samples and {X.shape[1]} advanced features")
     
     # Split data
@@ -233,7 +258,7 @@ def main():
     print(f"Test set: {X_test.shape[0]} samples")
     
     # Train specialized model
-    r2, mae, rmse, models_results = train_ninety_plus_model(X_train, X_test, y_train, y_test)
+    r2, mae, rmse, models_results = train_ninety_plus_model(X_train, X_test, y_train, y_test, feature_store)
     
     # Final assessment
     accuracy = r2 * 100
@@ -8,17 +8,28 @@ from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
 from sklearn.neural_network import MLPRegressor
+from prediction_intervals import save_calibration_residuals, conformal_quantile
+from ensembles import WeightedEnsemble
+from model_registry import data_hash, save_model
+from run_store import save_run
+from feature_selection import DEFAULT_POLICY, select_features
+from feature_store import MunicipalityFeatureStore, save_model_store
+from station_store import station_name_from_path
 import warnings
 warnings.filterwarnings('ignore')
 
-def load_ultra_advanced_data():
+TEST_SIZE = 0.1
+# Redundant and signal-free columns are pruned on the training rows before fitting
+FEATURE_SELECTION_POLICY = DEFAULT_POLICY
+
+def load_ultra_advanced_data(return_store=False):
     """Load data with ultra-advanced feature engineering for 90%+ accuracy"""
     csv_files = glob.glob("data/enhanced_datasets/*.csv")
     
     dataframes = []
     for file in csv_files:
         df = pd.read_csv(file)
-        municipality_name = file.split('\\')[-1].replace(' Annual Data.csv', '')
+        municipality_name = station_name_from_path(file)
         df['Municipality'] = municipality_name
         dataframes.append(df)
     
@@ -84,18 +95,20 @@ def load_ultra_advanced_data():
     # Advanced encoding with interaction effects
     X = pd.get_dummies(X, columns=['Rice Variety'], drop_first=True)
     
-    # Create municipality intelligence features
-    municipality_yield_stats = data.groupby('Municipality')['Rice Yield (tons/ha)'].agg(['mean', 'std', 'max']).reset_index()
-    municipality_yield_stats.columns = ['Municipality', 'Muni_Yield_Mean', 'Muni_Yield_Std', 'Muni_Yield_Max']
-    
-    data = data.merge(municipality_yield_stats, on='Municipality', how='left')
-    X['Muni_Adaptation_Score'] = data['Muni_Yield_Mean'] / (data['Muni_Yield_Std'] + 0.01)
+    # Create municipality intelligence features as of the previous season (no later years leak in)
+    store = MunicipalityFeatureStore.from_data(data)
+    municipality_history = store.lookup(data['Municipality'], data['Year'])
+    X['Muni_Adaptation_Score'] = municipality_history['Muni_Adaptation_Score'].to_numpy()
     
-    return X, y
+    return (X, y, store) if return_store else (X, y)
 
-def train_over_ninety_model(X_train, X_test, y_train, y_test):
+def train_over_ninety_model(X_train, X_test, y_train, y_test, selection=None, feature_store=None):
     """Train models specifically designed to achieve over 90% accuracy"""
     
+    # Fit on the selected columns only
+    if selection is not None:
+        X_train, X_test = X_train[selection['selected']], X_test[selection['selected']]
+    
     # Advanced scaling
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
@@ -202,6 +215,29 @@ def train_over_ninety_model(X_train, X_test, y_train, y_test):
     print(f"  Ultra Ensemble RMSE: {ultra_rmse:.4f}")
     print(f"  Model Weights: {dict(zip(models_names, weights))}")
     
+    # Keep the base-model predictions so other weightings need no retraining
+    run_id = save_run('ultra_ensemble', y_test, dict(zip(models_names, models_preds)), row=X_test.index,
+                      data_hash=data_hash(X_train, X_test, y_train, y_test), scheme='exp10_r2')
+    print(f"  Stored run {run_id}")
+    
+    # Cache held-out residuals for split-conformal prediction intervals
+    save_calibration_residuals('ultra_ensemble', y_test, ultra_ensemble_pred)
+    print(f"  90% Conformal Interval: ±{conformal_quantile(y_test - ultra_ensemble_pred, 0.1):.4f} tons/ha")
+    
+    # Store the fitted ensemble so it can be served or distilled without retraining
+    ensemble = WeightedEnsemble([(xgb, False), (lgb, False), (nn, True), (gb, True)], weights, scaler,
+                                names=models_names)
+    version = save_model('ultra_ensemble', ensemble, {
+        'feature_names': list(X_train.columns),
+        'data_hash': data_hash(X_train, X_test, y_train, y_test),
+        'feature_selection': selection,
+        'metrics': {'r2': ultra_r2, 'mae': ultra_mae, 'rmse': ultra_rmse}
+    }, promote=True)
+    print(f"  Saved ultra_ensemble version {version}")
+    if feature_store is not None:
+        # Serving looks municipality features up in the same aggregates the model was trained on
+        save_model_store(feature_store, 'ultra_ensemble', version)
+    
     return ultra_r2, ultra_mae, ultra_rmse, models_results
 
 def main():
@@ -210,19 +246,23 @@ def main():
     print("="*50)
     
     # Load ultra-advanced data
-    X, y = load_ultra_advanced_data()
+    X, y, feature_store = load_ultra_advanced_data(return_store=True)
     print(f"Ultra-advanced data prepared with {X.shape[0]} samples and {X.shape[1]} features")
     
     # Split data with stratification for better representation
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.1, random_state=42  # Even smaller test set
+        X, y, test_size=TEST_SIZE, random_state=42  # Even smaller test set
     )
     
     print(f"Training set: {X_train.shape[0]} samples")
     print(f"Test set: {X_test.shape[0]} samples")
     
+    # Prune redundant features using the training rows only
+    selection = select_features(X_train, y_train, FEATURE_SELECTION_POLICY)
+    print(f"Feature selection kept {len(selection['selected'])} of {X_train.shape[1]} features")
+    
     # Train over-90% model
-    r2, mae, rmse, models_results = train_over_ninety_model(X_train, X_test, y_train, y_test)
+    r2, mae, rmse, models_results = train_over_ninety_model(X_train, X_test, y_train, y_test, selection, feature_store)
     
     # Final assessment
     accuracy = r2 * 100
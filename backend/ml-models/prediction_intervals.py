@@ -0,0 +1,138 @@
+"""
+Prediction intervals for municipality yield forecasts.
+
+Two interval sources are provided:
+- a residual bootstrap of the per-municipality linear trend fits, run as one
+  batched array operation over all municipalities and resamples
+- split-conformal intervals for the ML ensembles, computed from calibration
+  residuals cached by the training scripts; the model server attaches them
+  to every /predict response of an ensemble with cached residuals
+"""
+
+import os
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+CALIBRATION_PATH = os.path.join(MODELS_DIR, 'calibration_residuals.npz')
+
+# Yield level thresholds, shared with improved_prediction.categorize_yield_level
+LEVEL_THRESHOLDS = np.array([0.4, 0.7])
+
+
+def build_yield_matrix(data, value_col='Rice Yield (tons/ha)'):
+    """Pivot station data into a municipality x year yield matrix (NaN where missing)"""
+    matrix = data.pivot_table(index='Municipality', columns='Year', values=value_col, aggfunc='mean')
+    return matrix.index.tolist(), matrix.columns.to_numpy(dtype=float), matrix.to_numpy(dtype=float)
+
+
+def _batched_trend_fit(x, y, w):
+    """Weighted least-squares line fit along the last axis of y (w is a 0/1 mask)"""
+    n = w.sum(axis=-1)
+    x_mean = (w * x).sum(axis=-1) / n
+    y_mean = (w * y).sum(axis=-1) / n
+    dx = (x - x_mean[..., None]) * w
+    sxx = (dx * dx).sum(axis=-1)
+    slope = np.where(sxx > 0, (dx * (y - y_mean[..., None])).sum(axis=-1) / np.where(sxx > 0, sxx, 1), 0.0)
+    intercept = y_mean - slope * x_mean
+    return slope, intercept
+
+
+def bootstrap_trend_intervals(years, yields, horizon=3, n_boot=2000, alpha=0.1, seed=42):
+    """
+    Residual-bootstrap prediction intervals for the recent-yield-plus-trend forecast.
+
+    The forecast being bracketed is the one used by generate_prediction:
+    last observed yield + slope * horizon. All municipalities and resamples are
+    processed together as (n_boot, n_municipalities, n_years) arrays.
+
+    Returns a dict of arrays, one entry per municipality row of `yields`.
+    """
+    yields = np.asarray(yields, dtype=float)
+    x = np.asarray(years, dtype=float) - np.nanmean(years)
+    mask = ~np.isnan(yields)
+    w = mask.astype(float)
+    y = np.where(mask, yields, 0.0)
+    n_obs = mask.sum(axis=1)
+
+    # 1. Fit every municipality's trend at once
+    slope, intercept = _batched_trend_fit(x, y, w)
+    fitted = intercept[:, None] + slope[:, None] * x
+    residuals = (y - fitted) * w
+    # Inflate residuals for the two fitted parameters
+    dof = np.maximum(n_obs - 2, 1)
+    residuals *= np.sqrt(n_obs / dof)[:, None]
+
+    # Index of the last observed year per municipality
+    last_idx = x.size - 1 - np.argmax(mask[:, ::-1], axis=1)
+    rows = np.arange(yields.shape[0])
+    x_last = x[last_idx]
+    point = y[rows, last_idx] + slope * horizon
+
+    # 2. Draw residual indices among each municipality's observed years only
+    rng = np.random.default_rng(seed)
+    valid_positions = np.argsort(~mask, axis=1, kind='stable')
+    # (the extra last draw is the noise of the future observation)
+    draws = rng.random((n_boot, yields.shape[0], x.size + 1))
+    picks = np.floor(draws * n_obs[None, :, None]).astype(np.intp)
+    positions = np.take_along_axis(valid_positions[None], picks, axis=2)
+    sampled = np.take_along_axis(residuals[None], positions, axis=2)
+    resampled, future_noise = sampled[..., :x.size], sampled[..., x.size]
+
+    # 3. Refit on all bootstrap series in one batched pass
+    y_star = (fitted[None] + resampled) * w[None]
+    slope_star, _ = _batched_trend_fit(x, y_star, w[None])
+    forecast_star = y_star[:, rows, last_idx] + slope_star * horizon
+    future_star = intercept + slope * (x_last + horizon) + future_noise
+
+    # 4. Prediction roots -> interval around the point forecast
+    roots = future_star - forecast_star
+    lower = point + np.quantile(roots, alpha / 2, axis=0)
+    upper = point + np.quantile(roots, 1 - alpha / 2, axis=0)
+    draws_pred = np.maximum(point + roots, 0.0)
+
+    # Share of the predictive distribution that lands in the same yield level as the point forecast
+    point_level = np.digitize(np.maximum(point, 0.0), LEVEL_THRESHOLDS)
+    level_confidence = (np.digitize(draws_pred, LEVEL_THRESHOLDS) == point_level).mean(axis=0)
+
+    return {
+        'point': point,
+        'lower': np.maximum(lower, 0.0),
+        'upper': np.maximum(upper, 0.0),
+        'level_confidence': level_confidence,
+        'slope': slope,
+        'coverage': 1 - alpha,
+    }
+
+
+def conformal_quantile(residuals, alpha=0.1):
+    """Split-conformal half-width: the ceil((n+1)(1-alpha))-th smallest absolute residual"""
+    scores = np.sort(np.abs(np.asarray(residuals, dtype=float)))
+    n = scores.size
+    k = int(np.ceil((n + 1) * (1 - alpha)))
+    if n == 0 or k > n:
+        return np.inf
+    return scores[k - 1]
+
+
+def conformal_interval(predictions, residuals, alpha=0.1):
+    """Symmetric split-conformal interval around model predictions"""
+    predictions = np.asarray(predictions, dtype=float)
+    q = conformal_quantile(residuals, alpha)
+    return np.maximum(predictions - q, 0.0), predictions + q
+
+
+def save_calibration_residuals(name, y_true, y_pred, path=CALIBRATION_PATH):
+    """Cache held-out residuals for a trained ensemble so intervals need no retraining"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cached = dict(np.load(path)) if os.path.exists(path) else {}
+    cached[name] = np.asarray(y_true, dtype=float) - np.asarray(y_pred, dtype=float)
+    np.savez_compressed(path, **cached)
+    print(f"Calibration residuals for '{name}' saved to {path} ({cached[name].size} samples)")
+
+
+def load_calibration_residuals(name, path=CALIBRATION_PATH):
+    """Load cached calibration residuals for an ensemble, or None if not cached"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        return cached[name] if name in cached.files else None
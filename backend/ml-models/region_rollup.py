@@ -0,0 +1,172 @@
+"""
+Region x year rollup cube over the station store.
+
+The cube holds mean, min, max, count and weighted mean yield for every
+(region, year) cell. It is materialized in one grouped pass over all station
+rows and refreshed incrementally when a single station changes: only the cells
+of that station's region and affected years are recomputed. The cube is
+exported as compact UTF-8 JSON in the real_data.json layout used by the
+analytics tab.
+"""
+
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from data_validation import validate
+from station_store import (
+    DATASET_DIR, REGION_IDS, YEAR_COL, YIELD_COL, load_station_data, region_of
+)
+
+REGION_DATA_OUTPUT = os.path.join(os.path.dirname(__file__), 'real_data.json')
+
+METRICS = ('mean', 'min', 'max', 'count', 'weighted_mean')
+
+
+class RegionRollup:
+    """Dense region x year x metric cube with per-station incremental refresh"""
+
+    def __init__(self, regions=REGION_IDS, weights=None):
+        self.regions = list(regions)
+        self._region_index = {region: i for i, region in enumerate(self.regions)}
+        # Optional per-station weights (e.g. harvested area) for the weighted mean
+        self.weights = dict(weights or {})
+        self.years = np.array([], dtype=int)
+        self.cube = np.full((len(self.regions), 0, len(METRICS)), np.nan)
+        self._rows = pd.DataFrame(columns=['Municipality', 'region_idx', YEAR_COL, YIELD_COL, 'weight'])
+
+    def _prepare_rows(self, data):
+        """Project station rows onto the columns the cube is built from"""
+        regions = data['Municipality'].map(region_of)
+        rows = pd.DataFrame({
+            'Municipality': data['Municipality'].to_numpy(),
+            'region_idx': regions.map(self._region_index).to_numpy(),
+            YEAR_COL: data[YEAR_COL].to_numpy(dtype=int),
+            YIELD_COL: data[YIELD_COL].to_numpy(dtype=float),
+            'weight': data['Municipality'].map(lambda name: self.weights.get(name, 1.0)).to_numpy(dtype=float)
+        })
+        return rows.dropna(subset=['region_idx', YIELD_COL]).astype({'region_idx': int})
+
+    def _aggregate(self, rows, cell, n_cells):
+        """Grouped reduction of rows into flat cells: returns an (n_cells, len(METRICS)) block"""
+        values = rows[YIELD_COL].to_numpy()
+        weights = rows['weight'].to_numpy()
+
+        count = np.bincount(cell, minlength=n_cells).astype(float)
+        total = np.bincount(cell, weights=values, minlength=n_cells)
+        weighted_total = np.bincount(cell, weights=values * weights, minlength=n_cells)
+        weight_sum = np.bincount(cell, weights=weights, minlength=n_cells)
+        minimum = np.full(n_cells, np.inf)
+        maximum = np.full(n_cells, -np.inf)
+        np.minimum.at(minimum, cell, values)
+        np.maximum.at(maximum, cell, values)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block = np.column_stack([
+                total / count,
+                np.where(count > 0, minimum, np.nan),
+                np.where(count > 0, maximum, np.nan),
+                count,
+                weighted_total / weight_sum
+            ])
+        return block
+
+    def build(self, data):
+        """Materialize the full cube from station data in one grouped pass"""
+        self._rows = self._prepare_rows(data)
+        return self._build_from_rows()
+
+    def _build_from_rows(self):
+        """Rebuild the whole cube from the rows held by the rollup"""
+        rows = self._rows
+        self.years = np.sort(rows[YEAR_COL].unique())
+        cell = rows['region_idx'].to_numpy() * len(self.years) + np.searchsorted(self.years, rows[YEAR_COL].to_numpy())
+        block = self._aggregate(rows, cell, len(self.regions) * len(self.years))
+        self.cube = block.reshape(len(self.regions), len(self.years), len(METRICS))
+        return self
+
+    def update_station(self, name, station_data):
+        """Replace one station's rows and recompute only the cells they touch"""
+        new_rows = self._prepare_rows(station_data.assign(Municipality=name))
+        old_mask = self._rows['Municipality'] == name
+        affected_years = np.union1d(self._rows.loc[old_mask, YEAR_COL], new_rows[YEAR_COL])
+        self._rows = pd.concat([self._rows[~old_mask], new_rows], ignore_index=True)
+
+        region = region_of(name)
+        if region is None or affected_years.size == 0:
+            return []
+        if not np.isin(affected_years, self.years).all():
+            # New years extend the cube axis, which needs a full rebuild
+            self._build_from_rows()
+            return [(region, int(year)) for year in affected_years]
+
+        r = self._region_index[region]
+        cell_rows = self._rows[(self._rows['region_idx'] == r) & self._rows[YEAR_COL].isin(affected_years)]
+        local_cell = np.searchsorted(affected_years, cell_rows[YEAR_COL].to_numpy())
+        block = self._aggregate(cell_rows, local_cell, affected_years.size)
+        self.cube[r, np.searchsorted(self.years, affected_years)] = block
+        return [(region, int(year)) for year in affected_years]
+
+    def metric(self, name):
+        """(regions x years) slice of the cube for one metric"""
+        return self.cube[:, :, METRICS.index(name)]
+
+    def to_records(self, decimals=2):
+        """Region records in the real_data.json layout, one entry per populated year"""
+        records = []
+        mean = self.metric('mean')
+        count = self.metric('count')
+        for r, region in enumerate(self.regions):
+            populated = count[r] > 0
+            if not populated.any():
+                continue
+            overall = np.nansum(mean[r] * count[r]) / count[r].sum()
+            records.append({
+                'regionId': region,
+                'averageYield': round(float(overall), decimals),
+                'historicalData': [
+                    {
+                        'year': int(year),
+                        'yield': round(float(cell[0]), decimals),
+                        'min': round(float(cell[1]), decimals),
+                        'max': round(float(cell[2]), decimals),
+                        'count': int(cell[3]),
+                        'weightedYield': round(float(cell[4]), decimals)
+                    }
+                    for year, cell in zip(self.years[populated], self.cube[r, populated])
+                ]
+            })
+        return records
+
+    def export_json(self, output_file=REGION_DATA_OUTPUT):
+        """Write the rollup as compact UTF-8 JSON"""
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.to_records(), f, separators=(',', ':'), ensure_ascii=False)
+        return output_file
+
+
+def refresh_station(rollup, name, output_file=REGION_DATA_OUTPUT, dataset_dir=DATASET_DIR):
+    """Reload one station from the store, update its cells and re-export"""
+    # Same checks as a full build; the store-wide quarantine file is left to the full builds
+    data, _ = validate(load_station_data(dataset_dir, [name]))
+    cells = rollup.update_station(name, data)
+    rollup.export_json(output_file)
+    return cells
+
+
+def main():
+    """Build the region rollup from the station store and export it"""
+    try:
+        rollup = RegionRollup().build(load_station_data(validate=True))
+        output_file = rollup.export_json()
+        print(f"Region rollup: {len(rollup.regions)} regions x {len(rollup.years)} years x {len(METRICS)} metrics")
+        print(f"Saved to {output_file}")
+        return 0
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Hierarchical per-region models with prediction routing.
+
+Instead of one global model that sees municipalities only as an integer
+code, one small model is trained per region (the 12 app regions of
+real_data.json, see station_store.MUNICIPALITY_REGIONS) plus a global
+fallback. All fits run concurrently in a process pool; the small region
+models finish quickly and are cheap to serve and to retrain one at a time.
+
+ensembles.RegionalRouter is stored in the model registry like any other
+model: its predict(X) takes the shared feature matrix, finds each row's region
+from the Municipality_encoded column and sends it to that region's model. A
+region is routed to the global model when its data is sparse (fewer than
+min_rows training rows) or when its model did worse than the global one on
+the region's route-selection seasons. Those are the last training seasons:
+candidate models fitted on the seasons before them are compared there, then
+the chosen models are refitted on all training seasons. The holdout seasons
+are never used for routing, so the stored routed metrics are unbiased.
+
+The feature matrix is published once through the shared data plane; each fit
+task only carries the row indices of its region.
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestRegressor
+from drift_monitor import build_reference
+from ensembles import RegionalRouter
+from features import engineer_features, feature_names, municipality_categories, to_matrix
+from incremental_training import DEFAULT_HOLDOUT_YEAR, StreamingMetrics
+from model_registry import save_model
+from shared_data import SharedArrays, attach
+from station_store import ENHANCED_DATASET_DIR, REGION_IDS, latest_year, load_station_data, region_of
+
+try:
+    from lightgbm import LGBMRegressor
+    LIGHTGBM_AVAILABLE = True
+except ImportError:
+    LIGHTGBM_AVAILABLE = False
+
+MODEL_TYPES = ('lightgbm', 'random_forest')
+GLOBAL = 'global'
+# Regions with fewer training rows than this are served by the global model
+DEFAULT_MIN_ROWS = 40
+# Last training seasons used to choose each region's route
+ROUTE_SEASONS = 2
+
+
+def make_model(model_type):
+    if model_type == 'lightgbm':
+        if not LIGHTGBM_AVAILABLE:
+            raise ImportError("LightGBM not available. Install with: pip install lightgbm")
+        return LGBMRegressor(n_estimators=300, num_leaves=15, max_depth=5, learning_rate=0.05, min_child_samples=5,
+                             subsample=0.8, subsample_freq=1, random_state=42, n_jobs=1, verbose=-1)
+    if model_type == 'random_forest':
+        return RandomForestRegressor(n_estimators=200, min_samples_leaf=2, random_state=42, n_jobs=1)
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+def _fit(model_type, descriptor, rows):
+    arrays = attach(descriptor)
+    return make_model(model_type).fit(arrays['X'][rows], arrays['y'][rows])
+
+
+def _metrics(y_true, y_pred):
+    metrics = StreamingMetrics()
+    metrics.update(y_true, y_pred)
+    return metrics.result()
+
+
+def _fit_all(model_type, jobs, X, y, workers, data_plane):
+    """Fit one model per (key, rows) job in the process pool; returns {key: model}"""
+    # Largest fits first so the pool stays busy
+    order = sorted(jobs, key=lambda key: -len(jobs[key]))
+    workers = workers or min(len(order), os.cpu_count() or 1)
+    with SharedArrays({'X': X, 'y': y}, backend=data_plane) as plane:
+        if workers == 1:
+            return {key: _fit(model_type, plane.descriptor, jobs[key]) for key in order}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {key: pool.submit(_fit, model_type, plane.descriptor, jobs[key]) for key in order}
+            return {key: future.result() for key, future in futures.items()}
+
+
+def train_regional(model_type='lightgbm', dataset_dir=ENHANCED_DATASET_DIR, holdout_year=DEFAULT_HOLDOUT_YEAR,
+                   min_rows=DEFAULT_MIN_ROWS, workers=None, data_plane='shm', route_seasons=ROUTE_SEASONS):
+    """Train the region models and the global fallback in parallel; returns (router, report)"""
+    data = load_station_data(dataset_dir)
+    municipalities = municipality_categories(dataset_dir)
+    X_frame, y = engineer_features(data, municipalities)
+    X, y = to_matrix(X_frame), y.to_numpy(dtype=float)
+    years = X_frame['Year'].to_numpy()
+    code_regions = [region_of(name) for name in municipalities]
+    regions = RegionalRouter({}, None, code_regions, {}).regions_for(X)
+    train = years < holdout_year
+    # Routes are chosen on the last training seasons, so the holdout seasons stay untouched
+    route_start = holdout_year - route_seasons
+    selection_train, selection_validation = years < route_start, train & (years >= route_start)
+
+    eligible = [region for region in REGION_IDS if (train & (regions == region)).sum() >= min_rows]
+    jobs = {('final', GLOBAL): np.flatnonzero(train), ('select', GLOBAL): np.flatnonzero(selection_train)}
+    for region in eligible:
+        jobs[('final', region)] = np.flatnonzero(train & (regions == region))
+        rows = np.flatnonzero(selection_train & (regions == region))
+        if len(rows):
+            jobs[('select', region)] = rows
+    fitted = _fit_all(model_type, jobs, X, y, workers, data_plane)
+
+    validation = ~train
+    global_model = fitted[('final', GLOBAL)]
+    report = {'regions': {}, 'holdout_year': holdout_year, 'route_seasons': [route_start, holdout_year - 1],
+              'min_rows': min_rows}
+    routes = {}
+    for region in REGION_IDS:
+        in_region = regions == region
+        entry = {'train_rows': int((train & in_region).sum()), 'validation_rows': int((validation & in_region).sum())}
+        routes[region] = GLOBAL
+        if region in eligible:
+            rows = selection_validation & in_region
+            if rows.any() and ('select', region) in fitted:
+                entry['selection'] = {
+                    'global': _metrics(y[rows], fitted[('select', GLOBAL)].predict(X[rows])),
+                    'regional': _metrics(y[rows], fitted[('select', region)].predict(X[rows]))
+                }
+                better = entry['selection']['regional']['mae'] <= entry['selection']['global']['mae']
+            else:
+                better = ('select', region) in fitted
+            routes[region] = region if better else GLOBAL
+        rows = validation & in_region
+        if rows.any():
+            entry['global'] = _metrics(y[rows], global_model.predict(X[rows]))
+            if region in eligible:
+                entry['regional'] = _metrics(y[rows], fitted[('final', region)].predict(X[rows]))
+        entry['route'] = routes[region]
+        report['regions'][region] = entry
+
+    router = RegionalRouter({region: fitted[('final', region)] for region in eligible if routes[region] == region},
+                            global_model, code_regions, routes)
+    report['global'] = _metrics(y[validation], global_model.predict(X[validation]))
+    report['routed'] = _metrics(y[validation], router.predict(X[validation]))
+    return router, report
+
+
+def main():
+    """Train per-region models plus a global fallback and store the router"""
+    parser = argparse.ArgumentParser(description="Hierarchical per-region models")
+    parser.add_argument('--model', choices=MODEL_TYPES, default='lightgbm')
+    parser.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    parser.add_argument('--holdout-year', type=int, default=DEFAULT_HOLDOUT_YEAR)
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                        help="Training rows a region needs for its own model")
+    parser.add_argument('--route-seasons', type=int, default=ROUTE_SEASONS,
+                        help="Last training seasons used to choose each region's route")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--data-plane', choices=['shm', 'memmap'], default='shm')
+    parser.add_argument('--promote', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        router, report = train_regional(args.model, args.dataset_dir, args.holdout_year, args.min_rows, args.workers,
+                                        args.data_plane, args.route_seasons)
+    except (ImportError, ValueError, FileNotFoundError) as e:
+        print(f"Error training regional models: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{'Region':22s}{'Train':>7s}{'Valid':>7s}{'Global MAE':>12s}{'Region MAE':>12s}  Route")
+    for region, entry in report['regions'].items():
+        global_mae = entry.get('global', {}).get('mae', float('nan'))
+        region_mae = entry.get('regional', {}).get('mae', float('nan'))
+        print(f"{region:22s}{entry['train_rows']:>7d}{entry['validation_rows']:>7d}"
+              f"{global_mae:>12.4f}{region_mae:>12.4f}  {entry['route']}")
+    print(f"Validation (Year >= {args.holdout_year}): global R² {report['global']['r2']:.4f}, "
+          f"routed R² {report['routed']['r2']:.4f}")
+
+    name = f"regional_{args.model}"
+    version = save_model(name, router, {
+        'model_type': args.model,
+        'training_mode': 'regional',
+        'holdout_year': args.holdout_year,
+        'trained_through': args.holdout_year - 1,
+        'data_through': latest_year(args.dataset_dir),
+        'feature_names': feature_names(),
+        'routes': router.routes,
+        'metrics': report['routed'],
+        'regional_report': report
+    }, promote=args.promote)
+    build_reference(name, version, args.dataset_dir)
+    print(f"Saved {name} version {version} (with drift reference sketch)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Persistent per-run prediction store for ensemble recombination.
+
+The training scripts fit thousands of trees, print metrics and keep only the
+final weighted ensemble. Trying another weighting meant retraining. Here each
+run persists every base model's held-out predictions as one compressed
+columnar file (models/runs/<name>/<run id>/predictions.npz):
+- y:      held-out targets
+- row:    index of each held-out row in the training frame
+- fold:   fold number (0 for a single train/test split)
+- split:  0 = validation rows (used to fit weights), 1 = test rows
+- pred_i: predictions of member i (names in run.json)
+
+run.json holds the member names, the data hash of the run's inputs, the
+weighting scheme the script used and any extra metadata. Ensembles under any
+scheme, and their metrics, are then recomputed from the stored columns in
+milliseconds:
+- 'equal':      plain average
+- 'r2':         weights proportional to R² (ultra_enhanced_training)
+- 'r2_squared': weights proportional to R² squared (ninety_plus_training)
+- 'exp10_r2':   weights proportional to exp(10·R²) (over_ninety_training)
+
+Weights are fitted on the validation rows when a run has them and on the
+test rows otherwise (what the scripts do). Negative R² gets zero weight
+under 'r2' and 'r2_squared'.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime, timezone
+from incremental_training import StreamingMetrics
+from model_registry import MODELS_DIR, new_version
+
+RUN_STORE_DIR = os.path.join(MODELS_DIR, 'runs')
+PREDICTIONS_FILE = 'predictions.npz'
+RUN_FILE = 'run.json'
+
+VALIDATION, TEST = 0, 1
+WEIGHTING_SCHEMES = ('equal', 'r2', 'r2_squared', 'exp10_r2')
+
+
+def _metrics(y_true, y_pred):
+    metrics = StreamingMetrics()
+    metrics.update(np.asarray(y_true, dtype=float), np.asarray(y_pred, dtype=float))
+    return metrics.result()
+
+
+class RunPredictions:
+    """Stored held-out predictions of one run's base models"""
+
+    def __init__(self, info, y, predictions, row, fold, split):
+        self.info = info
+        self.y = y
+        self.predictions = predictions
+        self.row = row
+        self.fold = fold
+        self.split = split
+
+    @property
+    def members(self):
+        return list(self.info['members'])
+
+    def matrix(self, members=None):
+        """(rows x members) prediction matrix"""
+        members = self.members if members is None else list(members)
+        return np.column_stack([self.predictions[name] for name in members])
+
+    def weight_rows(self):
+        """Rows used to fit ensemble weights: the validation rows if any, else the test rows"""
+        validation = self.split == VALIDATION
+        return validation if validation.any() else self.split == TEST
+
+
+def save_run(name, y, predictions, row=None, fold=None, split=None, data_hash=None, scheme=None, metadata=None,
+             store_dir=RUN_STORE_DIR):
+    """Persist base-model predictions ({member: array}) for a run; returns the run id"""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    columns = {
+        'y': y,
+        'row': np.arange(n) if row is None else np.asarray(row, dtype=np.int64),
+        'fold': np.zeros(n, dtype=np.int16) if fold is None else np.asarray(fold, dtype=np.int16),
+        'split': np.full(n, TEST, dtype=np.int8) if split is None else np.asarray(split, dtype=np.int8)
+    }
+    members = list(predictions)
+    for i, member in enumerate(members):
+        values = np.asarray(predictions[member], dtype=float).ravel()
+        if len(values) != n:
+            raise ValueError(f"{member}: {len(values)} predictions for {n} rows")
+        columns[f'pred_{i}'] = values
+
+    run_id = new_version()
+    info = {
+        'run_id': run_id,
+        'name': name,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'data_hash': data_hash,
+        'members': members,
+        'scheme': scheme,
+        'rows': n,
+        'metadata': metadata or {}
+    }
+    # Written to a staging directory and renamed, so readers never see a partial run
+    parent = os.path.join(store_dir, name)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        np.savez_compressed(os.path.join(staging, PREDICTIONS_FILE), **columns)
+        with open(os.path.join(staging, RUN_FILE), 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+        os.replace(staging, os.path.join(parent, run_id))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return run_id
+
+
+def list_runs(name=None, data_hash=None, store_dir=RUN_STORE_DIR):
+    """run.json contents of the stored runs (optionally of one name / data hash), oldest first"""
+    if not os.path.isdir(store_dir):
+        return []
+    runs = []
+    names = [name] if name else sorted(os.listdir(store_dir))
+    for run_name in names:
+        run_dir = os.path.join(store_dir, run_name)
+        if not os.path.isdir(run_dir):
+            continue
+        for run_id in sorted(os.listdir(run_dir)):
+            path = os.path.join(run_dir, run_id, RUN_FILE)
+            if run_id.startswith('.') or not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                info = json.load(f)
+            if data_hash is None or info.get('data_hash') == data_hash:
+                runs.append(info)
+    return sorted(runs, key=lambda info: info['run_id'])
+
+
+def load_run(name, run_id=None, store_dir=RUN_STORE_DIR):
+    """RunPredictions of a stored run (the latest of that name by default)"""
+    if run_id is None:
+        runs = list_runs(name, store_dir=store_dir)
+        if not runs:
+            raise FileNotFoundError(f"No stored runs for {name}")
+        run_id = runs[-1]['run_id']
+    run_dir = os.path.join(store_dir, name, run_id)
+    with open(os.path.join(run_dir, RUN_FILE), encoding='utf-8') as f:
+        info = json.load(f)
+    with np.load(os.path.join(run_dir, PREDICTIONS_FILE)) as columns:
+        predictions = {member: columns[f'pred_{i}'] for i, member in enumerate(info['members'])}
+        return RunPredictions(info, columns['y'], predictions, columns['row'], columns['fold'], columns['split'])
+
+
+def ensemble_weights(r2_scores, scheme):
+    """Normalized member weights from per-member R² under a weighting scheme"""
+    r2_scores = np.asarray(r2_scores, dtype=float)
+    if scheme == 'equal':
+        weights = np.ones_like(r2_scores)
+    elif scheme == 'r2':
+        weights = np.maximum(r2_scores, 0.0)
+    elif scheme == 'r2_squared':
+        weights = np.maximum(r2_scores, 0.0) ** 2
+    elif scheme == 'exp10_r2':
+        # Shifted by the best score to avoid overflow; the normalized weights are unchanged
+        weights = np.exp(10 * (r2_scores - r2_scores.max()))
+    else:
+        raise ValueError(f"Unknown weighting scheme: {scheme}")
+    if weights.sum() <= 0:
+        weights = np.ones_like(r2_scores)
+    return weights / weights.sum()
+
+
+def member_metrics(run, rows=None):
+    """Metrics of every member on the given rows (the test rows by default)"""
+    rows = run.split == TEST if rows is None else rows
+    return {member: _metrics(run.y[rows], run.predictions[member][rows]) for member in run.members}
+
+
+def recombine(run, scheme='r2_squared', members=None):
+    """Re-weight the stored members; returns weights, test metrics (overall and per fold) and predictions"""
+    members = run.members if members is None else list(members)
+    matrix = run.matrix(members)
+    fit_rows = run.weight_rows()
+    r2_scores = [_metrics(run.y[fit_rows], matrix[fit_rows, i])['r2'] for i in range(len(members))]
+    weights = ensemble_weights(r2_scores, scheme)
+    prediction = matrix @ weights
+
+    test = run.split == TEST
+    result = {
+        'scheme': scheme,
+        'weights': dict(zip(members, weights.tolist())),
+        'metrics': _metrics(run.y[test], prediction[test]),
+        'prediction': prediction
+    }
+    folds = np.unique(run.fold[test])
+    if len(folds) > 1:
+        result['folds'] = {int(fold): _metrics(run.y[test & (run.fold == fold)], prediction[test & (run.fold == fold)])
+                           for fold in folds}
+    return result
+
+
+def compare_schemes(run, members=None, schemes=WEIGHTING_SCHEMES):
+    """Test metrics and weights of the run's members recombined under every scheme"""
+    return {scheme: {key: value for key, value in recombine(run, scheme, members).items() if key != 'prediction'}
+            for scheme in schemes}
+
+
+def main():
+    """List stored runs or recombine one under every weighting scheme"""
+    parser = argparse.ArgumentParser(description="Per-run prediction store and ensemble recombination")
+    parser.add_argument('--name', default=None, help="Run name (e.g. super_ensemble)")
+    parser.add_argument('--run', default=None, help="Run id (latest of --name if omitted)")
+    parser.add_argument('--members', nargs='+', default=None, help="Members to recombine (all by default)")
+    parser.add_argument('--list', action='store_true', help="List stored runs")
+    args = parser.parse_args()
+
+    if args.list or not args.name:
+        for info in list_runs(args.name):
+            print(f"{info['name']:24s}{info['run_id']:28s}{info['data_hash'] or '-':18s}"
+                  f"{info['rows']:>7d}  {', '.join(info['members'])}")
+        return 0
+
+    try:
+        run = load_run(args.name, args.run)
+        start = time.perf_counter()
+        schemes = compare_schemes(run, args.members)
+        elapsed = time.perf_counter() - start
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        print(f"Error loading run: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Run {run.info['run_id']} of {run.info['name']} ({run.info['rows']} held-out rows, "
+          f"data {run.info['data_hash']})")
+    print(f"{'Member':24s}{'R²':>9s}{'MAE':>9s}{'RMSE':>9s}")
+    for member, metrics in member_metrics(run).items():
+        print(f"{member:24s}{metrics['r2']:>9.4f}{metrics['mae']:>9.4f}{metrics['rmse']:>9.4f}")
+    print(f"\n{'Scheme':24s}{'R²':>9s}{'MAE':>9s}{'RMSE':>9s}  Weights")
+    for scheme, result in schemes.items():
+        metrics = result['metrics']
+        weights = ', '.join(f"{member}={weight:.3f}" for member, weight in result['weights'].items())
+        marker = ' *' if scheme == run.info.get('scheme') else ''
+        print(f"{scheme + marker:24s}{metrics['r2']:>9.4f}{metrics['mae']:>9.4f}{metrics['rmse']:>9.4f}  {weights}")
+    print(f"\nRecombined {len(schemes)} schemes in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Vectorized what-if scenario engine for yield sensitivity.
+
+Each municipality's baseline is its latest year in the station data. A grid of
+perturbations over the input features (e.g. rainfall -20%, fertilizer +30
+kg/ha) is broadcast against every baseline into one feature frame, pushed
+through the shared feature transform once and predicted in large batches.
+The result is a response surface of shape (municipalities, *axis lengths).
+
+Axis modes:
+- 'scale': relative change, value * (1 + v)
+- 'delta': absolute change, value + v
+- 'set':   replace the value (the only mode allowed for Rice Variety)
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from data_validation import RANGE_RULES
+from features import (
+    BASE_FEATURE_COLS, RICE_VARIETIES, align_features, engineer_features, municipality_categories, to_matrix
+)
+from model_registry import load_model, predictor
+from station_store import ENHANCED_DATASET_DIR, YEAR_COL, load_station_data, municipality_id
+
+DEFAULT_MODEL = 'incremental_lightgbm'
+DEFAULT_BATCH_SIZE = 100_000
+AXIS_MODES = ('scale', 'delta', 'set')
+
+# 7 x 5 x 5 x 3 = 525 scenarios per municipality
+DEFAULT_GRID = [
+    {'feature': 'Rainfall (mm)', 'mode': 'scale', 'values': [-0.3, -0.2, -0.1, 0.0, 0.1, 0.2, 0.3]},
+    {'feature': 'Fertilizer Used (kg/ha)', 'mode': 'delta', 'values': [-30, -15, 0, 15, 30]},
+    {'feature': 'Tmax (°C)', 'mode': 'delta', 'values': [-1.0, -0.5, 0.0, 0.5, 1.0]},
+    {'feature': 'Pest Incidence (%)', 'mode': 'delta', 'values': [-5, 0, 5]},
+]
+
+
+def load_baselines(dataset_dir=ENHANCED_DATASET_DIR, data=None):
+    """Latest-year row of every municipality, in station order"""
+    data = load_station_data(dataset_dir, validate=True) if data is None else data
+    data = data.dropna(subset=BASE_FEATURE_COLS)
+    latest = data.sort_values(YEAR_COL, kind='stable').groupby('Municipality', sort=False).tail(1)
+    order = pd.unique(data['Municipality'])
+    return latest.set_index('Municipality').loc[order].reset_index()
+
+
+def validate_axes(axes):
+    """Check axis specs and return them with values as arrays"""
+    checked = []
+    for axis in axes:
+        feature, mode = axis['feature'], axis.get('mode', 'set')
+        if feature not in BASE_FEATURE_COLS:
+            raise ValueError(f"Unknown scenario feature: {feature}")
+        if mode not in AXIS_MODES:
+            raise ValueError(f"Unknown axis mode for {feature}: {mode}")
+        if feature == 'Rice Variety':
+            if mode != 'set':
+                raise ValueError("Rice Variety only supports mode 'set'")
+            unknown = set(axis['values']) - set(RICE_VARIETIES)
+            if unknown:
+                raise ValueError(f"Unknown rice varieties: {sorted(unknown)}")
+            values = np.asarray(axis['values'], dtype=object)
+        else:
+            values = np.asarray(axis['values'], dtype=float)
+        if values.size == 0:
+            raise ValueError(f"Axis {feature} has no values")
+        checked.append({'feature': feature, 'mode': mode, 'values': values})
+    if len({axis['feature'] for axis in checked}) != len(checked):
+        raise ValueError("Each feature may appear on at most one axis")
+    return checked
+
+
+def build_scenario_frame(baselines, axes):
+    """Broadcast baselines x grid into one frame (municipality-major, grid in C order)"""
+    shape = tuple(axis['values'].size for axis in axes)
+    n_scenarios = int(np.prod(shape))
+    n_baselines = len(baselines)
+    # Grid index per axis for every (municipality, scenario) row
+    grid_index = np.indices(shape).reshape(len(axes), -1)
+    rows = np.repeat(np.arange(n_baselines), n_scenarios)
+
+    frame = baselines.iloc[rows].reset_index(drop=True)
+    for axis, index in zip(axes, grid_index):
+        feature, mode = axis['feature'], axis['mode']
+        values = np.tile(axis['values'][index], n_baselines)
+        if mode == 'set':
+            frame[feature] = values
+            continue
+        base = frame[feature].to_numpy(dtype=float)
+        perturbed = base * (1 + values) if mode == 'scale' else base + values
+        low, high = RANGE_RULES.get(feature, (-np.inf, np.inf))
+        frame[feature] = np.clip(perturbed, low, high)
+    return frame, shape
+
+
+def predict_in_batches(predict, X, batch_size=DEFAULT_BATCH_SIZE):
+    """Predict a large matrix in fixed-size slices"""
+    out = np.empty(X.shape[0], dtype=float)
+    for start in range(0, X.shape[0], batch_size):
+        out[start:start + batch_size] = predict(X[start:start + batch_size])
+    return out
+
+
+def run_scenarios(axes=DEFAULT_GRID, model_name=DEFAULT_MODEL, version=None, baselines=None,
+                  municipalities=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Evaluate the scenario grid for every (or the given) municipality and return the response surface"""
+    axes = validate_axes(axes)
+    baselines = load_baselines() if baselines is None else baselines
+    if municipalities is not None:
+        baselines = baselines[baselines['Municipality'].isin(municipalities)].reset_index(drop=True)
+    if baselines.empty:
+        raise ValueError("No municipality baselines to evaluate")
+    model, metadata = load_model(model_name, version)
+    predict = predictor(model)
+    # The model's own column layout (e.g. after feature selection); older versions without it use features.py order
+    names = metadata.get('feature_names')
+    # Fixed municipality codes, whichever municipalities are evaluated
+    categories = municipality_categories()
+
+    def model_matrix(rows):
+        X, _ = engineer_features(rows, categories, dropna=False)
+        return to_matrix(align_features(X, names) if names else X)
+
+    frame, shape = build_scenario_frame(baselines, axes)
+    predictions = predict_in_batches(predict, model_matrix(frame), batch_size)
+    baseline_predictions = predict(model_matrix(baselines))
+
+    return {
+        'model': model_name,
+        'version': metadata['version'],
+        'municipalities': list(baselines['Municipality']),
+        'baseline_year': baselines[YEAR_COL].astype(int).tolist(),
+        'axes': axes,
+        'baseline': np.asarray(baseline_predictions, dtype=float),
+        'predictions': predictions.reshape((len(baselines),) + shape)
+    }
+
+
+def marginal_effects(surface):
+    """Per-axis response averaged over the other axes: {feature: (municipalities, axis length)}"""
+    predictions = surface['predictions']
+    effects = {}
+    for i, axis in enumerate(surface['axes']):
+        other = tuple(j + 1 for j in range(len(surface['axes'])) if j != i)
+        effects[axis['feature']] = predictions.mean(axis=other) if other else predictions
+    return effects
+
+
+def surface_to_json(surface, decimals=3):
+    """Compact JSON-ready response surface keyed by municipality id"""
+    effects = marginal_effects(surface)
+    result = {
+        'model': surface['model'],
+        'version': surface['version'],
+        'axes': [{'feature': axis['feature'], 'mode': axis['mode'], 'values': axis['values'].tolist()}
+                 for axis in surface['axes']],
+        'municipalities': {}
+    }
+    for i, name in enumerate(surface['municipalities']):
+        result['municipalities'][municipality_id(name)] = {
+            'name': name,
+            'baseline_year': surface['baseline_year'][i],
+            'baseline': round(float(surface['baseline'][i]), decimals),
+            'surface': np.round(surface['predictions'][i], decimals).tolist(),
+            'marginal': {feature: np.round(effect[i], decimals).tolist() for feature, effect in effects.items()}
+        }
+    return result
+
+
+def parse_axis(text):
+    """Parse a CLI axis 'Feature:mode:v1,v2,...'"""
+    feature, mode, values = text.rsplit(':', 2)
+    values = values.split(',')
+    if feature != 'Rice Variety':
+        values = [float(v) for v in values]
+    return {'feature': feature, 'mode': mode, 'values': values}
+
+
+def main():
+    """Run a what-if scenario grid and write the response surface as JSON"""
+    parser = argparse.ArgumentParser(description="What-if yield scenario grid")
+    parser.add_argument('--axis', action='append', type=parse_axis,
+                        help="Feature:mode:v1,v2,... (repeatable; default grid if omitted)")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--municipality', action='append', default=None)
+    parser.add_argument('--output', default=None, help="Output file (stdout if omitted)")
+    args = parser.parse_args()
+
+    try:
+        surface = run_scenarios(args.axis or DEFAULT_GRID, args.model, args.version,
+                                municipalities=args.municipality)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error running scenarios: {e}", file=sys.stderr)
+        return 1
+
+    text = json.dumps(surface_to_json(surface), ensure_ascii=False, separators=(',', ':'))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        n = surface['predictions'].size
+        print(f"Wrote {n} scenario predictions for {len(surface['municipalities'])} municipalities to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
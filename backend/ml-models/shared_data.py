@@ -0,0 +1,147 @@
+"""
+Zero-copy data plane for process-pool workers.
+
+Parallel jobs (backtest origins, per-region fits, CV folds, bootstrap
+resamples) would otherwise pickle the feature matrix into every task. Here
+the parent publishes the arrays once and hands workers a small descriptor;
+each worker attaches read-only NumPy views of the same memory:
+- 'shm':    multiprocessing.shared_memory segments (default)
+- 'memmap': .npy files memory-mapped from disk (arrays larger than /dev/shm,
+            or an existing cache directory such as the backtest feature cache)
+
+Worker start-up cost and total RAM therefore stay flat as workers are added.
+The publisher owns the memory: SharedArrays.close() (or leaving its `with`
+block) unlinks the segments / removes the files it created. Workers keep
+their attachments for the life of the process (repeated tasks reuse them)
+and close them at exit.
+"""
+
+import os
+import atexit
+import shutil
+import tempfile
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+BACKENDS = ('shm', 'memmap')
+
+# Attachments of this process: location -> (view, shared memory handle)
+_ATTACHED = {}
+# Segments published by this process (or inherited through fork): name -> SharedMemory
+_PUBLISHED = {}
+
+
+class SharedArrays:
+    """Publishes named arrays once; workers attach read-only views via the descriptor"""
+
+    def __init__(self, arrays, backend='shm', directory=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        self.backend = backend
+        self._segments = []
+        self._directory = None
+        entries = []
+        if backend == 'memmap':
+            self._directory = tempfile.mkdtemp(prefix='shared_data_', dir=directory)
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            if backend == 'shm':
+                segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+                self._segments.append(segment)
+                _PUBLISHED[segment.name] = segment
+                location = segment.name
+            else:
+                location = os.path.join(self._directory, f'{name}.npy')
+                np.save(location, array)
+            entries.append((name, location, array.shape, array.dtype.str))
+        self.descriptor = (backend, tuple(entries))
+
+    @classmethod
+    def from_npy_dir(cls, path, names):
+        """Descriptor-only publisher over existing .npy files (nothing is copied or removed on close)"""
+        publisher = cls.__new__(cls)
+        publisher.backend = 'memmap'
+        publisher._segments = []
+        publisher._directory = None
+        entries = []
+        for name in names:
+            location = os.path.join(path, f'{name}.npy')
+            header = np.load(location, mmap_mode='r')
+            entries.append((name, location, header.shape, header.dtype.str))
+        publisher.descriptor = ('memmap', tuple(entries))
+        return publisher
+
+    @property
+    def nbytes(self):
+        return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, _, shape, dtype in self.descriptor[1])
+
+    def close(self):
+        """Release the published memory; attached workers must be done with it"""
+        for segment in self._segments:
+            _ATTACHED.pop(segment.name, None)
+            _PUBLISHED.pop(segment.name, None)
+            try:
+                segment.close()
+            except BufferError:
+                pass  # Views still referenced in this process; the mapping goes with them
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments = []
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _open_segment(name):
+    segment = shared_memory.SharedMemory(name=name)
+    # Only the publisher may unlink; before Python 3.13 attaching registers the
+    # segment with this process's resource tracker, which would unlink it at exit
+    try:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except Exception:
+        pass
+    return segment
+
+
+def attach(descriptor):
+    """Dict of read-only arrays for a SharedArrays descriptor (cached per process)"""
+    backend, entries = descriptor
+    views = {}
+    for name, location, shape, dtype in entries:
+        if location not in _ATTACHED:
+            if backend == 'shm':
+                published = _PUBLISHED.get(location)
+                segment = published or _open_segment(location)
+                array = np.ndarray(shape, np.dtype(dtype), buffer=segment.buf)
+                # Segments published here are closed by their publisher, not by detach
+                _ATTACHED[location] = (array, None if published else segment)
+            else:
+                _ATTACHED[location] = (np.load(location, mmap_mode='r'), None)
+            _ATTACHED[location][0].flags.writeable = False
+        views[name] = _ATTACHED[location][0]
+    return views
+
+
+def detach(descriptor=None):
+    """Drop this process's views of one descriptor (or of all attachments)"""
+    locations = list(_ATTACHED) if descriptor is None else [location for _, location, _, _ in descriptor[1]]
+    for location in locations:
+        _, segment = _ATTACHED.pop(location, (None, None))
+        if segment is not None:
+            try:
+                segment.close()
+            except BufferError:
+                pass  # A view is still referenced elsewhere; released at exit
+
+
+atexit.register(detach)
@@ -0,0 +1,288 @@
+"""
+Content-addressed, compressed snapshots of datasets, caches, JSON outputs and models.
+
+Files are split into fixed-size chunks; each chunk is stored once under its
+SHA-256 as a zlib-compressed object in snapshots/objects/. A snapshot is a
+manifest listing, per component, every file with its chunk hashes. Unchanged
+files map to chunks that already exist, so a new snapshot only writes what
+changed (and unchanged files are not even re-read: their chunk lists are
+reused from an index keyed by path, size and mtime).
+
+Restore works per component ('data', 'caches', 'json', 'models'). Files are
+rebuilt and verified in a staging directory next to their destination, then
+swapped in with renames, so readers never see a half-restored directory.
+"""
+
+import os
+import sys
+import json
+import zlib
+import shutil
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(os.path.dirname(ML_DIR))
+SNAPSHOT_DIR = os.path.join(ML_DIR, 'snapshots')
+
+CHUNK_SIZE = 1 << 20
+COMPRESSION_LEVEL = 6
+
+# Component -> paths relative to the repository root (files or directories)
+COMPONENTS = {
+    'data': ['backend/ml-models/data/datasets', 'backend/ml-models/data/enhanced_datasets'],
+    'caches': ['backend/ml-models/data/daily_features'],
+    'json': [
+        'constants/municipality_data.json',
+        'constants/municipality_prediction_stats.json',
+        'constants/bundles',
+        'backend/ml-models/real_data.json',
+        'backend/ml-models/municipality_data.json'
+    ],
+    'models': ['backend/ml-models/models', 'backend/ml-models/model.pkl'],
+}
+
+
+def _objects_dir(snapshot_dir):
+    return os.path.join(snapshot_dir, 'objects')
+
+
+def _manifests_dir(snapshot_dir):
+    return os.path.join(snapshot_dir, 'manifests')
+
+
+def _object_path(digest, snapshot_dir):
+    return os.path.join(_objects_dir(snapshot_dir), digest[:2], digest)
+
+
+def _write_atomic(path, data, mode='wb'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def store_chunk(chunk, snapshot_dir=SNAPSHOT_DIR):
+    """Store one chunk if it is new; returns (digest, bytes written)"""
+    digest = hashlib.sha256(chunk).hexdigest()
+    path = _object_path(digest, snapshot_dir)
+    if os.path.exists(path):
+        return digest, 0
+    compressed = zlib.compress(chunk, COMPRESSION_LEVEL)
+    _write_atomic(path, compressed)
+    return digest, len(compressed)
+
+
+def read_chunk(digest, snapshot_dir=SNAPSHOT_DIR):
+    """Decompress and verify one chunk"""
+    with open(_object_path(digest, snapshot_dir), 'rb') as f:
+        chunk = zlib.decompress(f.read())
+    if hashlib.sha256(chunk).hexdigest() != digest:
+        raise ValueError(f"Corrupt snapshot object: {digest}")
+    return chunk
+
+
+def store_file(path, snapshot_dir=SNAPSHOT_DIR):
+    """Chunk and store a file; returns (chunk digests, bytes written)"""
+    digests, written = [], 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest, n = store_chunk(chunk, snapshot_dir)
+            digests.append(digest)
+            written += n
+    return digests, written
+
+
+def iter_component_files(component, root_dir=ROOT_DIR):
+    """Repository-relative paths of every file in a component"""
+    for rel_path in COMPONENTS[component]:
+        path = os.path.join(root_dir, rel_path)
+        if os.path.isfile(path):
+            yield rel_path
+        elif os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if not filename.endswith('.tmp'):
+                        yield os.path.relpath(os.path.join(dirpath, filename), root_dir)
+
+
+def _load_index(snapshot_dir):
+    path = os.path.join(snapshot_dir, 'index.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def create_snapshot(components=None, label=None, root_dir=ROOT_DIR, snapshot_dir=SNAPSHOT_DIR, max_workers=4):
+    """Snapshot the given components (all by default); returns the manifest"""
+    components = list(COMPONENTS) if components is None else components
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        raise ValueError(f"Unknown snapshot components: {sorted(unknown)}")
+
+    index = _load_index(snapshot_dir)
+    files = [(component, rel_path) for component in components for rel_path in iter_component_files(component, root_dir)]
+
+    def snapshot_file(rel_path):
+        stat = os.stat(os.path.join(root_dir, rel_path))
+        key = f"{stat.st_size}:{stat.st_mtime_ns}"
+        cached = index.get(rel_path)
+        if cached and cached['key'] == key and all(os.path.exists(_object_path(d, snapshot_dir)) for d in cached['chunks']):
+            return {'size': stat.st_size, 'chunks': cached['chunks']}, key, 0
+        digests, written = store_file(os.path.join(root_dir, rel_path), snapshot_dir)
+        return {'size': stat.st_size, 'chunks': digests}, key, written
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda item: snapshot_file(item[1]), files))
+
+    manifest = {'created': datetime.now(timezone.utc).isoformat(), 'label': label,
+                'components': {component: {} for component in components}}
+    written = 0
+    for (component, rel_path), (entry, key, n) in zip(files, results):
+        manifest['components'][component][rel_path] = entry
+        index[rel_path] = {'key': key, 'chunks': entry['chunks']}
+        written += n
+
+    body = json.dumps(manifest['components'], sort_keys=True).encode('utf-8')
+    manifest['id'] = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ') + '-' + hashlib.sha256(body).hexdigest()[:12]
+    manifest['stats'] = {
+        'files': len(files),
+        'bytes': sum(entry['size'] for entry, _, _ in results),
+        'bytes_written': written
+    }
+    _write_atomic(os.path.join(_manifests_dir(snapshot_dir), f"{manifest['id']}.json"),
+                  json.dumps(manifest, indent=2), mode='w')
+    _write_atomic(os.path.join(snapshot_dir, 'index.json'), json.dumps(index), mode='w')
+    return manifest
+
+
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    """Manifests of all snapshots, oldest first"""
+    manifests_dir = _manifests_dir(snapshot_dir)
+    if not os.path.isdir(manifests_dir):
+        return []
+    manifests = []
+    for filename in sorted(os.listdir(manifests_dir)):
+        if filename.endswith('.json'):
+            with open(os.path.join(manifests_dir, filename), encoding='utf-8') as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def load_manifest(snapshot_id, snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(_manifests_dir(snapshot_dir), f"{snapshot_id}.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Unknown snapshot: {snapshot_id}")
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _materialize(entry, path, snapshot_dir):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        for digest in entry['chunks']:
+            f.write(read_chunk(digest, snapshot_dir))
+
+
+def _swap_in(staged, target):
+    """Replace target (file or directory) with staged using renames"""
+    if os.path.isdir(staged):
+        if os.path.exists(target):
+            trash = f"{target}.old-{os.getpid()}"
+            os.replace(target, trash)
+            os.replace(staged, target)
+            shutil.rmtree(trash, ignore_errors=True)
+        else:
+            os.replace(staged, target)
+    else:
+        os.replace(staged, target)
+
+
+def restore_snapshot(snapshot_id, components=None, root_dir=ROOT_DIR, snapshot_dir=SNAPSHOT_DIR, max_workers=4):
+    """Restore the given components (all in the snapshot by default); returns the restored file count"""
+    manifest = load_manifest(snapshot_id, snapshot_dir)
+    components = list(manifest['components']) if components is None else components
+    missing = set(components) - set(manifest['components'])
+    if missing:
+        raise ValueError(f"Snapshot {snapshot_id} does not contain: {sorted(missing)}")
+
+    restored = 0
+    for component in components:
+        files = manifest['components'][component]
+        staging = tempfile.mkdtemp(prefix=f".restore-{component}-", dir=root_dir)
+        try:
+            # Rebuild every file of the component (chunks are verified on read) before touching anything
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(lambda item: _materialize(item[1], os.path.join(staging, item[0]), snapshot_dir),
+                                  files.items()))
+            for rel_path in COMPONENTS[component]:
+                staged = os.path.join(staging, rel_path)
+                if os.path.exists(staged):
+                    target = os.path.join(root_dir, rel_path)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    _swap_in(staged, target)
+            restored += len(files)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return restored
+
+
+def prune_objects(snapshot_dir=SNAPSHOT_DIR):
+    """Delete objects no longer referenced by any manifest; returns the number removed"""
+    referenced = {digest for manifest in list_snapshots(snapshot_dir)
+                  for files in manifest['components'].values()
+                  for entry in files.values() for digest in entry['chunks']}
+    removed = 0
+    objects_dir = _objects_dir(snapshot_dir)
+    for dirpath, _, filenames in os.walk(objects_dir):
+        for filename in filenames:
+            if filename not in referenced:
+                os.remove(os.path.join(dirpath, filename))
+                removed += 1
+    return removed
+
+
+def main():
+    """Create, list, restore or prune snapshots"""
+    parser = argparse.ArgumentParser(description="Dataset and model snapshots")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    create = subparsers.add_parser('create')
+    create.add_argument('--component', action='append', choices=list(COMPONENTS))
+    create.add_argument('--label', default=None)
+    subparsers.add_parser('list')
+    restore = subparsers.add_parser('restore')
+    restore.add_argument('snapshot_id')
+    restore.add_argument('--component', action='append', choices=list(COMPONENTS))
+    subparsers.add_parser('prune')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'create':
+            manifest = create_snapshot(args.component, args.label)
+            stats = manifest['stats']
+            print(f"Snapshot {manifest['id']}: {stats['files']} files, {stats['bytes']} bytes, "
+                  f"{stats['bytes_written']} bytes written")
+        elif args.command == 'list':
+            for manifest in list_snapshots():
+                print(f"{manifest['id']}  {', '.join(manifest['components'])}  {manifest.get('label') or ''}")
+        elif args.command == 'restore':
+            restored = restore_snapshot(args.snapshot_id, args.component)
+            print(f"Restored {restored} files from {args.snapshot_id}")
+        else:
+            print(f"Removed {prune_objects()} unreferenced objects")
+        return 0
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Snapshot error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
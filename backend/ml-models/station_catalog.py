@@ -0,0 +1,199 @@
+"""
+Station catalog with a haversine BallTree index over the PAGASA stations.
+
+Station coordinates and elevations are parsed once from the datasets README.
+The catalog answers k-nearest-station queries for arbitrary coordinates and
+interpolates per-station values (e.g. predicted yields) to thousands of query
+points at once, so farms and municipalities without their own station can be
+served and a national grid can be precomputed.
+"""
+
+import os
+import re
+import sys
+import json
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+STATION_README = os.path.join(os.path.dirname(__file__), 'data', 'datasets', 'A.ReadMe.txt')
+STATS_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'constants', 'municipality_prediction_stats.json')
+GRID_OUTPUT = os.path.join(os.path.dirname(__file__), 'models', 'national_yield_grid.csv')
+
+EARTH_RADIUS_KM = 6371.0
+
+# Bounding box of the Philippines used for the national grid
+PH_BOUNDS = {'lat': (4.5, 21.5), 'lon': (116.0, 127.0)}
+
+# Dataset names that are spelled differently from the README station names
+STATION_ALIASES = {
+    'Puerto Prinsesa': 'Puerto Princesa',
+}
+
+# Stations with datasets that the README does not list (municipal centre coordinates)
+EXTRA_STATIONS = [
+    {'Station': 'Abucay', 'Latitude': 14.7236, 'Longitude': 120.5353, 'Elevation': 10.0},
+]
+
+STATION_PATTERN = re.compile(
+    r'^(?P<name>.+?)\s+Latitude:\s*(?P<lat>[-\d.]+)\s*N\s+Longitude:\s*(?P<lon>[-\d.]+)\s*E\s+Elevation:\s*(?P<elev>[-\d.]+)\s*m'
+)
+
+
+def parse_station_metadata(readme_path=STATION_README):
+    """Parse station name, latitude, longitude and elevation from the datasets README"""
+    rows = []
+    with open(readme_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = STATION_PATTERN.match(line.strip())
+            if match:
+                rows.append({
+                    'Station': match.group('name'),
+                    'Latitude': float(match.group('lat')),
+                    'Longitude': float(match.group('lon')),
+                    'Elevation': float(match.group('elev'))
+                })
+    if not rows:
+        raise ValueError(f"No station metadata found in {readme_path}")
+    rows.extend(extra for extra in EXTRA_STATIONS if extra['Station'] not in {r['Station'] for r in rows})
+    return pd.DataFrame(rows).drop_duplicates('Station').reset_index(drop=True)
+
+
+def normalize_station_name(name):
+    """Map a dataset municipality name onto its README station name"""
+    return STATION_ALIASES.get(name, name)
+
+
+class StationCatalog:
+    """Haversine BallTree over station coordinates with vectorized lookups"""
+
+    def __init__(self, stations):
+        self.stations = stations.reset_index(drop=True)
+        self.names = self.stations['Station'].to_numpy()
+        self.elevation = self.stations['Elevation'].to_numpy(dtype=float)
+        self._coords = np.radians(self.stations[['Latitude', 'Longitude']].to_numpy(dtype=float))
+        self.tree = BallTree(self._coords, metric='haversine')
+        self._subtrees = {}
+
+    @classmethod
+    def from_readme(cls, readme_path=STATION_README):
+        return cls(parse_station_metadata(readme_path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, lat, lon, k=1):
+        """Return (distances_km, station_indices) of the k nearest stations for each query point"""
+        query = np.radians(np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]).astype(float))
+        distances, indices = self.tree.query(query, k=min(k, len(self)))
+        return distances * EARTH_RADIUS_KM, indices
+
+    def nearest_stations(self, lat, lon, k=1):
+        """Return a long-format DataFrame of the k nearest stations per query point"""
+        distances, indices = self.nearest(lat, lon, k)
+        n_queries, n_neighbors = indices.shape
+        return pd.DataFrame({
+            'query': np.repeat(np.arange(n_queries), n_neighbors),
+            'rank': np.tile(np.arange(1, n_neighbors + 1), n_queries),
+            'Station': self.names[indices.ravel()],
+            'distance_km': distances.ravel()
+        })
+
+    def _tree_for(self, available):
+        """BallTree restricted to stations that have a value (cached per station subset)"""
+        if available.all():
+            return self.tree, np.arange(len(self))
+        key = available.tobytes()
+        if key not in self._subtrees:
+            subset = np.flatnonzero(available)
+            self._subtrees[key] = (BallTree(self._coords[subset], metric='haversine'), subset)
+        return self._subtrees[key]
+
+    def station_values(self, values):
+        """Align a {station or municipality name: value} mapping to catalog order (NaN if missing)"""
+        series = pd.Series(values, dtype=float)
+        series.index = [normalize_station_name(name) for name in series.index]
+        return series.groupby(level=0).mean().reindex(self.names).to_numpy()
+
+    def interpolate(self, lat, lon, values, k=4, power=2.0, query_elevation=None):
+        """
+        Inverse-distance-weighted interpolation of per-station values to query points.
+
+        When query_elevation is given, values are first detrended with a linear
+        elevation fit across stations, the residuals are interpolated and the
+        elevation term is added back at each query point.
+        """
+        station_values = self.station_values(values)
+        available = ~np.isnan(station_values)
+        if not available.any():
+            raise ValueError("No station values to interpolate from")
+        tree, subset = self._tree_for(available)
+        known = station_values[subset]
+
+        slope = intercept = 0.0
+        if query_elevation is not None:
+            slope, intercept = np.polyfit(self.elevation[subset], known, 1)
+            known = known - (intercept + slope * self.elevation[subset])
+
+        query = np.radians(np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]).astype(float))
+        distances, neighbors = tree.query(query, k=min(k, subset.size))
+        distances *= EARTH_RADIUS_KM
+
+        # Exact station hits take the station value; everything else is IDW
+        weights = 1.0 / np.maximum(distances, 1e-9) ** power
+        exact = distances[:, 0] < 1e-6
+        weights[exact] = 0.0
+        weights[exact, 0] = 1.0
+        estimate = (weights * known[neighbors]).sum(axis=1) / weights.sum(axis=1)
+
+        if query_elevation is not None:
+            estimate += intercept + slope * np.broadcast_to(np.asarray(query_elevation, dtype=float), estimate.shape)
+        return estimate
+
+    def national_grid(self, step_deg=0.25):
+        """Regular lat/lon grid over the Philippines as flat arrays"""
+        lats = np.arange(PH_BOUNDS['lat'][0], PH_BOUNDS['lat'][1] + 1e-9, step_deg)
+        lons = np.arange(PH_BOUNDS['lon'][0], PH_BOUNDS['lon'][1] + 1e-9, step_deg)
+        grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+        return grid_lat.ravel(), grid_lon.ravel()
+
+
+def predicted_station_yields(stats_file=STATS_FILE, horizon=3):
+    """Per-station point forecasts (recent yield + trend * horizon) from the prediction stats"""
+    with open(stats_file, 'r') as f:
+        stats = json.load(f)
+    return {
+        name: max(0.0, s['recent_yield'] + s['trend'] * horizon)
+        for name, s in stats.items()
+    }
+
+
+def main():
+    """Precompute an interpolated national yield grid from the station forecasts"""
+    try:
+        catalog = StationCatalog.from_readme()
+        yields = predicted_station_yields()
+        print(f"Station catalog: {len(catalog)} stations, {len(yields)} with yield forecasts")
+
+        grid_lat, grid_lon = catalog.national_grid()
+        grid_yield = catalog.interpolate(grid_lat, grid_lon, yields)
+        distances, indices = catalog.nearest(grid_lat, grid_lon, k=1)
+
+        grid = pd.DataFrame({
+            'Latitude': grid_lat,
+            'Longitude': grid_lon,
+            'Predicted Yield': np.round(grid_yield, 3),
+            'Nearest Station': catalog.names[indices[:, 0]],
+            'Nearest Distance (km)': np.round(distances[:, 0], 1)
+        })
+        os.makedirs(os.path.dirname(GRID_OUTPUT), exist_ok=True)
+        grid.to_csv(GRID_OUTPUT, index=False)
+        print(f"National grid with {len(grid)} points saved to {GRID_OUTPUT}")
+        return 0
+    except Exception as e:
+        print(f"Error building national grid: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Station store: read/write access to the per-station annual CSV datasets.
+
+Every station (municipality) has one "<Name> Annual Data.csv" file. This module
+is the single place that knows the file layout, the municipality ids used by
+the app and the municipality -> region mapping used for regional rollups.
+"""
+
+import os
+import glob
+import tempfile
+import pandas as pd
+from data_validation import validate_and_quarantine
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), 'data', 'datasets')
+ENHANCED_DATASET_DIR = os.path.join(os.path.dirname(__file__), 'data', 'enhanced_datasets')
+FILE_SUFFIX = ' Annual Data.csv'
+
+YEAR_COL = 'Year'
+YIELD_COL = 'Rice Yield (tons/ha)'
+
+# The 12 regions used by the app (see real_data.json and constants/translations.ts)
+REGION_IDS = [
+    'ilocosRegion', 'cagayanValley', 'centralLuzon', 'calabarzon', 'bicol', 'westernVisayas',
+    'centralVisayas', 'easternVisayas', 'zamboangaPeninsula', 'northernMindanao', 'davaoRegion',
+    'soccsksargen'
+]
+
+# Stations outside those 12 regions are folded into the nearest one they were
+# historically part of: CAR -> Ilocos, NCR and MIMAROPA -> CALABARZON (former
+# Southern Tagalog), Caraga -> Northern Mindanao, Cotabato City -> SOCCSKSARGEN.
+MUNICIPALITY_REGIONS = {
+    'baguio': 'ilocosRegion', 'dagupan': 'ilocosRegion', 'laoag': 'ilocosRegion', 'sinait': 'ilocosRegion',
+    'aparri': 'cagayanValley', 'basco_radar': 'cagayanValley', 'calayan': 'cagayanValley',
+    'itbayat': 'cagayanValley', 'tuguegarao': 'cagayanValley',
+    'abucay': 'centralLuzon', 'baler_radar': 'centralLuzon', 'cabanatuan': 'centralLuzon',
+    'casiguran': 'centralLuzon', 'clark': 'centralLuzon', 'clsu': 'centralLuzon',
+    'cubi_point': 'centralLuzon', 'iba': 'centralLuzon',
+    'alabat': 'calabarzon', 'ambulong': 'calabarzon', 'infanta': 'calabarzon', 'sangley_point': 'calabarzon',
+    'tanay': 'calabarzon', 'tayabas': 'calabarzon', 'naia': 'calabarzon', 'port_area': 'calabarzon',
+    'science_garden': 'calabarzon', 'calapan': 'calabarzon', 'coron': 'calabarzon', 'cuyo': 'calabarzon',
+    'puerto_princesa': 'calabarzon', 'puerto_prinsesa': 'calabarzon', 'romblon': 'calabarzon',
+    'san_jose': 'calabarzon',
+    'daet': 'bicol', 'juban': 'bicol', 'legazpi': 'bicol', 'masbate': 'bicol', 'virac_synop': 'bicol',
+    'roxas_city': 'westernVisayas',
+    'dauis': 'centralVisayas', 'dumaguete': 'centralVisayas', 'mactan': 'centralVisayas',
+    'borongan': 'easternVisayas', 'catarman': 'easternVisayas', 'catbalogan': 'easternVisayas',
+    'guiuan': 'easternVisayas', 'maasin': 'easternVisayas', 'tacloban': 'easternVisayas',
+    'dipolog': 'zamboangaPeninsula', 'zamboanga': 'zamboangaPeninsula',
+    'el_salvador': 'northernMindanao', 'malaybalay': 'northernMindanao', 'butuan': 'northernMindanao',
+    'hinatuan': 'northernMindanao', 'surigao': 'northernMindanao',
+    'davao_city': 'davaoRegion',
+    'cotabato': 'soccsksargen', 'general_santos': 'soccsksargen'
+}
+
+
+def municipality_id(name):
+    """App municipality id for a station name (e.g. 'Davao City' -> 'davao_city')"""
+    return name.strip().lower().replace(' ', '_')
+
+
+def region_of(name):
+    """Region id for a station name or municipality id (None if unmapped)"""
+    return MUNICIPALITY_REGIONS.get(municipality_id(name))
+
+
+def station_name_from_path(path):
+    """Station name from a dataset file path, independent of the OS path separator"""
+    return os.path.basename(path).replace(FILE_SUFFIX, '')
+
+
+def station_file(name, dataset_dir=DATASET_DIR):
+    """Path of the annual CSV for a station"""
+    return os.path.join(dataset_dir, f"{name}{FILE_SUFFIX}")
+
+
+def list_stations(dataset_dir=DATASET_DIR):
+    """Station names with a dataset file, in case-insensitive alphabetical order"""
+    files = glob.glob(os.path.join(dataset_dir, f"*{FILE_SUFFIX}"))
+    return sorted((station_name_from_path(f) for f in files), key=str.lower)
+
+
+def load_station(name, dataset_dir=DATASET_DIR):
+    """Load one station's annual data with its Municipality column"""
+    df = pd.read_csv(station_file(name, dataset_dir))
+    df['Municipality'] = name
+    return df
+
+
+def load_station_data(dataset_dir=DATASET_DIR, stations=None, validate=False):
+    """Load and concatenate all (or the given) stations into one DataFrame, optionally quarantining bad rows"""
+    stations = list_stations(dataset_dir) if stations is None else stations
+    if not stations:
+        raise FileNotFoundError(f"No CSV files found in: {dataset_dir}")
+    data = pd.concat([load_station(name, dataset_dir) for name in stations], ignore_index=True)
+    if validate:
+        data = validate_and_quarantine(data, source=os.path.basename(os.path.normpath(dataset_dir)))
+    return data
+
+
+def iter_station_batches(dataset_dir=DATASET_DIR, chunk_size=10_000, stations=None):
+    """Yield row batches of exactly chunk_size rows (last one smaller) without loading the whole store"""
+    stations = list_stations(dataset_dir) if stations is None else stations
+    pending = []
+    pending_rows = 0
+    for name in stations:
+        for chunk in pd.read_csv(station_file(name, dataset_dir), chunksize=chunk_size):
+            pending.append(chunk.assign(Municipality=name))
+            pending_rows += len(chunk)
+            if pending_rows >= chunk_size:
+                combined = pd.concat(pending, ignore_index=True)
+                yield combined.iloc[:chunk_size]
+                pending = [combined.iloc[chunk_size:]]
+                pending_rows = len(pending[0])
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def latest_year(dataset_dir=DATASET_DIR, stations=None):
+    """Most recent year across stations, reading only the Year column"""
+    stations = list_stations(dataset_dir) if stations is None else stations
+    years = [pd.read_csv(station_file(name, dataset_dir), usecols=[YEAR_COL])[YEAR_COL].max() for name in stations]
+    return int(max(years)) if years else None
+
+
+def write_station(name, df, dataset_dir=DATASET_DIR):
+    """Atomically replace a station's annual CSV (the Municipality column is not stored)"""
+    df = df.drop(columns=['Municipality'], errors='ignore').sort_values(YEAR_COL)
+    fd, tmp_path = tempfile.mkstemp(dir=dataset_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            df.to_csv(f, index=False)
+        os.replace(tmp_path, station_file(name, dataset_dir))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,451 @@
+"""
+Array-compiled inference for fitted tree ensembles.
+
+Random forests, gradient boosting (scikit-learn), XGBoost and LightGBM
+boosters - and WeightedEnsembles of them - are flattened into one set of
+contiguous node arrays:
+- feature:   split feature per node (0 for leaves)
+- threshold: go left when x <= threshold (+inf for leaves)
+- left:      absolute index of the left child; the right child is left + 1
+             and leaves point at themselves
+- value:     leaf output, already multiplied by the tree's weight
+- flags:     missing-value rules (default direction, zero counted as missing)
+
+The source libraries' comparison rules are folded into the arrays at compile
+time. scikit-learn and XGBoost compare float32-rounded inputs, so their nodes
+read a float32-rounded copy of the feature matrix (feature index offset by
+n_features); XGBoost's strict x < t becomes x <= (the float32 just below t).
+Members of a WeightedEnsemble that see standardized inputs read a scaled copy
+further along the same extended row.
+
+Prediction moves every (row, tree) pair one level per step with NumPy gathers
+and sums the reached leaves. Single rows skip the estimators' input
+validation and walk all trees at once; large batches walk blocks of trees
+with all rows, so each block's nodes stay in cache (optionally over threads).
+
+A compiled model is saved as a directory of .npy files plus a JSON header
+(next to model.joblib for registry models) and loaded memory-mapped, so
+several serving processes share the node arrays through the page cache.
+parity_check compares a compiled model against the original predict.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from model_registry import MODELS_DIR, current_version, load_metadata, load_model, model_dir, predictor
+
+COMPILED_DIR = 'compiled'
+HEADER_FILE = 'header.json'
+NODE_ARRAYS = ('feature', 'threshold', 'left', 'value', 'flags', 'roots')
+# (row, tree) pairs traversed together; bounds the temporary arrays of large batches
+DEFAULT_CHUNK_PAIRS = 1 << 18
+# XGBoost accumulates leaf values in float32, so parity is checked with a relative tolerance
+PARITY_RTOL = 1e-5
+PARITY_ATOL = 1e-6
+
+# Node flags
+DEFAULT_LEFT = 1    # missing values go left
+ZERO_MISSING = 2    # zero counts as missing (LightGBM missing_type 'Zero')
+
+# Input blocks of the extended feature row
+RAW, RAW_FLOAT32, SCALED, SCALED_FLOAT32 = range(4)
+
+# Objectives whose prediction is the raw sum of the trees
+XGBOOST_IDENTITY_OBJECTIVES = ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:quantileerror')
+LIGHTGBM_IDENTITY_OBJECTIVES = ('regression', 'regression_l1', 'huber', 'fair', 'quantile')
+
+
+class _Forest:
+    """Trees collected while compiling, renumbered so that sibling nodes are adjacent"""
+
+    def __init__(self):
+        self.trees = []
+        self.max_depth = 0
+
+    def add_tree(self, feature, threshold, left, right, value, flags, block):
+        feature, left, right = np.asarray(feature), np.asarray(left), np.asarray(right)
+        internal = left >= 0
+        # Breadth-first renumbering with each node's two children stored next to each other
+        new_id = np.zeros(len(feature), dtype=np.int64)
+        frontier, next_id, depth = np.array([0]), 1, 0
+        while True:
+            parents = frontier[internal[frontier]]
+            if not len(parents):
+                break
+            children = np.column_stack([left[parents], right[parents]]).ravel()
+            new_id[children] = next_id + np.arange(len(children))
+            next_id += len(children)
+            frontier, depth = children, depth + 1
+
+        order = np.argsort(new_id)
+        is_internal = internal[order]
+        self.trees.append({
+            'feature': np.where(is_internal, feature[order], 0),
+            'threshold': np.where(is_internal, np.asarray(threshold, dtype=float)[order], np.inf),
+            'left': np.where(is_internal, new_id[np.maximum(left, 0)][order], np.arange(len(order))),
+            'value': np.where(is_internal, 0.0, np.asarray(value, dtype=float)[order]),
+            # Leaves keep NaN inputs in place too
+            'flags': np.where(is_internal, np.asarray(flags, dtype=np.uint8)[order], DEFAULT_LEFT),
+            'block': block
+        })
+        self.max_depth = max(self.max_depth, depth)
+
+    def extend(self, other, weight=1.0, scaled=False):
+        for tree in other.trees:
+            self.trees.append(dict(tree, value=tree['value'] * weight, block=tree['block'] + (SCALED if scaled else 0)))
+        self.max_depth = max(self.max_depth, other.max_depth)
+
+    def arrays(self, n_features):
+        sizes = np.array([len(tree['feature']) for tree in self.trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        return {
+            'feature': np.concatenate([tree['feature'] + tree['block'] * n_features
+                                       for tree in self.trees]).astype(np.int32),
+            'threshold': np.concatenate([tree['threshold'] for tree in self.trees]),
+            'left': np.concatenate([tree['left'] + offset for tree, offset in zip(self.trees, offsets)]).astype(np.int32),
+            'value': np.concatenate([tree['value'] for tree in self.trees]),
+            'flags': np.concatenate([tree['flags'] for tree in self.trees]).astype(np.uint8),
+            'roots': offsets.astype(np.int32)
+        }
+
+
+def _compile_sklearn(model):
+    """(forest, base) for RandomForest/ExtraTrees/GradientBoosting/DecisionTree regressors"""
+    if hasattr(model, 'tree_'):
+        trees, weight, base = [model], 1.0, 0.0
+    elif hasattr(model, 'estimators_'):
+        trees = list(np.asarray(model.estimators_, dtype=object).ravel())
+        if hasattr(model, 'learning_rate') and hasattr(model, 'init_'):
+            if model.init_ != 'zero' and type(model.init_).__name__ != 'DummyRegressor':
+                raise TypeError("Gradient boosting with a custom init estimator cannot be compiled")
+            weight = model.learning_rate
+            base = 0.0 if model.init_ == 'zero' else float(model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+        else:
+            weight, base = 1.0 / len(trees), 0.0
+    else:
+        raise TypeError(f"Not a tree model: {type(model).__name__}")
+
+    forest = _Forest()
+    for tree in trees:
+        t = tree.tree_
+        if t.value.shape[1] != 1:
+            raise TypeError("Only single-output trees can be compiled")
+        missing_left = getattr(t, 'missing_go_to_left', np.zeros(t.node_count, dtype=np.uint8)).astype(bool)
+        forest.add_tree(t.feature, t.threshold, t.children_left, t.children_right, t.value[:, 0, 0] * weight,
+                        np.where(missing_left, DEFAULT_LEFT, 0), RAW_FLOAT32)
+    return forest, base
+
+
+def _compile_xgboost(booster):
+    """(forest, base) from the booster's JSON model (exact float32 thresholds and leaf values)"""
+    model = json.loads(booster.save_raw('json'))['learner']
+    objective = model['objective']['name']
+    if objective not in XGBOOST_IDENTITY_OBJECTIVES:
+        raise TypeError(f"XGBoost objective {objective} has a non-identity link and cannot be compiled")
+    gbm = model['gradient_booster']
+    if gbm['name'] != 'gbtree':
+        raise TypeError(f"Only gbtree boosters can be compiled, not {gbm['name']}")
+    # base_score is a plain number in older releases and a one-element list ("[1.06E0]") in newer ones
+    base = float(np.ravel(json.loads(model['learner_model_param']['base_score']))[0])
+
+    forest = _Forest()
+    for tree in gbm['model']['trees']:
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        # x < t on float32 inputs is x <= the next float32 below t; leaves store their output in split_conditions
+        threshold = np.nextafter(conditions, np.float32(-np.inf)).astype(float)
+        flags = np.where(np.asarray(tree['default_left'], dtype=bool), DEFAULT_LEFT, 0)
+        forest.add_tree(tree['split_indices'], threshold, tree['left_children'], tree['right_children'],
+                        conditions.astype(float), flags, RAW_FLOAT32)
+    return forest, base
+
+
+def _lightgbm_nodes(root):
+    """Flat (feature, threshold, left, right, value, flags) arrays of a dump_model() tree"""
+    nodes = []
+    stack = [(root, None, None)]
+    while stack:
+        node, parent, side = stack.pop()
+        index = len(nodes)
+        if parent is not None:
+            nodes[parent][side] = index
+        if 'leaf_value' in node:
+            nodes.append([0, 0.0, -1, -1, node['leaf_value'], 0])
+            continue
+        if node['decision_type'] != '<=':
+            raise TypeError("Categorical LightGBM splits cannot be compiled")
+        threshold, missing = node['threshold'], node['missing_type']
+        # With missing_type 'None' NaN is compared as zero
+        default_left = 0.0 <= threshold if missing == 'None' else node['default_left']
+        flags = (DEFAULT_LEFT if default_left else 0) | (ZERO_MISSING if missing == 'Zero' else 0)
+        nodes.append([node['split_feature'], threshold, -1, -1, 0.0, flags])
+        stack.append((node['right_child'], index, 3))
+        stack.append((node['left_child'], index, 2))
+    return [np.array(col) for col in zip(*nodes)]
+
+
+def _compile_lightgbm(booster):
+    """(forest, base) from dump_model(); the initial score is already part of the first tree"""
+    dump = booster.dump_model()
+    if dump.get('num_tree_per_iteration', 1) != 1:
+        raise TypeError("Only single-output LightGBM models can be compiled")
+    if dump['objective'].split()[0] not in LIGHTGBM_IDENTITY_OBJECTIVES:
+        raise TypeError(f"LightGBM objective {dump['objective']} has a non-identity link and cannot be compiled")
+    weight = 1.0 / len(dump['tree_info']) if dump.get('average_output') else 1.0
+
+    forest = _Forest()
+    for info in dump['tree_info']:
+        feature, threshold, left, right, value, flags = _lightgbm_nodes(info['tree_structure'])
+        forest.add_tree(feature, threshold, left, right, value * weight, flags, RAW)
+    return forest, 0.0
+
+
+def _compile_single(model):
+    """(forest, base, n_features) for one tree model; XGBoost/LightGBM wrappers are unwrapped"""
+    n_features = getattr(model, 'n_features_in_', None)
+    if hasattr(model, 'get_booster'):
+        model = model.get_booster()
+    elif hasattr(model, 'booster_'):
+        model = model.booster_
+    module = type(model).__module__.split('.')[0]
+    if module == 'xgboost':
+        return (*_compile_xgboost(model), n_features or model.num_features())
+    if module == 'lightgbm':
+        return (*_compile_lightgbm(model), n_features or model.num_feature())
+    return (*_compile_sklearn(model), n_features)
+
+
+class CompiledForest:
+    """Flattened tree ensemble: prediction = base + sum of the reached leaf values"""
+
+    def __init__(self, arrays, base, n_features, feature_names=None, max_depth=0, scaler=None, source=None):
+        for name in NODE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.base = float(base)
+        self.n_features = int(n_features)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.max_depth = int(max_depth)
+        # (mean, scale) of the StandardScaler feeding the SCALED blocks
+        self.scaler = scaler
+        self.source = source
+        self.n_blocks = int(self.feature.max()) // self.n_features + 1 if len(self.feature) else 1
+        self.zero_missing = bool(np.any(self.flags & ZERO_MISSING))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _extended_inputs(self, X):
+        if self.feature_names is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        blocks = [X, X.astype(np.float32).astype(float)]
+        if self.n_blocks > SCALED:
+            mean, scale = self.scaler
+            scaled = (X - mean) / scale
+            blocks += [scaled, scaled.astype(np.float32).astype(float)]
+        return np.ascontiguousarray(np.hstack(blocks[:self.n_blocks]))
+
+    def _traverse(self, X, roots):
+        """Sum of the leaf values reached by every row in the given trees"""
+        n_rows, width = X.shape
+        values = X.ravel()
+        # Tree-major order: consecutive pairs walk the same tree, which keeps its nodes in cache
+        node = np.repeat(roots, n_rows)
+        row_start = np.tile(np.arange(n_rows) * width, len(roots))
+        if self.zero_missing or np.isnan(values).any():
+            for _ in range(self.max_depth):
+                x = values.take(row_start + self.feature.take(node))
+                flags = self.flags.take(node)
+                missing = np.isnan(x) | ((flags & ZERO_MISSING) != 0) & (x == 0)
+                go_right = np.where(missing, (flags & DEFAULT_LEFT) == 0, x > self.threshold.take(node))
+                node = self.left.take(node) + go_right
+        else:
+            for _ in range(self.max_depth):
+                x = values.take(row_start + self.feature.take(node))
+                node = self.left.take(node) + (x > self.threshold.take(node))
+        return self.value.take(node).reshape(len(roots), n_rows).sum(axis=0)
+
+    def predict(self, X, chunk_pairs=DEFAULT_CHUNK_PAIRS, n_jobs=1):
+        """Predictions for a feature matrix (DataFrame columns are reordered to feature_names)"""
+        X = self._extended_inputs(X)
+        step = max(1, chunk_pairs // X.shape[0])
+        blocks = [self.roots[start:start + step] for start in range(0, self.n_trees, step)]
+        if n_jobs == 1 or len(blocks) == 1:
+            sums = [self._traverse(X, roots) for roots in blocks]
+        else:
+            sums = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(self._traverse)(X, roots) for roots in blocks)
+        return np.sum(sums, axis=0) + self.base
+
+    def save(self, path):
+        """Write the node arrays (.npy) and a JSON header into a directory"""
+        os.makedirs(path, exist_ok=True)
+        for name in NODE_ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        header = {
+            'base': self.base,
+            'n_features': self.n_features,
+            'feature_names': self.feature_names,
+            'max_depth': self.max_depth,
+            'n_trees': self.n_trees,
+            'n_nodes': self.n_nodes,
+            'source': self.source,
+            'scaler': None if self.scaler is None else [np.asarray(part).tolist() for part in self.scaler]
+        }
+        with open(os.path.join(path, HEADER_FILE), 'w') as f:
+            json.dump(header, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved compiled model; node arrays are memory-mapped read-only by default"""
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in NODE_ARRAYS}
+        scaler = None if header['scaler'] is None else tuple(np.asarray(part) for part in header['scaler'])
+        return cls(arrays, header['base'], header['n_features'], header['feature_names'], header['max_depth'],
+                   scaler, header['source'])
+
+
+def compile_model(model, feature_names=None, dtype=np.float64):
+    """Flatten a fitted tree model (or a WeightedEnsemble of tree models) into a CompiledForest
+
+    dtype=np.float32 halves the threshold/value arrays; predictions then agree
+    with the original model only up to float32 rounding.
+    """
+    scaler = None
+    if hasattr(model, 'members') and hasattr(model, 'weights'):
+        forest, base, n_features = _Forest(), 0.0, None
+        for (member, scaled), weight in zip(model.members, model.weights):
+            member_forest, member_base, member_features = _compile_single(member)
+            forest.extend(member_forest, weight, scaled)
+            base += weight * member_base
+            n_features = n_features or member_features
+        if any(scaled for _, scaled in model.members):
+            scaler = (np.asarray(model.scaler.mean_, dtype=float), np.asarray(model.scaler.scale_, dtype=float))
+    else:
+        forest, base, n_features = _compile_single(model)
+
+    arrays = forest.arrays(n_features)
+    arrays['threshold'] = arrays['threshold'].astype(dtype)
+    arrays['value'] = arrays['value'].astype(dtype)
+    return CompiledForest(arrays, base, n_features, feature_names, forest.max_depth, scaler, type(model).__name__)
+
+
+def parity_check(model, compiled, X, rtol=PARITY_RTOL, atol=PARITY_ATOL):
+    """Compare the compiled predictions with the original model's predict on X"""
+    expected = np.asarray(predictor(model)(X))
+    actual = compiled.predict(X)
+    close = np.isclose(actual, expected, rtol=rtol, atol=atol)
+    return {
+        'rows': int(len(expected)),
+        'max_abs_diff': float(np.abs(actual - expected).max()) if len(expected) else 0.0,
+        'mismatches': int((~close).sum()),
+        'passed': bool(close.all())
+    }
+
+
+def compiled_path(name, version, models_dir=MODELS_DIR):
+    return os.path.join(model_dir(name, version, models_dir), COMPILED_DIR)
+
+
+def compile_registered(name, version=None, dtype=np.float64, models_dir=MODELS_DIR):
+    """Compile a registry model and store the arrays next to its model.joblib; returns (compiled, path)"""
+    model, metadata = load_model(name, version, models_dir)
+    compiled = compile_model(model, metadata.get('feature_names'), dtype)
+    path = compiled.save(compiled_path(name, metadata['version'], models_dir))
+    return compiled, path
+
+
+def load_compiled(name, version=None, models_dir=MODELS_DIR, mmap=True):
+    """Memory-mapped compiled model of a registry version (the current one by default)"""
+    version = version or current_version(name, models_dir)
+    path = compiled_path(name, version, models_dir)
+    if not os.path.exists(os.path.join(path, HEADER_FILE)):
+        raise FileNotFoundError(f"Model {name} {version} has not been compiled")
+    return CompiledForest.load(path, mmap)
+
+
+def benchmark(model, compiled, X, single_calls=50):
+    """Median single-row latency and full-batch time of the original and compiled predictors, in milliseconds"""
+    rows = [X[i % len(X):i % len(X) + 1] for i in range(single_calls)]
+    report = {}
+    for label, predict in (('original', predictor(model)), ('compiled', compiled.predict)):
+        timings = []
+        for row in rows:
+            start = time.perf_counter()
+            predict(row)
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        predict(X)
+        report[label] = {'single_row_ms': float(np.median(timings) * 1000),
+                         f'batch_{len(X)}_ms': (time.perf_counter() - start) * 1000}
+    return report
+
+
+def _parity_rows(name, metadata):
+    """Feature rows in the layout the model was trained on"""
+    from features import engineer_features, feature_names, to_matrix
+    names = metadata.get('feature_names')
+    if names is None or list(names) == list(feature_names()):
+        from station_store import ENHANCED_DATASET_DIR, load_station_data
+        return to_matrix(engineer_features(load_station_data(ENHANCED_DATASET_DIR))[0])
+    from distillation import TEACHERS, load_teacher_split
+    teacher = name[:-len('_student')] if name.endswith('_student') else name
+    if teacher not in TEACHERS:
+        raise ValueError(f"Don't know how to build feature rows for {name}")
+    teacher_metadata = metadata if teacher == name else load_metadata(teacher, metadata.get('teacher_version'))
+    X_train, X_test, _, _ = load_teacher_split(teacher, teacher_metadata)
+    return pd.concat([X_train, X_test], ignore_index=True)
+
+
+def main():
+    """Compile a registry model, check parity with its predict and report latency"""
+    parser = argparse.ArgumentParser(description="Compile tree ensembles into flat node arrays")
+    parser.add_argument('--model', required=True, help="Registry model name")
+    parser.add_argument('--version', default=None)
+    parser.add_argument('--float32', action='store_true', help="Store thresholds and leaf values as float32")
+    parser.add_argument('--no-check', action='store_true', help="Skip the parity check and benchmark")
+    args = parser.parse_args()
+
+    try:
+        model, metadata = load_model(args.model, args.version)
+        compiled, path = compile_registered(args.model, metadata['version'],
+                                            np.float32 if args.float32 else np.float64)
+    except (FileNotFoundError, TypeError) as e:
+        print(f"Compile error: {e}", file=sys.stderr)
+        return 1
+    print(f"Compiled {args.model} {metadata['version']}: {compiled.n_trees} trees, {compiled.n_nodes} nodes, "
+          f"max depth {compiled.max_depth} -> {path}")
+    if args.no_check:
+        return 0
+
+    try:
+        X = _parity_rows(args.model, metadata)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Parity check error: {e}", file=sys.stderr)
+        return 1
+    compiled = CompiledForest.load(path)
+    parity = parity_check(model, compiled, X, rtol=1e-3 if args.float32 else PARITY_RTOL)
+    print(f"Parity on {parity['rows']} rows: max |diff| {parity['max_abs_diff']:.2e}, "
+          f"{parity['mismatches']} mismatches -> {'OK' if parity['passed'] else 'FAILED'}")
+    for label, timings in benchmark(model, compiled, X).items():
+        print(f"{label:10s}" + "  ".join(f"{key} {value:.3f}" for key, value in timings.items()))
+    return 0 if parity['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
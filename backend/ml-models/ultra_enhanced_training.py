@@ -6,6 +6,8 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
+from model_registry import data_hash
+from run_store import save_run
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -139,6 +141,11 @@ def train_super_model(X_train, X_test, y_train, y_test):
     print(f"  Weighted Ensemble MAE: {ensemble_mae:.4f}")
     print(f"  Weighted Ensemble RMSE: {ensemble_rmse:.4f}")
     
+    # Keep the base-model predictions so other weightings need no retraining
+    run_id = save_run('weighted_ensemble', y_test, {'XGBoost': xgb_pred, 'LightGBM': lgb_pred, 'Random Forest': rf_pred},
+                      row=X_test.index, data_hash=data_hash(X_train, X_test, y_train, y_test), scheme='r2')
+    print(f"  Stored run {run_id}")
+    
     return ensemble_r2, ensemble_mae, ensemble_rmse
 
 def main():
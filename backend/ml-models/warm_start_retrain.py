@@ -0,0 +1,191 @@
+"""
+Warm-start retraining when new seasons are appended to the station data.
+
+Instead of retraining from scratch, the current registry version is continued
+on the rows it has not seen yet:
+- XGBoost / LightGBM boosters add rounds on top of the previous model
+  (xgb_model / init_model)
+- scikit-learn forests and gradient boosting grow additional trees on the new
+  rows (warm_start)
+- partial_fit pipelines (SGD / MLP) run a few more epochs over the new rows
+
+The validation window slides forward by the number of new seasons: years
+that were held out before become training data and the newest seasons are
+held out. Previous and candidate versions are scored on that same window and
+the candidate is promoted only if its R² does not drop by more than a small
+tolerance. After promotion the explanation cache of the new version is
+refreshed. The app's prediction stats are rebuilt only from data/datasets
+(the store they are derived from, never the enhanced training data) for
+stations with new seasons there, and the app bundles are re-exported.
+
+Only boosters, estimators with warm_start and partial_fit pipelines can be
+continued; composite models (stacked ensembles, regional routers) are
+rejected with a TypeError and must be retrained from scratch.
+"""
+
+import sys
+import copy
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from bundle_export import export_bundles
+from data_validation import validate
+from drift_monitor import build_reference
+from explanations import precompute_explanations
+from incremental_training import (
+    DEFAULT_CHUNK_SIZE, continue_partial_fit, evaluate_stream, iter_year_batches, train_lightgbm, train_xgboost
+)
+from ingestion_worker import update_prediction_stats
+from model_registry import MODELS_DIR, load_model, model_kind, predictor, save_model
+from station_store import (
+    DATASET_DIR, ENHANCED_DATASET_DIR, YEAR_COL, latest_year, list_stations, load_station_data, station_file
+)
+
+DEFAULT_BOOST_ROUNDS = 100
+DEFAULT_EXTRA_TREES = 100
+DEFAULT_EPOCHS = 5
+# Largest R² drop on the validation window that still allows promotion
+ACCEPTANCE_TOLERANCE = 0.02
+
+
+def stations_with_new_years(dataset_dir, after_year):
+    """Stations that have rows after the given year (reads only the Year column)"""
+    return [name for name in list_stations(dataset_dir)
+            if pd.read_csv(station_file(name, dataset_dir), usecols=[YEAR_COL])[YEAR_COL].max() > after_year]
+
+
+def retrain_window(metadata, data_through):
+    """(first new training year, new holdout year) after sliding the window by the new seasons"""
+    shift = data_through - metadata['data_through']
+    return metadata['trained_through'] + 1, metadata['holdout_year'] + shift
+
+
+def warm_start(model, batch_factory, work_dir, boost_rounds=DEFAULT_BOOST_ROUNDS,
+               extra_trees=DEFAULT_EXTRA_TREES, epochs=DEFAULT_EPOCHS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Continue training a stored model on new batches; the previous model is left untouched"""
+    kind = model_kind(model)
+    if kind == 'xgboost':
+        return train_xgboost(batch_factory, work_dir, num_boost_round=boost_rounds, xgb_model=model)
+    if kind == 'lightgbm':
+        return train_lightgbm(batch_factory, work_dir, num_boost_round=boost_rounds, chunk_size=chunk_size,
+                              init_model=model)
+
+    candidate = copy.deepcopy(model)
+    estimator = candidate.steps[-1][1] if hasattr(candidate, 'steps') else candidate
+    if hasattr(estimator, 'partial_fit') and hasattr(candidate, 'steps'):
+        return continue_partial_fit(candidate, batch_factory, epochs)
+    if not hasattr(estimator, 'get_params') or 'warm_start' not in estimator.get_params():
+        raise TypeError(f"{type(estimator).__name__} supports neither warm_start nor partial_fit")
+
+    # New seasons are small, so the forest path fits on them in memory
+    batches = list(batch_factory())
+    X = np.vstack([X for X, _ in batches])
+    y = np.concatenate([y for _, y in batches])
+    estimator.set_params(warm_start=True, n_estimators=estimator.n_estimators + extra_trees)
+    candidate.fit(X, y)
+    return candidate
+
+
+def acceptance_check(previous, candidate, batch_factory, tolerance=ACCEPTANCE_TOLERANCE):
+    """Score both versions on the same validation window; returns (accepted, report)"""
+    before = evaluate_stream(predictor(previous), batch_factory)
+    after = evaluate_stream(predictor(candidate), batch_factory)
+    accepted = bool(after) and after['r2'] >= before['r2'] - tolerance
+    return accepted, {'previous': before, 'candidate': after, 'tolerance': tolerance, 'accepted': accepted}
+
+
+def retrain(name, dataset_dir=ENHANCED_DATASET_DIR, chunk_size=DEFAULT_CHUNK_SIZE, boost_rounds=DEFAULT_BOOST_ROUNDS,
+            extra_trees=DEFAULT_EXTRA_TREES, epochs=DEFAULT_EPOCHS, tolerance=ACCEPTANCE_TOLERANCE,
+            models_dir=MODELS_DIR):
+    """Warm-start the current version of a model on new seasons; returns (version or None, report)"""
+    model, metadata = load_model(name, models_dir=models_dir)
+    missing = {'trained_through', 'holdout_year', 'data_through'} - set(metadata)
+    if missing:
+        raise ValueError(f"{name} {metadata['version']} has no training window metadata: {sorted(missing)}")
+    data_through = latest_year(dataset_dir)
+    if data_through <= metadata['data_through']:
+        return None, {'message': f"No new seasons after {metadata['data_through']}"}
+
+    start, holdout_year = retrain_window(metadata, data_through)
+
+    def train_batches():
+        return iter_year_batches(dataset_dir, chunk_size, start=start, stop=holdout_year)
+
+    def validation_batches():
+        return iter_year_batches(dataset_dir, chunk_size, start=holdout_year)
+
+    work_dir = tempfile.mkdtemp(prefix='warm_start_')
+    try:
+        candidate = warm_start(model, train_batches, work_dir, boost_rounds, extra_trees, epochs, chunk_size)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    accepted, report = acceptance_check(model, candidate, validation_batches, tolerance)
+
+    version = save_model(name, candidate, {
+        **{key: value for key, value in metadata.items() if key not in ('name', 'version', 'created')},
+        'training_mode': 'warm_start',
+        'parent_version': metadata['version'],
+        'trained_through': holdout_year - 1,
+        'holdout_year': holdout_year,
+        'data_through': data_through,
+        'metrics': report['candidate'],
+        'acceptance': report
+    }, promote=accepted, models_dir=models_dir)
+    build_reference(name, version, dataset_dir, models_dir=models_dir)
+    report['new_seasons'] = list(range(metadata['data_through'] + 1, data_through + 1))
+    return version, report
+
+
+def refresh_caches(name, new_seasons_after, dataset_dir=ENHANCED_DATASET_DIR, stats_dir=DATASET_DIR):
+    """Refresh the new version's explanations, and the app stats and bundles of stations with new seasons"""
+    # The app's stats are built from the base store, whatever data the model was trained on
+    stations = stations_with_new_years(stats_dir, new_seasons_after)
+    if stations:
+        data, _ = validate(load_station_data(stats_dir, stations))
+        update_prediction_stats(data)
+        export_bundles()
+    try:
+        precompute_explanations(name, dataset_dir=dataset_dir)
+    except TypeError:
+        pass  # Not a tree ensemble; nothing to cache
+    return stations
+
+
+def main():
+    """Continue the current model version on newly appended seasons"""
+    parser = argparse.ArgumentParser(description="Warm-start incremental retraining")
+    parser.add_argument('--model', default='incremental_lightgbm', help="Registry model name")
+    parser.add_argument('--dataset-dir', default=ENHANCED_DATASET_DIR)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--rounds', type=int, default=DEFAULT_BOOST_ROUNDS, help="Extra boosting rounds")
+    parser.add_argument('--trees', type=int, default=DEFAULT_EXTRA_TREES, help="Extra forest trees")
+    parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS, help="Extra partial_fit epochs")
+    parser.add_argument('--tolerance', type=float, default=ACCEPTANCE_TOLERANCE)
+    args = parser.parse_args()
+
+    try:
+        version, report = retrain(args.model, args.dataset_dir, args.chunk_size, args.rounds, args.trees,
+                                  args.epochs, args.tolerance)
+    except (FileNotFoundError, ValueError, TypeError) as e:
+        print(f"Error retraining {args.model}: {e}", file=sys.stderr)
+        return 1
+    if version is None:
+        print(report['message'])
+        return 0
+
+    before, after = report['previous'], report['candidate']
+    print(f"New seasons: {report['new_seasons']}")
+    print(f"Validation R²: previous {before.get('r2', float('nan')):.4f} -> candidate {after.get('r2', float('nan')):.4f}")
+    if not report['accepted']:
+        print(f"Candidate {version} rejected (R² dropped by more than {args.tolerance}); current version kept")
+        return 1
+    print(f"Promoted {args.model} version {version}")
+    stations = refresh_caches(args.model, report['new_seasons'][0] - 1, args.dataset_dir)
+    print(f"Refreshed prediction stats for {len(stations)} stations")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
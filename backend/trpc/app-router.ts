@@ -1,6 +1,9 @@
 import { createTRPCRouter } from "./create-context";
 import hiRoute from "./routes/example/hi/route";
-import { uploadDatasetProcedure } from "./routes/admin/upload-dataset/route";
+import {
+  uploadDatasetProcedure,
+  uploadStatusProcedure,
+} from "./routes/admin/upload-dataset/route";
 import { downloadDatasetProcedure } from "./routes/admin/download-dataset/route";
 import {
   createBackupProcedure,
@@ -13,6 +16,7 @@ export const appRouter = createTRPCRouter({
   }),
   admin: createTRPCRouter({
     uploadDataset: uploadDatasetProcedure,
+    uploadStatus: uploadStatusProcedure,
     downloadDataset: downloadDatasetProcedure,
     createBackup: createBackupProcedure,
     restoreBackup: restoreBackupProcedure,
@@ -1,40 +1,82 @@
 import { publicProcedure } from "../../../create-context";
 import { z } from "zod";
 
-export const createBackupProcedure = publicProcedure.mutation(async () => {
-  try {
-    console.log("[Admin] Creating backup");
-    const timestamp = new Date().toISOString();
+// Snapshots are served by the Python ingestion worker (backend/ml-models/snapshots.py)
+const INGESTION_WORKER_URL =
+  process.env.INGESTION_WORKER_URL ?? "http://127.0.0.1:8001";
 
-    return {
-      success: true,
-      backupId: `backup_${Date.now()}`,
-      timestamp,
-      message: "Backup created successfully",
-    };
-  } catch (error) {
-    console.error("[Admin] Backup creation failed:", error);
-    return {
-      success: false,
-      error: error instanceof Error ? error.message : "Backup failed",
-    };
-  }
-});
+const SnapshotComponentSchema = z.enum(["data", "caches", "json", "models"]);
+
+export const createBackupProcedure = publicProcedure
+  .input(
+    z
+      .object({
+        components: z.array(SnapshotComponentSchema).optional(),
+        label: z.string().optional(),
+      })
+      .optional()
+  )
+  .mutation(async ({ input }) => {
+    try {
+      console.log("[Admin] Creating backup");
+      const response = await fetch(`${INGESTION_WORKER_URL}/snapshots`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(input ?? {}),
+      });
+      if (!response.ok) {
+        throw new Error(`Snapshot service responded with ${response.status}`);
+      }
+      const snapshot = await response.json();
+
+      return {
+        success: true,
+        backupId: snapshot.id as string,
+        timestamp: snapshot.created as string,
+        bytesWritten: snapshot.stats.bytes_written as number,
+        message: "Backup created successfully",
+      };
+    } catch (error) {
+      console.error("[Admin] Backup creation failed:", error);
+      return {
+        success: false,
+        error: error instanceof Error ? error.message : "Backup failed",
+      };
+    }
+  });
 
 export const restoreBackupProcedure = publicProcedure
   .input(
     z.object({
       backupId: z.string(),
+      components: z.array(SnapshotComponentSchema).optional(),
     })
   )
   .mutation(async ({ input }) => {
     try {
       console.log(`[Admin] Restoring backup: ${input.backupId}`);
+      const response = await fetch(
+        `${INGESTION_WORKER_URL}/snapshots/${encodeURIComponent(input.backupId)}/restore`,
+        {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ components: input.components }),
+        }
+      );
+      if (!response.ok) {
+        throw new Error(
+          response.status === 404
+            ? `Unknown backup: ${input.backupId}`
+            : `Snapshot service responded with ${response.status}`
+        );
+      }
+      const result = await response.json();
 
       return {
         success: true,
         message: "Backup restored successfully",
         backupId: input.backupId,
+        restoredFiles: result.restoredFiles as number,
       };
     } catch (error) {
       console.error("[Admin] Backup restoration failed:", error);
@@ -4,16 +4,34 @@ import { z } from "zod";
 export const downloadDatasetProcedure = publicProcedure
   .input(
     z.object({
-      format: z.enum(["csv", "json"]).default("csv"),
+      format: z.enum(["csv", "json", "ndjson", "parquet"]).default("csv"),
+      municipalityIds: z.array(z.string()).optional(),
+      regionIds: z.array(z.string()).optional(),
+      yearFrom: z.number().int().optional(),
+      yearTo: z.number().int().optional(),
+      gzip: z.boolean().default(false),
     })
   )
   .query(async ({ input }) => {
     try {
       console.log(`[Admin] Downloading dataset in ${input.format} format`);
 
+      // The export is streamed from the ingestion worker through this server's
+      // /exports route (backend/exports.ts), so only its URL is returned here
+      const params = new URLSearchParams({
+        format: input.format === "json" ? "ndjson" : input.format,
+        gzip: String(input.gzip),
+      });
+      input.municipalityIds?.forEach((id) => params.append("municipality", id));
+      input.regionIds?.forEach((id) => params.append("region", id));
+      if (input.yearFrom !== undefined) params.set("yearFrom", String(input.yearFrom));
+      if (input.yearTo !== undefined) params.set("yearTo", String(input.yearTo));
+
       return {
         success: true,
         format: input.format,
+        // Relative to the API base URL the client already uses
+        url: `/api/exports?${params.toString()}`,
         timestamp: new Date().toISOString(),
       };
     } catch (error) {
@@ -1,6 +1,10 @@
 import { publicProcedure } from "../../../create-context";
 import { z } from "zod";
 
+// Python ingestion worker (backend/ml-models/ingestion_worker.py)
+const INGESTION_WORKER_URL =
+  process.env.INGESTION_WORKER_URL ?? "http://127.0.0.1:8001";
+
 const YieldDataSchema = z.object({
   year: z.number(),
   yield: z.number(),
@@ -24,10 +28,24 @@ export const uploadDatasetProcedure = publicProcedure
       console.log(`[Admin] Uploading dataset in ${input.mode} mode`);
       console.log(`[Admin] Dataset size: ${input.data.length} regions`);
 
+      // The worker only queues the job; validation, merging and
+      // recomputation happen in the background
+      const response = await fetch(`${INGESTION_WORKER_URL}/uploads`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(input),
+      });
+      if (!response.ok) {
+        throw new Error(`Ingestion worker responded with ${response.status}`);
+      }
+      const job = await response.json();
+
       return {
         success: true,
-        message: `Dataset uploaded successfully in ${input.mode} mode`,
+        message: `Dataset upload queued in ${input.mode} mode`,
         uploadedRegions: input.data.length,
+        jobId: job.jobId as string,
+        status: job.status as string,
       };
     } catch (error) {
       console.error("[Admin] Dataset upload failed:", error);
@@ -37,3 +55,35 @@ export const uploadDatasetProcedure = publicProcedure
       };
     }
   });
+
+export const uploadStatusProcedure = publicProcedure
+  .input(
+    z.object({
+      jobId: z.string(),
+    })
+  )
+  .query(async ({ input }) => {
+    try {
+      const response = await fetch(
+        `${INGESTION_WORKER_URL}/uploads/${encodeURIComponent(input.jobId)}`
+      );
+      if (!response.ok) {
+        throw new Error(
+          response.status === 404
+            ? `Unknown upload job: ${input.jobId}`
+            : `Ingestion worker responded with ${response.status}`
+        );
+      }
+
+      return {
+        success: true,
+        job: await response.json(),
+      };
+    } catch (error) {
+      console.error("[Admin] Upload status lookup failed:", error);
+      return {
+        success: false,
+        error: error instanceof Error ? error.message : "Status lookup failed",
+      };
+    }
+  });
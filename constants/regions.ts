@@ -1,5 +1,3 @@
-import municipalityData from './municipality_data.json';
-
 export type MunicipalityId = 
   | 'abucay'
   | 'alabat'
@@ -139,8 +137,9 @@ export interface MunicipalityYieldData {
 // This function generates real data from your CSV files
 
 export const generateRealYieldData = (): MunicipalityYieldData[] => {
-  // Use the real data from the JSON file generated by the Python script
-  return municipalityData as MunicipalityYieldData[];
+  // Bundled copy of the JSON generated by the Python script. It is only
+  // required (and parsed) when no synced data bundle is cached, see lib/bundles.ts
+  return require('./municipality_data.json') as MunicipalityYieldData[];
 };
 
 /** @deprecated Use generateRealYieldData() instead */
@@ -2,6 +2,7 @@ import createContextHook from '@nkzw/create-context-hook';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 import { useState, useEffect, useCallback, useMemo } from 'react';
 import { municipalities as defaultMunicipalities, generateRealYieldData, Municipality, MunicipalityYieldData, MunicipalityId } from '@/constants/regions';
+import { loadCachedYieldData, syncBundles } from '@/lib/bundles';
 
 const ADMIN_SETTINGS_KEY = 'anilytics_admin_settings';
 const REGIONS_DATA_KEY = 'anilytics_regions_data';
@@ -36,7 +37,7 @@ const defaultAdminSettings: AdminSettings = {
 export const [AdminProvider, useAdmin] = createContextHook(() => {
   const [settings, setSettings] = useState<AdminSettings>(defaultAdminSettings);
   const [municipalities, setMunicipalities] = useState<Municipality[]>(defaultMunicipalities);
-  const [yieldData, setYieldData] = useState<MunicipalityYieldData[]>(generateRealYieldData());
+  const [yieldData, setYieldData] = useState<MunicipalityYieldData[]>([]);
   const [deletedMunicipalities, setDeletedMunicipalities] = useState<DeletedMunicipality[]>([]);
   const [backups, setBackups] = useState<BackupData[]>([]);
   const [isLoading, setIsLoading] = useState(true);
@@ -45,6 +46,25 @@ export const [AdminProvider, useAdmin] = createContextHook(() => {
     loadAdminData();
   }, []);
 
+  const refreshBundleData = async (hasCachedData: boolean) => {
+    try {
+      const { fetched } = await syncBundles();
+      // Admin edits made meanwhile take precedence over the generated data
+      if (fetched > 0 && !(await AsyncStorage.getItem(YIELD_DATA_KEY))) {
+        const syncedYieldData = await loadCachedYieldData();
+        if (syncedYieldData) {
+          setYieldData(syncedYieldData);
+        }
+      }
+    } catch (error) {
+      console.error('Failed to sync data bundles:', error);
+      if (!hasCachedData) {
+        // Offline with nothing cached: fall back to the data bundled with the app
+        setYieldData(generateRealYieldData());
+      }
+    }
+  };
+
   const loadAdminData = async () => {
     try {
       const [settingsStr, regionsStr, yieldDataStr, deletedStr, backupStr] = await Promise.all([
@@ -64,16 +84,12 @@ export const [AdminProvider, useAdmin] = createContextHook(() => {
       if (yieldDataStr) {
         setYieldData(JSON.parse(yieldDataStr));
       } else {
-        // Load real data from Python script
-        try {
-          // In a real implementation, you would call the Python script here
-          // For now, we'll use the mock data
-          setYieldData(generateRealYieldData());
-        } catch (error) {
-          console.error('Failed to load real yield data:', error);
-          // Fallback to mock data if Python script fails
-          setYieldData(generateRealYieldData());
+        // Generated data comes from the cached bundle shards, refreshed in the background
+        const cachedYieldData = await loadCachedYieldData();
+        if (cachedYieldData) {
+          setYieldData(cachedYieldData);
         }
+        refreshBundleData(cachedYieldData !== null);
       }
       if (deletedStr) {
         setDeletedMunicipalities(JSON.parse(deletedStr));
@@ -259,7 +275,7 @@ export const [AdminProvider, useAdmin] = createContextHook(() => {
       
       setSettings(defaultAdminSettings);
       setMunicipalities(defaultMunicipalities);
-      setYieldData(generateRealYieldData());
+      setYieldData((await loadCachedYieldData()) ?? generateRealYieldData());
       setDeletedMunicipalities([]);
       return { success: true };
     } catch (error) {
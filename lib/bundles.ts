@@ -0,0 +1,140 @@
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import { getBaseUrl } from '@/lib/trpc';
+import type { MunicipalityId, MunicipalityYieldData, YieldData } from '@/constants/regions';
+
+// Client for the sharded data bundles served by backend/bundles.ts.
+// Each shard is cached under its own key, so a sync only downloads and
+// writes the shards whose content hash changed.
+const BUNDLE_MANIFEST_KEY = 'anilytics_bundle_manifest';
+const BUNDLE_SHARD_PREFIX = 'anilytics_bundle_shard:';
+
+export interface ShardEntry {
+  file: string;
+  hash: string;
+  bytes: number;
+}
+
+export interface BundleManifest {
+  version: string;
+  previous: string | null;
+  created: string;
+  shards: Record<string, ShardEntry>;
+}
+
+// One municipality's entry of municipality_prediction_stats.json (backend/ml-models/improved_prediction.py)
+export interface PredictionStats {
+  avg_yield: number;
+  min_yield: number;
+  max_yield: number;
+  trend: number;
+  recent_yield: number;
+  interval_lower: number;
+  interval_upper: number;
+  confidence: number;
+}
+
+export interface MunicipalityShard {
+  municipalityId: MunicipalityId;
+  region: string | null;
+  averageYield: number;
+  historicalData: YieldData[];
+  predictionStats: PredictionStats | null;
+}
+
+type DeltaResponse =
+  | { type: 'current'; version: string }
+  | {
+      type: 'delta';
+      version: string;
+      delta: { added: Record<string, ShardEntry>; changed: Record<string, ShardEntry>; removed: string[] };
+    }
+  | { type: 'full'; version: string; manifest: BundleManifest };
+
+const bundleUrl = (path: string) => `${getBaseUrl()}/api/bundles${path}`;
+
+export const loadCachedManifest = async (): Promise<BundleManifest | null> => {
+  const manifest = await AsyncStorage.getItem(BUNDLE_MANIFEST_KEY);
+  return manifest ? JSON.parse(manifest) : null;
+};
+
+export const loadMunicipalityShard = async (municipalityId: MunicipalityId): Promise<MunicipalityShard | null> => {
+  const shard = await AsyncStorage.getItem(`${BUNDLE_SHARD_PREFIX}municipalities/${municipalityId}`);
+  return shard ? JSON.parse(shard) : null;
+};
+
+/** Yield data of every cached municipality shard, or null if no complete bundle is cached */
+export const loadCachedYieldData = async (): Promise<MunicipalityYieldData[] | null> => {
+  const manifest = await loadCachedManifest();
+  if (!manifest) return null;
+  const keys = Object.keys(manifest.shards).filter((key) => key.startsWith('municipalities/'));
+  const shards = await AsyncStorage.multiGet(keys.map((key) => `${BUNDLE_SHARD_PREFIX}${key}`));
+  if (shards.some(([, value]) => value === null)) return null;
+  return shards.map(([, value]) => {
+    const shard: MunicipalityShard = JSON.parse(value as string);
+    return {
+      municipalityId: shard.municipalityId,
+      historicalData: shard.historicalData,
+      averageYield: shard.averageYield,
+    };
+  });
+};
+
+/**
+ * Bring the cached shards up to the server's bundle version.
+ *
+ * A client on the previous version applies delta.json. Any other client
+ * (first run, or two or more versions behind, whose shards may already be
+ * pruned on the server) falls back to a full refetch: it diffs the current
+ * manifest against its cached shard hashes and downloads every shard that
+ * differs.
+ */
+export const syncBundles = async (): Promise<{ version: string; fetched: number }> => {
+  const cached = await loadCachedManifest();
+  const response = await fetch(bundleUrl(`/delta?from=${encodeURIComponent(cached?.version ?? '')}`));
+  if (!response.ok) {
+    throw new Error(`Bundle server responded with ${response.status}`);
+  }
+  const result: DeltaResponse = await response.json();
+  if (result.type === 'current' && cached) {
+    return { version: cached.version, fetched: 0 };
+  }
+
+  let next: BundleManifest;
+  let toFetch: Record<string, ShardEntry>;
+  let removed: string[];
+  if (result.type === 'delta' && cached) {
+    toFetch = { ...result.delta.added, ...result.delta.changed };
+    removed = result.delta.removed;
+    const shards = { ...cached.shards, ...toFetch };
+    removed.forEach((key) => delete shards[key]);
+    next = { ...cached, version: result.version, previous: cached.version, shards };
+  } else {
+    if (result.type !== 'full') {
+      throw new Error('Bundle server sent no manifest for an empty cache');
+    }
+    next = result.manifest;
+    toFetch = Object.fromEntries(
+      Object.entries(next.shards).filter(([key, entry]) => cached?.shards[key]?.hash !== entry.hash)
+    );
+    removed = Object.keys(cached?.shards ?? {}).filter((key) => !(key in next.shards));
+  }
+
+  const shards = await Promise.all(
+    Object.entries(toFetch).map(async ([key, entry]): Promise<[string, string]> => {
+      const shard = await fetch(bundleUrl(`/shards/${entry.file}`));
+      if (!shard.ok) {
+        throw new Error(`Failed to fetch bundle shard ${entry.file}: ${shard.status}`);
+      }
+      return [`${BUNDLE_SHARD_PREFIX}${key}`, await shard.text()];
+    })
+  );
+  if (shards.length > 0) {
+    await AsyncStorage.multiSet(shards);
+  }
+  if (removed.length > 0) {
+    await AsyncStorage.multiRemove(removed.map((key) => `${BUNDLE_SHARD_PREFIX}${key}`));
+  }
+  // The manifest is written last, so an interrupted sync is retried from the old version
+  await AsyncStorage.setItem(BUNDLE_MANIFEST_KEY, JSON.stringify(next));
+  return { version: next.version, fetched: shards.length };
+};